@@ -0,0 +1,215 @@
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from candles import Candles
+
+# On-disk record: the Candles field types, 32 bytes a bar
+RECORD = np.dtype([
+    ('t', '<i8'),
+    ('o', '<f4'),
+    ('h', '<f4'),
+    ('l', '<f4'),
+    ('c', '<f4'),
+    ('v', '<i8'),
+])
+
+# One index entry (the bar's timestamp) every INDEX_STRIDE records
+INDEX_STRIDE = 4096
+
+
+def _epoch(value):
+    """
+    Epoch seconds from an int, a datetime-like or a date string.
+    """
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    return int(pd.Timestamp(value).timestamp())
+
+
+class CandleArchive:
+    """
+    Long-horizon candle history, one append-only binary file per (symbol, resolution).
+
+    `<archive_dir>/<resolution>/<SYMBOL>.bin` is a flat array of RECORDs in time
+    order, read through np.memmap so only the pages a query touches are loaded.
+    `<SYMBOL>.idx` holds the timestamp of every INDEX_STRIDE-th record. A range
+    read binary-searches that small index, then one block of the mmap, so opening
+    a symbol and slicing a date range costs the same for a month or for decades.
+    """
+
+    def __init__(self, archive_dir='candle_archive'):
+        self.archive_dir = archive_dir
+        self._lock = threading.Lock()
+
+    def _paths(self, symbol, resolution):
+        base = os.path.join(self.archive_dir, str(resolution), symbol.upper())
+        return base + '.bin', base + '.idx'
+
+    def _open(self, symbol, resolution, locked=False):
+        """
+        (records memmap, index array), or (None, None) if nothing is archived.
+        A missing or stale index (e.g. after an interrupted append) is rebuilt
+        and saved, under the archive lock (`locked`: the caller holds it).
+        """
+        data_path, index_path = self._paths(symbol, resolution)
+        if not os.path.exists(data_path) or os.path.getsize(data_path) < RECORD.itemsize:
+            return None, None
+        records = np.memmap(data_path, dtype=RECORD, mode='r',
+                            shape=(os.path.getsize(data_path) // RECORD.itemsize,))
+        index = np.fromfile(index_path, dtype='<i8') if os.path.exists(index_path) else None
+        if not _index_matches(index, records):
+            if not locked:
+                with self._lock:
+                    # An append may have fixed (or changed) both files meanwhile
+                    return self._open(symbol, resolution, locked=True)
+            index = np.array(records['t'][::INDEX_STRIDE])
+            _write_replace(index_path, index.astype('<i8').tobytes())
+        return records, index
+
+    def _search(self, records, index, timestamp):
+        """
+        Position of the first record with t >= `timestamp`.
+        """
+        block = int(np.searchsorted(index, timestamp, side='left')) - 1
+        if block < 0:
+            return 0
+        lo = block * INDEX_STRIDE
+        times = records['t'][lo:lo + INDEX_STRIDE]
+        return lo + int(np.searchsorted(times, timestamp, side='left'))
+
+    def symbols(self, resolution='D'):
+        directory = os.path.join(self.archive_dir, str(resolution))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-4] for name in os.listdir(directory) if name.endswith('.bin'))
+
+    def row_count(self, symbol, resolution='D'):
+        data_path, _ = self._paths(symbol, resolution)
+        return os.path.getsize(data_path) // RECORD.itemsize if os.path.exists(data_path) else 0
+
+    def time_range(self, symbol, resolution='D'):
+        """
+        (first, last) archived timestamp in epoch seconds, or None.
+        """
+        records, _ = self._open(symbol, resolution)
+        if records is None:
+            return None
+        return int(records['t'][0]), int(records['t'][-1])
+
+    def read(self, symbol, resolution='D', start=None, end=None):
+        """
+        Bars with start <= t <= end as Candles (only that range is read from disk).
+        `start` / `end` may be epoch seconds, datetimes or date strings.
+        """
+        records, index = self._open(symbol, resolution)
+        if records is None:
+            return None
+        start, end = _epoch(start), _epoch(end)
+        lo = 0 if start is None else self._search(records, index, start)
+        hi = len(records) if end is None else self._search(records, index, end + 1)
+        chunk = records[lo:max(lo, hi)]
+        return Candles(chunk['t'], chunk['o'], chunk['h'], chunk['l'], chunk['c'], chunk['v'])
+
+    def append(self, symbol, resolution, candles):
+        """
+        Add bars (Candles or a Finnhub candle response, in time order) to the archive.
+
+        Archived bars inside the incoming time span are replaced, so a re-fetched bar
+        that was still forming is overwritten rather than duplicated. Appending new
+        bars writes just those bars in place. Backfilling older history writes a
+        new file, copying the archived bars across in blocks, and swaps it in, so
+        an interrupted backfill never loses archived bars. Returns the number of
+        bars written.
+        """
+        if not isinstance(candles, Candles):
+            candles = Candles.from_columns(candles)
+        if len(candles) == 0:
+            return 0
+        new = np.empty(len(candles), dtype=RECORD)
+        for key in RECORD.names:
+            new[key] = getattr(candles, key)
+
+        data_path, index_path = self._paths(symbol, resolution)
+        with self._lock:
+            os.makedirs(os.path.dirname(data_path), exist_ok=True)
+            records, index = self._open(symbol, resolution, locked=True)
+            keep = after = 0
+            if records is not None:
+                keep = self._search(records, index, int(new['t'][0]))
+                after = self._search(records, index, int(new['t'][-1]) + 1)
+            if records is not None and after < len(records):
+                self._rewrite(symbol, resolution, records, keep, after, new)
+                return len(candles)
+            del records
+
+            # Nothing archived after the incoming bars: write them over the old
+            # ones in place, and only then cut off what is left past their end
+            with open(data_path, 'r+b' if os.path.exists(data_path) else 'wb') as f:
+                f.seek(keep * RECORD.itemsize)
+                f.write(new.tobytes())
+                f.truncate()
+
+            # Index entries for positions before `keep` are still valid
+            first_entry = -(-keep // INDEX_STRIDE)
+            positions = np.arange(first_entry * INDEX_STRIDE, keep + len(new), INDEX_STRIDE)
+            with open(index_path, 'r+b' if os.path.exists(index_path) else 'wb') as f:
+                f.seek(first_entry * 8)
+                f.write(new['t'][positions - keep].astype('<i8').tobytes())
+                f.truncate()
+        return len(candles)
+
+    def _rewrite(self, symbol, resolution, records, keep, after, new):
+        """
+        Backfill: records[:keep] + new + records[after:] into a new file that
+        replaces the old one, so a crash leaves the old file intact. The old
+        records are streamed across in blocks rather than loaded into memory.
+        """
+        data_path, index_path = self._paths(symbol, resolution)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(data_path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                _copy_records(records, 0, keep, f)
+                f.write(new.tobytes())
+                _copy_records(records, after, len(records), f)
+            del records
+            # Without an index, the new file's index is rebuilt from it, even after a crash
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            os.replace(tmp_path, data_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._open(symbol, resolution, locked=True)
+
+    def clear(self, symbol, resolution='D'):
+        for path in self._paths(symbol, resolution):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _index_matches(index, records):
+    # Right length, and the first and last entries still point at their records
+    if index is None or len(index) != -(-len(records) // INDEX_STRIDE):
+        return False
+    return index[0] == records['t'][0] and index[-1] == records['t'][(len(index) - 1) * INDEX_STRIDE]
+
+
+def _copy_records(records, start, stop, f, block=1 << 16):
+    for lo in range(start, stop, block):
+        f.write(records[lo:min(lo + block, stop)].tobytes())
+
+
+def _write_replace(path, data):
+    # Write to a temp file and rename so readers never see a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
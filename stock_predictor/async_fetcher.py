@@ -0,0 +1,166 @@
+import time
+import asyncio
+import aiohttp
+from candles import Candles
+from data_fetcher import DataFetcher, _timeframe_plan, _split_timeframes, _listed
+from rate_limiter import AsyncRateLimiter, default_rate_limiter, PRIORITY_QUOTE, PRIORITY_BACKFILL
+from resample import check_resolution, lookback_seconds
+
+FINNHUB_API_URL = "https://finnhub.io/api/v1"
+
+
+class FinnhubHTTPError(Exception):
+    """
+    Non-200 reply from the REST API. Carries `status_code` and `response` like
+    finnhub.FinnhubAPIException, so the rate limiter retries it the same way.
+    """
+
+    def __init__(self, status_code, message, response=None):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+        self.response = response
+
+
+class AsyncDataFetcher(DataFetcher):
+    """
+    asyncio version of DataFetcher: `fetch_candles`, `fetch_compact`,
+    `fetch_timeframes`, `fetch_symbols` and `get_current_price` are coroutines
+    returning the same shapes (None or [] on failure, with failures in `errors`
+    and the same mock / mock_fallback rules).
+
+    Requests share one aiohttp session whose keep-alive pool holds up to
+    `max_concurrency` connections, and at most that many are in flight at once.
+    `get_quotes` and `fetch_many` fan a whole watchlist out over the pool, so
+    refreshing N quotes takes about one round trip rather than N. Calls draw from
+    the process-wide rate limit budget unless `rate_limiter` is given.
+
+    Use it as an async context manager, or call `close()` when done.
+    """
+
+    def __init__(self, api_key=None, base_url=None, max_concurrency=32, timeout=10.0,
+                 rate_limiter=None, mock_fallback=False, mock_seed=None):
+        rate_limiter = rate_limiter or AsyncRateLimiter(default_rate_limiter().bucket)
+        super().__init__(api_key, rate_limiter=rate_limiter, mock_fallback=mock_fallback, mock_seed=mock_seed,
+                         base_url=base_url)
+        self.base_url = (self.base_url or FINNHUB_API_URL).rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'X-Finnhub-Token': self.api_key},
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def _request(self, path, params):
+        session = self._get_session()
+        async with self._semaphore:
+            try:
+                async with session.get(f"{self.base_url}/{path}", params=params) as response:
+                    if response.status != 200:
+                        raise FinnhubHTTPError(response.status, await response.text(), response)
+                    return await response.json(content_type=None)
+            except aiohttp.ClientConnectionError as e:
+                # Retried by the rate limiter like any other connection error
+                raise ConnectionError(str(e)) from e
+
+    async def _get(self, path, params, priority):
+        return await self.rate_limiter.call(self._request, path, params, priority=priority)
+
+    async def fetch_candles(self, symbol, resolution='D', count=200):
+        """
+        Fetch historical candle data from Finnhub or generate mock data.
+        """
+        resolution = check_resolution(resolution)
+        if self.use_mock:
+            return self._generate_mock_data(symbol, count, seed=self._mock_seed_for(symbol), resolution=resolution)
+
+        self.errors.pop(symbol, None)
+        try:
+            end = int(time.time())
+            start = end - lookback_seconds(resolution, count)
+            res = await self._get('stock/candle', {'symbol': symbol, 'resolution': resolution,
+                                                   'from': start, 'to': end}, PRIORITY_BACKFILL)
+            if res is None or res.get('s') == 'no_data':
+                return None
+            return self._api_frame(res)
+        except Exception as e:
+            return self._handle_failure(
+                symbol, e, lambda: self._generate_mock_data(symbol, count, seed=self._mock_seed_for(symbol),
+                                                            resolution=resolution))
+
+    async def fetch_compact(self, symbol, resolution='D', count=200):
+        """
+        Same bars as fetch_candles, as a Candles object instead of a DataFrame.
+        """
+        if self.use_mock:
+            return self._mock_candles(count, seed=self._mock_seed_for(symbol), resolution=check_resolution(resolution))
+        df = await self.fetch_candles(symbol, resolution, count)
+        return None if df is None else Candles.from_frame(df)
+
+    async def fetch_timeframes(self, symbol, resolutions, count=200):
+        """
+        Candles of `symbol` at several resolutions from a single request, like
+        DataFetcher.fetch_timeframes.
+        """
+        resolutions, base, base_count = _timeframe_plan(resolutions, count)
+        return _split_timeframes(await self.fetch_candles(symbol, base, base_count), resolutions, base)
+
+    async def fetch_symbols(self, exchange='US', types=('Common Stock',)):
+        """
+        Every symbol listed on `exchange`, filtered to the security `types`
+        (all types if empty). Returns [] if the listing could not be fetched.
+        """
+        if self.use_mock:
+            return [f"MOCK{i:04d}" for i in range(500)]
+        try:
+            rows = await self._get('stock/symbol', {'exchange': exchange}, PRIORITY_BACKFILL)
+        except Exception as e:
+            self.errors[exchange] = str(e)
+            print(f"Finnhub Error ({exchange} symbols): {e}")
+            return []
+        return _listed(rows, types)
+
+    async def get_current_price(self, symbol):
+        if self.use_mock:
+            return 150.25
+        try:
+            quote = await self._get('quote', {'symbol': symbol}, PRIORITY_QUOTE)
+            return quote['c']
+        except Exception as e:
+            self.errors[symbol] = str(e)
+            print(f"Error fetching quote for {symbol}: {e}")
+            return None
+
+    async def get_quotes(self, symbols):
+        """
+        Current price of every symbol (None where it failed), fetched concurrently.
+        """
+        prices = await asyncio.gather(*(self.get_current_price(sym) for sym in symbols))
+        return dict(zip(symbols, prices))
+
+    async def fetch_many(self, symbols, resolution='D', count=200):
+        """
+        Candles for every symbol (None where it failed), fetched concurrently.
+        """
+        frames = await asyncio.gather(*(self.fetch_candles(sym, resolution, count) for sym in symbols))
+        return dict(zip(symbols, frames))
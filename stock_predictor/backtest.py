@@ -0,0 +1,177 @@
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from feature_engineering import FeatureEngineer, TARGET_HORIZON
+from model import ModelTrainer
+from predictor import BUY_THRESHOLD, SELL_THRESHOLD
+
+
+def walk_forward_folds(n_rows, train_window=200, test_window=20, horizon=TARGET_HORIZON):
+    """
+    (train_start, train_end, test_start, test_end) row ranges of a walk-forward split.
+
+    Each fold trains on the `train_window` rows whose targets are already known at
+    the start of its test block (the last `horizon` rows before it are left out,
+    since their targets look into the test block) and predicts the next
+    `test_window` rows.
+    """
+    folds = []
+    for test_start in range(train_window + horizon, n_rows, test_window):
+        train_end = test_start - horizon
+        folds.append((train_end - train_window, train_end, test_start, min(test_start + test_window, n_rows)))
+    return folds
+
+
+def _fit_predict_fold(X_train, y_train, X_test):
+    if len(np.unique(y_train)) < 2:
+        # Degenerate window (all up or all down): predict the base rate
+        return np.full(len(X_test), float(y_train.mean()))
+    model = ModelTrainer(n_jobs=1)._new_model()
+    model.fit(X_train, y_train)
+    return model.predict_proba(X_test)[:, 1]
+
+
+def walk_forward_probabilities(full_df, train_window=200, test_window=20, n_jobs=-1, features=None):
+    """
+    Out-of-sample probability for every bar of a `prepare_data` frame.
+
+    Bars inside the first training window (or with missing indicators) get NaN.
+    Folds are independent and run in parallel on `n_jobs` cores.
+    """
+    features = features or ModelTrainer().features
+    clean = full_df.dropna(subset=features)
+    X = clean[features].to_numpy(dtype=float)
+    y = clean['Target'].to_numpy(dtype=int)
+
+    folds = walk_forward_folds(len(clean), train_window, test_window)
+    fold_probs = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_predict_fold)(X[a:b], y[a:b], X[c:d]) for a, b, c, d in folds
+    )
+
+    probs = np.full(len(clean), np.nan)
+    for (_, _, c, d), p in zip(folds, fold_probs):
+        probs[c:d] = p
+    return pd.Series(probs, index=clean.index, name='Probability').reindex(full_df.index)
+
+
+def evaluate_signals(close, probs, buy_threshold=BUY_THRESHOLD, sell_threshold=SELL_THRESHOLD, horizon=TARGET_HORIZON):
+    """
+    Vectorised evaluation of the BUY/SELL/HOLD threshold rules.
+
+    Position is +1 on BUY, -1 on SELL and flat on HOLD (or no prediction), held for
+    the next bar. Hit rate is the share of BUY/SELL signals whose direction matched
+    the move over `horizon` bars, which is what the model is trained to predict.
+    """
+    close = np.asarray(close, dtype=float)
+    probs = np.asarray(probs, dtype=float)
+
+    position = np.where(probs > buy_threshold, 1.0, np.where(probs < sell_threshold, -1.0, 0.0))
+    position[np.isnan(probs)] = 0.0
+
+    next_return = np.zeros_like(close)
+    next_return[:-1] = close[1:] / close[:-1] - 1
+    pnl = position * next_return
+    equity = np.cumprod(1 + pnl)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+
+    forward_return = np.full_like(close, np.nan)
+    forward_return[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    traded = (position != 0) & ~np.isnan(forward_return)
+    hits = np.sign(forward_return[traded]) == position[traded]
+
+    predicted = ~np.isnan(probs) & ~np.isnan(forward_return)
+    accuracy = np.mean((probs[predicted] > 0.5) == (forward_return[predicted] > 0)) if predicted.any() else np.nan
+
+    daily_std = pnl.std()
+    return {
+        'signals': int(traded.sum()),
+        'buys': int((position > 0).sum()),
+        'sells': int((position < 0).sum()),
+        'hit_rate': float(hits.mean()) if hits.size else np.nan,
+        'accuracy': float(accuracy),
+        'total_return': float(equity[-1] - 1) if equity.size else 0.0,
+        'max_drawdown': float(drawdown.min()) if drawdown.size else 0.0,
+        'sharpe': float(pnl.mean() / daily_std * np.sqrt(252)) if daily_std > 0 else np.nan,
+    }
+
+
+def backtest_symbol(df, train_window=200, test_window=20, n_jobs=-1, **thresholds):
+    """
+    Walk-forward backtest of one symbol's candles. Returns (metrics, full_df) where
+    full_df carries the out-of-sample 'Probability' column.
+    """
+    full_df, _ = FeatureEngineer().prepare_data(df)
+    full_df['Probability'] = walk_forward_probabilities(full_df, train_window, test_window, n_jobs)
+    return evaluate_signals(full_df['Close'], full_df['Probability'], **thresholds), full_df
+
+
+def backtest_many(frames, train_window=200, test_window=20, n_jobs=-1, **thresholds):
+    """
+    Backtest many symbols; every (symbol, fold) pair is one parallel task, so all
+    cores stay busy regardless of how the folds are spread across symbols.
+
+    `frames` maps symbol -> candle DataFrame. Returns a metrics DataFrame indexed by symbol.
+    """
+    fe = FeatureEngineer()
+    features = ModelTrainer().features
+    prepared, tasks = {}, []
+    for symbol, df in frames.items():
+        full_df, _ = fe.prepare_data(df)
+        clean = full_df.dropna(subset=features)
+        X = clean[features].to_numpy(dtype=float)
+        y = clean['Target'].to_numpy(dtype=int)
+        folds = walk_forward_folds(len(clean), train_window, test_window)
+        prepared[symbol] = (full_df, clean.index, folds)
+        tasks.extend((symbol, fold, X, y) for fold in folds)
+
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_predict_fold)(X[a:b], y[a:b], X[c:d]) for _, (a, b, c, d), X, y in tasks
+    )
+
+    fold_results = {}
+    for (symbol, fold, _, _), probs in zip(tasks, outputs):
+        fold_results.setdefault(symbol, []).append((fold, probs))
+
+    rows = {}
+    for symbol, (full_df, index, folds) in prepared.items():
+        probs = np.full(len(index), np.nan)
+        for (_, _, c, d), p in fold_results.get(symbol, []):
+            probs[c:d] = p
+        full_probs = pd.Series(probs, index=index).reindex(full_df.index)
+        rows[symbol] = evaluate_signals(full_df['Close'], full_probs, **thresholds)
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+if __name__ == "__main__":
+    from data_fetcher import DataFetcher
+    from archive import CandleArchive
+
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the BUY/SELL threshold rules")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--bars', type=int, default=1000, help="history length per symbol")
+    parser.add_argument('--train-window', type=int, default=200)
+    parser.add_argument('--test-window', type=int, default=20)
+    parser.add_argument('--jobs', type=int, default=-1)
+    parser.add_argument('--archive', metavar='DIR', help="read history from a CandleArchive instead of the API")
+    parser.add_argument('--start', help="first date to read from the archive")
+    parser.add_argument('--end', help="last date to read from the archive")
+    args = parser.parse_args()
+
+    fetcher = DataFetcher(archive=CandleArchive(args.archive) if args.archive else None)
+    frames = {}
+    for symbol in args.symbols:
+        if args.archive:
+            df = fetcher.fetch_range(symbol.upper(), args.start, args.end)
+        else:
+            df = fetcher.fetch_candles(symbol.upper(), count=args.bars)
+        if df is None:
+            print(f"Skipping {symbol}: no data")
+            continue
+        frames[symbol.upper()] = df
+    if not frames:
+        sys.exit(1)
+
+    report = backtest_many(frames, args.train_window, args.test_window, args.jobs)
+    print(report.to_string(float_format=lambda x: f"{x:.4f}"))
@@ -0,0 +1,204 @@
+import os
+import sys
+import csv
+import time
+import argparse
+import pandas as pd
+from metrics import STAGES
+
+# Columns of the signal output; timings are wall milliseconds per pipeline stage
+TIMING_STAGES = [stage for stage in STAGES if stage != 'render']
+COLUMNS = (['symbol', 'timestamp', 'probability', 'signal', 'current_price', 'accuracy', 'source', 'error']
+           + [f'{stage}_ms' for stage in TIMING_STAGES])
+# Fixed column types, so every Parquet part has the same schema even when a
+# batch has no errors (or only errors)
+DTYPES = {col: 'string' if col in ('symbol', 'timestamp', 'signal', 'source', 'error') else 'float64'
+          for col in COLUMNS}
+
+
+def read_symbols(path):
+    """
+    Symbols from a text file: one or more per line (comma or space separated),
+    blank lines and '#' comments ignored. Upper-cased, duplicates dropped.
+    """
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            symbols.extend(sym.strip().upper() for sym in line.replace(',', ' ').split())
+    return list(dict.fromkeys(symbols))
+
+
+def result_row(result):
+    """
+    Flat output row for one analysis result (the plotting frame is not kept).
+    """
+    timings = result.get('timings', {})
+    latest = result.get('latest_time')
+    return {
+        'symbol': result.get('symbol'),
+        'timestamp': pd.Timestamp(latest).isoformat() if latest is not None else None,
+        'probability': float(result['probability']) if 'probability' in result else None,
+        'signal': result.get('signal'),
+        'current_price': float(result['current_price']) if 'current_price' in result else None,
+        'accuracy': float(result['accuracy']) if 'accuracy' in result else None,
+        'source': result.get('source'),
+        'error': result.get('error'),
+        **{f'{stage}_ms': timings[stage]['wall'] * 1000 if stage in timings else None
+           for stage in TIMING_STAGES},
+    }
+
+
+class SignalWriter:
+    """
+    Appends signal rows to CSV (one file) or Parquet (a directory of part files),
+    and records every successfully scored symbol in a checkpoint file next to
+    the output.
+
+    Rows are flushed in batches. A batch is written before its symbols are added
+    to the checkpoint, so after a crash a resumed run redoes at most the batch
+    that was in flight and never loses a written row. Error rows are written but
+    not checkpointed: a resumed run retries those symbols (e.g. after a rate
+    limit) and appends their new row, so the last row of a symbol is the current one.
+    """
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.format = fmt or ('parquet' if path.endswith('.parquet') else 'csv')
+        self.checkpoint_path = path.rstrip(os.sep) + '.checkpoint'
+        self.rows_written = 0
+        if self.format == 'parquet':
+            os.makedirs(path, exist_ok=True)
+
+    def completed(self):
+        """
+        Symbols already written by earlier runs.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path) as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def reset(self):
+        """
+        Start over: remove earlier output and the checkpoint.
+        """
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        if self.format == 'parquet':
+            for name in os.listdir(self.path):
+                if name.startswith('part-'):
+                    os.remove(os.path.join(self.path, name))
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self.format == 'parquet':
+            self._write_parquet(rows)
+        else:
+            self._write_csv(rows)
+        with open(self.checkpoint_path, 'a') as f:
+            f.writelines(f"{row['symbol']}\n" for row in rows if not row.get('error'))
+            f.flush()
+            os.fsync(f.fileno())
+        self.rows_written += len(rows)
+
+    def _write_csv(self, rows):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_parquet(self, rows):
+        # Each batch is its own part file, written under a temp name and renamed,
+        # so a crash never leaves a truncated part behind
+        part = len([name for name in os.listdir(self.path) if name.endswith('.parquet')])
+        final = os.path.join(self.path, f"part-{part:05d}-{int(time.time())}.parquet")
+        tmp = final + '.tmp'
+        pd.DataFrame(rows, columns=COLUMNS).astype(DTYPES).to_parquet(tmp, index=False)
+        os.replace(tmp, final)
+
+
+def run_batch(predictor, symbols, output, fmt=None, batch_size=500, max_workers=8, processes=None,
+              resume=True, log=print):
+    """
+    Score `symbols` with `predictor.analyze_many` and stream the signals to `output`.
+
+    Symbols are processed in chunks of `batch_size`. Each result is reduced to
+    its output row as soon as it arrives, and the rows are written once per
+    chunk, so memory stays flat however long the symbol list is. Every chunk runs
+    on the predictor's process pool, started once for the run (the caller shuts
+    it down with `predictor.close()`). With `resume`, symbols already scored by
+    an earlier run are skipped and those that failed are retried. Returns a
+    summary dict.
+    """
+    writer = SignalWriter(output, fmt)
+    if resume:
+        done = writer.completed()
+    else:
+        writer.reset()
+        done = set()
+    todo = [sym for sym in symbols if sym not in done]
+    log(f"{len(symbols)} symbols, {len(symbols) - len(todo)} already done, {len(todo)} to score")
+
+    start = time.perf_counter()
+    errors = 0
+    for i in range(0, len(todo), batch_size):
+        chunk = todo[i:i + batch_size]
+        rows = []
+        for result in predictor.analyze_many(chunk, max_workers=max_workers, processes=processes,
+                                             keep_data=False):
+            rows.append(result_row(result))
+            errors += 'error' in result
+        writer.write(rows)
+        done_now = i + len(chunk)
+        rate = done_now / (time.perf_counter() - start)
+        log(f"  {done_now}/{len(todo)} scored ({rate:.1f} symbols/s, {errors} errors)")
+
+    return {'scored': len(todo), 'skipped': len(symbols) - len(todo), 'errors': errors,
+            'rows_written': writer.rows_written, 'seconds': time.perf_counter() - start}
+
+
+if __name__ == "__main__":
+    from predictor import StockPredictor
+
+    parser = argparse.ArgumentParser(description="Score a list of symbols headlessly and write the signals to CSV or Parquet")
+    parser.add_argument('symbols_file', help="text file with one or more symbols per line")
+    parser.add_argument('-o', '--output', default='signals.csv',
+                        help="output file (.csv) or directory (.parquet) (default: signals.csv)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], help="default: from the output name")
+    parser.add_argument('--batch-size', type=int, default=500, help="symbols per written batch")
+    parser.add_argument('--workers', type=int, default=8, help="fetch threads")
+    parser.add_argument('--processes', type=int, default=None, help="analysis processes (0 = threads only)")
+    parser.add_argument('--cache-dir', default='candle_cache', help="local candle store ('' to disable)")
+    parser.add_argument('--model-dir', default='model_cache', help="model registry ('' to disable)")
+    parser.add_argument('--no-resume', action='store_true', help="ignore the checkpoint and start over")
+    parser.add_argument('--mock', action='store_true', help="use seeded mock data instead of the API (dry run)")
+    args = parser.parse_args()
+
+    symbols = read_symbols(args.symbols_file)
+    if not symbols:
+        print(f"No symbols in {args.symbols_file}")
+        sys.exit(1)
+
+    from tuning import ParamStore
+    params = ParamStore(os.path.join(args.model_dir, 'tuned_params.json')) if args.model_dir else None
+    predictor = StockPredictor(cache_dir=args.cache_dir or None, model_dir=args.model_dir or None,
+                               param_store=params)
+    if args.mock:
+        predictor.fetcher.use_mock = True
+        predictor.fetcher.mock_seed = 0
+
+    try:
+        summary = run_batch(predictor, symbols, args.output, args.format, args.batch_size,
+                            args.workers, args.processes, resume=not args.no_resume)
+    finally:
+        predictor.close()
+    print(f"Done: {summary['scored']} scored, {summary['skipped']} skipped, {summary['errors']} errors "
+          f"in {summary['seconds']:.1f} s -> {args.output}")
@@ -0,0 +1,214 @@
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import itertools
+import tempfile
+import statistics
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from data_fetcher import DataFetcher
+from feature_engineering import FeatureEngineer
+from model import ModelTrainer
+from predictor import StockPredictor
+from candle_store import CandleStore
+from rate_limiter import RateLimiter, TokenBucket
+from simulator import MarketSimulator
+
+SEED = 42
+
+# Problem sizes per suite: bars for the single-symbol hot paths, symbols for the
+# full analyze_stock path, symbols per pass for the fetch path
+SUITES = {
+    'quick': {'bars': [300, 5000], 'symbols': [1, 10], 'fetch': [10]},
+    'full': {'bars': [300, 10000, 100000], 'symbols': [1, 100, 5000], 'fetch': [100, 1000]},
+}
+
+
+def _mock_fetcher():
+    # No API key: DataFetcher runs in mock mode, seeded for reproducible data
+    fetcher = DataFetcher(api_key="benchmark", mock_seed=SEED)
+    fetcher.use_mock = True
+    return fetcher
+
+
+def _measure(fn, repeats):
+    """
+    Run `fn` `repeats` times (after one warm-up call) and return wall times in seconds.
+    """
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _case(times, work, unit):
+    median = statistics.median(times)
+    return {
+        'median_s': median,
+        'min_s': min(times),
+        'throughput': work / median if median > 0 else float('inf'),
+        'unit': unit,
+        'repeats': len(times),
+    }
+
+
+def bench_prepare_data(bars, repeats):
+    df = _mock_fetcher().fetch_candles('BENCH', count=bars)
+    fe = FeatureEngineer()
+    return _case(_measure(lambda: fe.prepare_data(df), repeats), bars, 'rows/s')
+
+
+def bench_train(bars, repeats):
+    df = _mock_fetcher().fetch_candles('BENCH', count=bars)
+    _, train_df = FeatureEngineer().prepare_data(df)
+    trainer = ModelTrainer()
+    return _case(_measure(lambda: trainer.train(train_df), repeats), len(train_df), 'rows/s')
+
+
+def bench_predict_proba(repeats):
+    df = _mock_fetcher().fetch_candles('BENCH', count=300)
+    full_df, train_df = FeatureEngineer().prepare_data(df)
+    trainer = ModelTrainer()
+    trainer.train(train_df)
+    last_row = full_df.iloc[[-1]]
+    # Single-row latency is tiny; time batches of calls to get a stable number
+    calls = 100
+    times = _measure(lambda: [trainer.predict_proba(last_row) for _ in range(calls)], repeats)
+    return _case([t / calls for t in times], 1, 'predictions/s')
+
+
+def bench_predict_fast(repeats):
+    df = _mock_fetcher().fetch_candles('BENCH', count=300)
+    full_df, train_df = FeatureEngineer().prepare_data(df)
+    trainer = ModelTrainer()
+    trainer.train(train_df)
+    calls = 1000
+    times = _measure(lambda: [trainer.predict_fast(trainer.feature_vector(full_df)) for _ in range(calls)], repeats)
+    return _case([t / calls for t in times], 1, 'predictions/s')
+
+
+def bench_fetch(n_symbols, repeats, stored=False):
+    """
+    fetch_candles for `n_symbols` symbols over HTTP from a local, seeded
+    MarketSimulator with a frozen clock. Cold passes start from an empty
+    CandleStore, so every bar is downloaded and stored; stored passes reuse the
+    store filled by the warm-up pass, so only the last bar is requested again.
+    """
+    with tempfile.TemporaryDirectory() as tmp, \
+            MarketSimulator(seed=SEED, speed=0, universe_size=max(n_symbols, 500)) as simulator:
+        symbols = simulator.market.symbols()[:n_symbols]
+        limiter = RateLimiter(TokenBucket(calls_per_minute=10 ** 7))
+
+        def fetcher(path):
+            return DataFetcher(api_key="benchmark", base_url=simulator.url, rate_limiter=limiter,
+                               store=CandleStore(path))
+
+        if stored:
+            warm = fetcher(tmp)
+            run = lambda: [warm.fetch_candles(sym, count=300) for sym in symbols]
+        else:
+            passes = itertools.count()
+
+            def run():
+                cold = fetcher(os.path.join(tmp, str(next(passes))))
+                return [cold.fetch_candles(sym, count=300) for sym in symbols]
+        return _case(_measure(run, repeats), n_symbols, 'symbols/s')
+
+
+def bench_analyze_stock(n_symbols, repeats):
+    predictor = StockPredictor(api_key="benchmark")
+    predictor.fetcher = _mock_fetcher()
+    symbols = [f"SYM{i:05d}" for i in range(n_symbols)]
+    times = _measure(lambda: [predictor.analyze_stock(sym) for sym in symbols], repeats)
+    return _case(times, n_symbols, 'symbols/s')
+
+
+def run_suite(suite='quick', repeats=3, log=print):
+    sizes = SUITES[suite]
+    cases = {}
+    for bars in sizes['bars']:
+        cases[f'prepare_data[{bars}]'] = lambda bars=bars: bench_prepare_data(bars, repeats)
+        cases[f'train[{bars}]'] = lambda bars=bars: bench_train(bars, repeats)
+    for n in sizes['fetch']:
+        cases[f'fetch_cold[{n}]'] = lambda n=n: bench_fetch(n, repeats)
+        cases[f'fetch_stored[{n}]'] = lambda n=n: bench_fetch(n, repeats, stored=True)
+    cases['predict_proba[1]'] = lambda: bench_predict_proba(repeats)
+    cases['predict_fast[1]'] = lambda: bench_predict_fast(repeats)
+    for n in sizes['symbols']:
+        # Large symbol counts are slow per repeat; one timed pass is enough there
+        cases[f'analyze_stock[{n}]'] = lambda n=n: bench_analyze_stock(n, repeats if n <= 10 else 1)
+
+    results = {}
+    for name, bench in cases.items():
+        # Keep the per-fit "Model Accuracy" prints out of the report
+        with redirect_stdout(io.StringIO()):
+            results[name] = bench()
+        log(f"{name:<24} median {results[name]['median_s'] * 1000:10.2f} ms   "
+            f"{results[name]['throughput']:14.1f} {results[name]['unit']}")
+    return {
+        'meta': {
+            'suite': suite,
+            'seed': SEED,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'xgboost': xgb.__version__,
+            'machine': platform.machine(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.25):
+    """
+    Cases whose median time grew by more than `threshold` (a fraction) over the
+    baseline. Returns a list of (case, baseline_s, current_s, change) tuples.
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        change = result['median_s'] / base['median_s'] - 1
+        if change > threshold:
+            regressions.append((name, base['median_s'], result['median_s'], change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the fetch / feature / train / predict hot paths")
+    parser.add_argument('--suite', choices=sorted(SUITES), default='quick')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--save', metavar='FILE', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='FILE', help="fail if slower than this JSON baseline")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed slowdown before --compare fails (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    report = run_suite(args.suite, args.repeats)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"\nREGRESSIONS (> {args.threshold:.0%} slower than {args.compare}):")
+            for name, base, cur, change in regressions:
+                print(f"  {name:<24} {base * 1000:10.2f} ms -> {cur * 1000:10.2f} ms  (+{change:.0%})")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}")
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import threading
+import numpy as np
+from candles import Candles
+
+# Column layout of a stored candle file (Finnhub field name -> DataFrame column)
+COLUMNS = {
+    't': 'Time',
+    'o': 'Open',
+    'h': 'High',
+    'l': 'Low',
+    'c': 'Close',
+    'v': 'Volume',
+}
+
+
+class CandleStore:
+    """
+    Local columnar candle store, one file per (symbol, resolution).
+
+    Every column is saved as its own contiguous array inside a ``.npz`` file so a
+    read is a handful of array loads rather than a row-by-row parse. Timestamps are
+    kept as int64 epoch seconds, exactly as Finnhub returns them, which makes
+    "what is the newest bar we have?" a single array lookup.
+    """
+
+    def __init__(self, cache_dir='candle_cache'):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, resolution):
+        return os.path.join(self.cache_dir, str(resolution), f"{symbol.upper()}.npz")
+
+    def load(self, symbol, resolution='D'):
+        """
+        Return the stored bars as Candles, or None if nothing is stored.
+        """
+        path = self._path(symbol, resolution)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return Candles.from_columns({key: data[key] for key in COLUMNS})
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Candle store: discarding unreadable file {path}: {e}")
+            return None
+
+    def last_timestamp(self, symbol, resolution='D'):
+        stored = self.load(symbol, resolution)
+        if stored is None or len(stored) == 0:
+            return None
+        return int(stored.t[-1])
+
+    def row_count(self, symbol, resolution='D'):
+        stored = self.load(symbol, resolution)
+        return 0 if stored is None else len(stored)
+
+    def append(self, symbol, resolution, res):
+        """
+        Append bars from a Finnhub candle response (dict of 't', 'o', 'h', ...).
+
+        Stored bars from the first incoming timestamp onwards are replaced by the
+        incoming ones, so re-fetching the newest bar (which is still forming while
+        the market is open) overwrites it instead of duplicating it. Returns the
+        number of incoming rows.
+        """
+        with self._lock:
+            self._merge(symbol, resolution, self.load(symbol, resolution), res)
+        return len(res['t'])
+
+    def merge(self, symbol, resolution, stored, res):
+        """
+        Like `append`, onto `stored` (the Candles just loaded for this symbol),
+        without reading the file again. Returns the merged Candles; the file is
+        only rewritten when the incoming bars change something.
+        """
+        with self._lock:
+            return self._merge(symbol, resolution, stored, res)
+
+    def _merge(self, symbol, resolution, stored, res):
+        new = Candles.from_columns(res)
+        if len(new) == 0:
+            return stored
+        if stored is not None and len(stored) > 0:
+            # Keep everything strictly older than the first incoming bar
+            keep = np.searchsorted(stored.t, new.t[0])
+            if keep + len(new) == len(stored) and all(
+                    np.array_equal(getattr(stored, key)[keep:], getattr(new, key)) for key in COLUMNS):
+                return stored  # nothing new: the last bars did not change
+            merged = Candles.from_columns({key: np.concatenate([getattr(stored, key)[:keep], getattr(new, key)])
+                                           for key in COLUMNS})
+        else:
+            merged = new
+        self._write(self._path(symbol, resolution), merged.columns())
+        return merged
+
+    def _write(self, path, columns):
+        # Write to a temp file and rename so readers never see a half-written file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **columns)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def read_frame(self, symbol, resolution='D', count=None):
+        """
+        Return the stored bars as a DataFrame (same layout as DataFetcher.fetch_candles).
+        """
+        stored = self.load(symbol, resolution)
+        if stored is None or len(stored) == 0:
+            return None
+        return (stored if count is None else stored.tail(count)).to_frame()
+
+    def clear(self, symbol, resolution='D'):
+        path = self._path(symbol, resolution)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def to_frame(columns):
+    """
+    Build the candle DataFrame used throughout the app from Finnhub-style columns.
+    The frame is a zero-copy view of compact Candles arrays.
+    """
+    return Candles.from_columns(columns).to_frame()
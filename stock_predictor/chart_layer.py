@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+# Chart ranges offered in the dashboard, in bars (None = whole history)
+CHART_RANGES = {'1M': 21, '3M': 63, '6M': 126, '1Y': 252, 'All': None}
+
+# Most points drawn per trace; longer windows are downsampled to this
+MAX_POINTS = 400
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of `n_out` points of
+    (x, y) that keep the visual shape of the line (peaks and troughs survive,
+    unlike with plain striding). NaNs (indicator warm-up) are allowed.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    # Selection only: fill gaps so the triangle areas are defined
+    y = pd.Series(np.asarray(y, dtype=float)).bfill().ffill().fillna(0.0).to_numpy()
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    edges = np.append(edges, n)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2]
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area)) if hi > lo else a
+        indices[i + 1] = a
+    return indices
+
+
+def aggregate_ohlc(df, max_bars):
+    """
+    Merge consecutive candles into at most `max_bars` buckets (open of the first,
+    high / low over the bucket, close of the last, summed volume).
+    """
+    n = len(df)
+    if n <= max_bars:
+        return df[['Time', 'Open', 'High', 'Low', 'Close', 'Volume']]
+    bucket = np.arange(n) * max_bars // n
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    ends = np.append(starts[1:], n) - 1
+    return pd.DataFrame({
+        'Time': df['Time'].to_numpy()[starts],
+        'Open': df['Open'].to_numpy()[starts],
+        'High': np.maximum.reduceat(df['High'].to_numpy(), starts),
+        'Low': np.minimum.reduceat(df['Low'].to_numpy(), starts),
+        'Close': df['Close'].to_numpy()[ends],
+        'Volume': np.add.reduceat(df['Volume'].to_numpy(), starts),
+    })
+
+
+def build_figure():
+    """
+    The empty price / RSI figure: candles, SMA 20 / 50 and RSI traces (in that
+    order) on two rows. Data is filled in by ChartLayer.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True,
+                        vertical_spacing=0.1,
+                        subplot_titles=('Price History & SMA', 'RSI (Momentum)'),
+                        row_heights=[0.7, 0.3])
+    fig.add_trace(go.Candlestick(name='OHLC'), row=1, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='SMA 20', line=dict(color='orange')), row=1, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='SMA 50', line=dict(color='blue')), row=1, col=1)
+    fig.add_trace(go.Scatter(mode='lines', name='RSI', line=dict(color='purple')), row=2, col=1)
+
+    # RSI Levels
+    fig.add_hline(y=70, line_dash="dash", line_color="red", row=2, col=1)
+    fig.add_hline(y=30, line_dash="dash", line_color="green", row=2, col=1)
+
+    fig.update_layout(height=400, margin=dict(l=0, r=0, t=30, b=0), showlegend=False)
+    fig.update_xaxes(rangebreaks=[dict(values=["Sat", "Sun"])])  # Hide weekends if possible
+    return fig
+
+
+class ChartLayer:
+    """
+    Per-symbol chart state for the dashboard.
+
+    Each symbol's figure is built once and kept in `state` (pass
+    st.session_state's dict so it lives as long as the browser session). On a
+    refresh, a chart whose data has not changed is returned as is. Otherwise the
+    new bars are written into the existing traces instead of rebuilding the
+    subplots. The visible range is limited to `bars`, and longer ranges are
+    reduced to `max_points`: candles by OHLC aggregation, lines by LTTB. A chart
+    then costs about the same to build and send whatever the history length.
+    """
+
+    def __init__(self, state=None, max_points=MAX_POINTS):
+        self.state = {} if state is None else state
+        self.max_points = max_points
+        self.builds = 0
+
+    def figure(self, symbol, df, bars=None):
+        view = df if bars is None else df.iloc[-bars:]
+        # The newest bar may still be forming, so its values are part of the version
+        last = view.iloc[-1]
+        version = (bars, len(df), last['Time'], float(last['Close']), float(last['High']), float(last['Low']))
+
+        entry = self.state.get(symbol)
+        if entry is not None and entry['version'] == version:
+            return entry['figure']
+        if entry is None:
+            entry = self.state[symbol] = {'figure': build_figure()}
+            self.builds += 1
+
+        self._fill(entry['figure'], view)
+        entry['version'] = version
+        return entry['figure']
+
+    def _fill(self, fig, view):
+        candles = aggregate_ohlc(view, self.max_points)
+        time = view['Time'].to_numpy()
+        seconds = time.astype('datetime64[s]').astype(np.int64)
+        with fig.batch_update():
+            fig.data[0].update(x=candles['Time'].to_numpy(), open=candles['Open'].to_numpy(),
+                               high=candles['High'].to_numpy(), low=candles['Low'].to_numpy(),
+                               close=candles['Close'].to_numpy())
+            for trace, col in zip(fig.data[1:], ('SMA_20', 'SMA_50', 'RSI')):
+                values = view[col].to_numpy(dtype=float)
+                keep = lttb(seconds, values, self.max_points)
+                trace.update(x=time[keep], y=values[keep])
+
+    def forget(self, symbol):
+        self.state.pop(symbol, None)
+
+
+def page_of(symbols, page, per_page):
+    """
+    The symbols shown on `page` (0-based) when `per_page` charts fit on a page.
+    """
+    return symbols[page * per_page:(page + 1) * per_page]
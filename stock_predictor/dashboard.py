@@ -1,9 +1,15 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import time
+from concurrent.futures import ThreadPoolExecutor
 from predictor import StockPredictor
+from streaming import StreamingPredictor
+from metrics import REGISTRY
+from result_cache import ResultCache, SqliteBackend
+from chart_layer import ChartLayer, CHART_RANGES, page_of
+from tuning import ParamStore
+from scanner import Scanner, read_universe
+from refresh_scheduler import RefreshScheduler
 import os
 from dotenv import load_dotenv
 
@@ -46,13 +52,35 @@ with st.sidebar:
     else:
         api_key = os.getenv("FINNHUB_API_KEY")
 
+    mock_fallback = st.checkbox("Fall back to mock data on API errors", value=False,
+                                help="Off: API failures are shown as errors. On: failing symbols get random mock prices (flagged in the results).")
+
     st.divider()
     st.header("🔍 Watchlist")
     default_symbols = "AAPL, MSFT, TSLA, NVDA"
     symbols_input = st.text_area("Enter Stock Symbols (comma separated)", value=default_symbols)
     
-    refresh_rate = st.slider("Auto-refresh (seconds)", 30, 300, 60)
-    auto_refresh = st.checkbox("Enable Auto-refresh", value=False)
+    refresh_rate = st.slider("Auto-refresh (seconds)", 30, 300, 60,
+                             help="Cadence of the symbols off screen; the charted ones refresh every 15 s.")
+    auto_refresh = st.checkbox("Enable Auto-refresh", value=False,
+                               help="Refresh the watchlist in the background and show the latest results as they arrive.")
+    pooled_model = st.checkbox("Pooled model (one model for the whole watchlist)", value=False,
+                               help="Train a single model on every symbol's history, refitted daily, and score the whole watchlist in one call.")
+    streaming_mode = st.checkbox("Streaming mode (live trades)", value=False,
+                                 help="Subscribe to Finnhub's trade websocket and update predictions as each 1-minute bar closes. Needs an API key.")
+
+    st.divider()
+    st.header("📊 Charts")
+    chart_range = st.selectbox("Chart range", list(CHART_RANGES), index=2)
+    charts_per_page = st.number_input("Charts per page", min_value=1, max_value=50, value=10,
+                                      help="Only this many symbols are plotted; the rest of the watchlist is listed in a summary table.")
+
+    st.divider()
+    st.header("🛰️ Market Scanner")
+    scan_universe = st.text_input("Universe file", value="",
+                                  help="Finnhub symbol list (.json) or a symbols file. Empty: the US listing from the API.")
+    scan_top = st.number_input("Top K", min_value=5, max_value=200, value=20)
+    scan_market = st.button("Scan Market")
 
     st.divider()
     st.info("Note: Predictions are probabilistic based on technical indicators (RSI, SMA, Volume). Not financial advice.")
@@ -67,10 +95,8 @@ if not api_key:
     pass
 
 # Helper to render stock data
-def render_stock_analysis(symbol, predictor):
-    with st.spinner(f"Analyzing {symbol}..."):
-        result = predictor.analyze_stock(symbol.strip().upper())
-    
+def render_stock_analysis(result):
+    symbol = result['symbol']
     if 'error' in result:
         st.error(f"Error for {symbol}: {result['error']}")
         return
@@ -86,6 +112,8 @@ def render_stock_analysis(symbol, predictor):
     
     with col1:
         st.markdown(f"### {symbol}")
+        if result.get('source') == 'mock':
+            st.warning("MOCK DATA: not real prices")
         st.write(f"Price: **${current_price:.2f}**")
         
         # Display Signal
@@ -97,33 +125,10 @@ def render_stock_analysis(symbol, predictor):
         st.progress(float(prob))
         st.caption(f"Confidence: {prob*100:.1f}% (Direction: {'Up' if prob > 0.5 else 'Down'})")
 
-    with col2:
-        # Charts using Plotly
-        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, 
-                            vertical_spacing=0.1, 
-                            subplot_titles=('Price History & SMA', 'RSI (Momentum)'),
-                            row_heights=[0.7, 0.3])
-
-        # Candlestick
-        fig.add_trace(go.Candlestick(x=df['Time'],
-                        open=df['Open'], high=df['High'],
-                        low=df['Low'], close=df['Close'], name='OHLC'), row=1, col=1)
-        
-        # SMAs
-        fig.add_trace(go.Scatter(x=df['Time'], y=df['SMA_20'], mode='lines', name='SMA 20', line=dict(color='orange')), row=1, col=1)
-        fig.add_trace(go.Scatter(x=df['Time'], y=df['SMA_50'], mode='lines', name='SMA 50', line=dict(color='blue')), row=1, col=1)
-
-        # RSI
-        fig.add_trace(go.Scatter(x=df['Time'], y=df['RSI'], mode='lines', name='RSI', line=dict(color='purple')), row=2, col=1)
-        
-        # RSI Levels
-        fig.add_hline(y=70, line_dash="dash", line_color="red", row=2, col=1)
-        fig.add_hline(y=30, line_dash="dash", line_color="green", row=2, col=1)
-
-        fig.update_layout(height=400, margin=dict(l=0, r=0, t=30, b=0), showlegend=False)
-        fig.update_xaxes(rangebreaks=[dict(values=["Sat", "Sun"])]) # Hide weekends if possible
-        
-        st.plotly_chart(fig, use_container_width=True)
+    with col2, REGISTRY.stage(symbol, 'render', rows=len(df)):
+        # The symbol's figure is kept across reruns and only refilled when a bar changed
+        fig = get_chart_layer().figure(symbol, df, CHART_RANGES[chart_range])
+        st.plotly_chart(fig, use_container_width=True, key=f"chart-{symbol}")
 
     with col3:
         st.markdown("##### Key Metrics")
@@ -136,33 +141,215 @@ def render_stock_analysis(symbol, predictor):
     st.divider()
     return {'symbol': symbol, 'prob': prob, 'signal': signal}
 
-# Main Execution
-symbols = [s.strip() for s in symbols_input.split(',') if s.strip()]
+def render_summary(results):
+    """
+    Compact table for the symbols that are not on the current chart page.
+    """
+    if not results:
+        return
+    st.subheader("📋 Rest of the watchlist")
+    rows = [{'Symbol': r['symbol'], 'Price': r.get('current_price'), 'Signal': r.get('signal', 'ERROR'),
+             'Up prob.': r.get('probability'), 'Source': r.get('source'), 'Error': r.get('error')}
+            for r in results]
+    st.dataframe(pd.DataFrame(rows).set_index('Symbol'), use_container_width=True)
 
-if st.button("Analyze All") or auto_refresh:
-    predictor = StockPredictor(api_key=api_key)
-    results = []
+def render_top_opportunities(results):
+    if not results:
+        return
+    st.subheader("🔥 Top Opportunities")
+    sorted_results = sorted(results, key=lambda x: x['prob'], reverse=True)
     
-    # Process each symbol
-    for sym in symbols:
-        res = render_stock_analysis(sym, predictor)
+    cols = st.columns(min(len(sorted_results), 5))
+    for i, item in enumerate(sorted_results[:5]): # Show top 5
+        with cols[i]:
+            st.markdown(f"**{item['symbol']}**")
+            st.caption(f"{item['signal']} ({item['prob']*100:.0f}%)")
+
+def render_scan(ranked, stats):
+    st.subheader(f"🛰️ Market Scan: top {len(ranked)}")
+    st.caption(f"{stats['universe']} symbols, {stats['quote_filtered'] + stats['prefiltered']} filtered out, "
+               f"{stats['scored']} scored in {stats['seconds']:.1f} s")
+    if ranked:
+        st.dataframe(pd.DataFrame(ranked)[['symbol', 'signal', 'probability', 'current_price', 'avg_volume']]
+                     .set_index('symbol'), use_container_width=True)
+
+def render_timings():
+    summary = REGISTRY.summary()
+    if not summary:
+        return
+    with st.expander("⏱️ Pipeline timings"):
+        st.dataframe(pd.DataFrame(summary).set_index('stage'), use_container_width=True)
+        st.caption("Wall-clock latency per stage across all symbols since this server started.")
+
+# Chart figures live in the browser session, so a rerun only refills the charts whose data changed
+def get_chart_layer():
+    if 'chart_layer' not in st.session_state:
+        st.session_state['chart_layer'] = ChartLayer()
+    return st.session_state['chart_layer']
+
+# Prometheus/JSON metrics endpoint, opt-in with METRICS_PORT
+@st.cache_resource
+def start_metrics_server(port):
+    return REGISTRY.serve(port)
+
+if os.getenv("METRICS_PORT"):
+    start_metrics_server(int(os.getenv("METRICS_PORT")))
+
+# Results shared by every session in this process. With RESULT_CACHE_PATH, also by
+# every dashboard worker on the machine through a SQLite file.
+@st.cache_resource
+def get_result_cache():
+    path = os.getenv("RESULT_CACHE_PATH")
+    return ResultCache(ttl=int(os.getenv("RESULT_CACHE_TTL", "60")),
+                       backend=SqliteBackend(path) if path else None)
+
+# One predictor per process and settings, so cached and pooled models stay in memory across reruns
+@st.cache_resource
+def get_predictor(api_key, mock_fallback):
+    return StockPredictor(api_key=api_key, cache_dir="candle_cache", model_dir="model_cache",
+                          mock_fallback=mock_fallback, result_cache=get_result_cache(),
+                          param_store=ParamStore("model_cache/tuned_params.json"))
+
+# One scanner per predictor, so its scoring model (refitted daily on a sample of
+# the universe) is shared by every scan in the process
+@st.cache_resource
+def get_scanner(api_key, mock_fallback):
+    return Scanner(get_predictor(api_key, mock_fallback).fetcher)
+
+# Scans run one at a time on a background thread: a whole exchange means many
+# rate-limited fetches, so the page only polls their progress
+@st.cache_resource
+def get_scan_pool():
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="market-scan")
+
+def start_scan(api_key, mock_fallback, universe_file, top):
+    scanner = get_scanner(api_key, mock_fallback)
+    def run():
+        universe = read_universe(universe_file) if universe_file else scanner.fetcher.fetch_symbols('US')
+        ranked = scanner.scan(universe, top=top)
+        return ranked, dict(scanner.stats)
+    return scanner, get_scan_pool().submit(run)
+
+@st.fragment(run_every=2)
+def render_scan_job(job):
+    scanner, future = job
+    if not future.done():
+        stats = scanner.stats
+        st.info(f"🛰️ Scanning in the background: {stats.get('fetched', 0) + stats.get('errors', 0)} of "
+                f"{stats.get('universe', '?')} symbols fetched, {stats.get('quote_filtered', 0)} skipped on cached quotes...")
+        return
+    try:
+        ranked, stats = future.result()
+    except Exception as e:
+        st.error(f"Market scan failed: {e}")
+        return
+    render_scan(ranked, stats)
+
+# One live stream per process and key (Finnhub allows one socket per key): a new
+# watchlist resubscribes it instead of opening another connection
+@st.cache_resource
+def get_streamer(api_key):
+    predictor = StockPredictor(api_key=api_key, cache_dir="candle_cache", model_dir="model_cache")
+    streamer = StreamingPredictor(predictor, [])
+    streamer.start()
+    return streamer
+
+@st.fragment(run_every=1)
+def render_stream(streamer):
+    if not streamer.latest:
+        st.info("Waiting for the first bars to close...")
+        return
+    results = []
+    others = []
+    visible = set(page_of(list(streamer.symbols), page, charts_per_page))
+    for sym in streamer.symbols:
+        if sym not in streamer.latest:
+            continue
+        if sym not in visible:
+            others.append(streamer.latest[sym])
+            continue
+        res = render_stock_analysis(streamer.latest[sym])
+        if res:
+            results.append(res)
+    render_summary(others)
+    render_top_opportunities(results)
+
+def render_watchlist(batch):
+    """
+    Charts for the symbols on the current page, a summary table for the rest.
+    Returns the top-opportunity entries of every successful result.
+    """
+    results = []
+    others = []
+    for result in batch:
+        if result['symbol'] not in visible:
+            others.append(result)
+            if 'error' not in result:
+                results.append({'symbol': result['symbol'], 'prob': result['probability'], 'signal': result['signal']})
+            continue
+        res = render_stock_analysis(result)
         if res:
             results.append(res)
+    render_summary(others)
+    return results
+
+# Auto-refresh: a background worker per process and settings refreshes the watched symbols on
+# their own cadence; every session only reads its latest snapshot
+@st.cache_resource
+def get_scheduler(api_key, mock_fallback, pooled):
+    scheduler = RefreshScheduler(get_predictor(api_key, mock_fallback), pooled=pooled,
+                                 market_hours=bool(api_key))
+    scheduler.start()
+    return scheduler
+
+@st.fragment(run_every=5)
+def render_refreshed(scheduler, symbols, interval):
+    # Keeps the watchlist (and the page on screen, as hot symbols) registered with the worker
+    scheduler.watch(symbols, hot=visible, interval=interval)
+    snapshot = scheduler.snapshot()
+    batch = [snapshot.get(sym) for sym in symbols if sym in snapshot]
+    if not batch:
+        st.info(f"Analyzing {len(symbols)} symbols in the background...")
+        return
+    st.caption(f"{len(batch)} of {len(symbols)} symbols, last update {time.time() - snapshot.updated:.0f} s ago")
+    render_top_opportunities(render_watchlist(batch))
+    render_timings()
+
+# Main Execution
+symbols = [s.strip().upper() for s in symbols_input.split(',') if s.strip()]
+
+# Only one page of the watchlist is plotted at a time
+pages = max(1, -(-len(symbols) // charts_per_page))
+page = st.sidebar.number_input("Chart page", min_value=1, max_value=pages, value=1) - 1 if pages > 1 else 0
+visible = set(page_of(symbols, page, charts_per_page))
+
+if scan_market:
+    st.session_state['scan'] = start_scan(api_key, mock_fallback, scan_universe, scan_top)
+if 'scan' in st.session_state:
+    render_scan_job(st.session_state['scan'])
+
+if streaming_mode:
+    if not api_key:
+        st.error("Streaming mode needs a Finnhub API key.")
+    else:
+        streamer = get_streamer(api_key)
+        streamer.set_symbols(symbols)
+        render_stream(streamer)
+
+elif auto_refresh:
+    render_refreshed(get_scheduler(api_key, mock_fallback, pooled_model), symbols, refresh_rate)
+
+elif st.button("Analyze All"):
+    predictor = get_predictor(api_key, mock_fallback)
+    
+    # Analyze the watchlist concurrently and render each symbol as it completes
+    with st.spinner(f"Analyzing {len(symbols)} symbols..."):
+        batch = predictor.analyze_pooled(symbols) if pooled_model else predictor.analyze_many(symbols)
+        results = render_watchlist(batch)
             
     # Bonus: Top Predictions
-    if results:
-        st.subheader("🔥 Top Opportunities")
-        sorted_results = sorted(results, key=lambda x: x['prob'], reverse=True)
-        
-        cols = st.columns(len(sorted_results))
-        for i, item in enumerate(sorted_results[:5]): # Show top 5
-            with cols[i]:
-                st.markdown(f"**{item['symbol']}**")
-                st.caption(f"{item['signal']} ({item['prob']*100:.0f}%)")
-
-    if auto_refresh:
-        time.sleep(refresh_rate)
-        st.rerun()
+    render_top_opportunities(results)
+    render_timings()
 
 else:
     st.info("Click 'Analyze All' to fetch data and generate predictions.")
@@ -1,89 +1,316 @@
 import os
-import finnhub
 import pandas as pd
 import datetime
 import time
+import zlib
+import functools
 from dotenv import load_dotenv
+from candle_store import to_frame
+from candles import Candles
+from resample import check_resolution, finest, bars_per, can_derive, lookback_seconds, resample, INTRADAY, \
+    RESOLUTION_SECONDS, SESSION_SECONDS
+from rate_limiter import default_rate_limiter, PRIORITY_QUOTE, PRIORITY_REFRESH, PRIORITY_BACKFILL
 
 load_dotenv()
 
 class DataFetcher:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, store=None, rate_limiter=None, mock_fallback=False, mock_seed=None,
+                 archive=None, base_url=None):
         self.api_key = api_key or os.getenv("FINNHUB_API_KEY")
+        # API root other than Finnhub's, e.g. a local MarketSimulator
+        self.base_url = base_url or os.getenv("FINNHUB_BASE_URL")
+        # Optional local CandleStore; when set, only bars newer than the last
+        # stored one are requested from the API.
+        self.store = store
+        # Optional CandleArchive of long-horizon history for backtests and
+        # training, read by date range with fetch_range()
+        self.archive = archive
+        # Every API call goes through a RateLimiter (shared by default across the
+        # process) that queues by priority and retries throttled calls.
+        self.rate_limiter = rate_limiter or default_rate_limiter()
+        # Mock data is served after an API failure only when explicitly enabled.
+        # Failures are recorded in self.errors either way, and frames carry their
+        # origin in df.attrs['source'] ('api' or 'mock'); stored bars served
+        # after a failed refresh also carry df.attrs['error'].
+        self.mock_fallback = mock_fallback
+        # With a mock_seed, mock data is deterministic per (seed, symbol)
+        self.mock_seed = mock_seed
+        self.errors = {}
+        self.fallbacks = 0
         self.use_mock = False
+        self._client = None
         if not self.api_key:
             print("Warning: No API key found. Using MOCK DATA mode.")
             self.use_mock = True
-        else:
-            self.client = finnhub.Client(api_key=self.api_key)
+
+    @property
+    def client(self):
+        # finnhub (and requests) are imported on the first API call, not at start-up
+        if self._client is None:
+            import finnhub
+            self._client = finnhub.Client(api_key=self.api_key)
+            if self.base_url:
+                self._client.API_URL = self.base_url.rstrip('/')
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
 
     def fetch_candles(self, symbol, resolution='D', count=200):
         """
         Fetch historical candle data from Finnhub or generate mock data.
         """
+        resolution = check_resolution(resolution)
         if self.use_mock:
-            return self._generate_mock_data(symbol, count)
+            return self._generate_mock_data(symbol, count, seed=self._mock_seed_for(symbol), resolution=resolution)
 
+        self.errors.pop(symbol, None)
         try:
-            # Calculate start and end times
+            # Calculate start and end times, wide enough for `count` bars of this resolution
             end = int(time.time())
-            # Approximate start time based on resolution (simplification for daily 'D')
-            start = end - (count * 86400 * 2) 
-            
-            res = self.client.stock_candles(symbol, resolution, start, end)
+            start = end - lookback_seconds(resolution, count)
+
+            if self.store is not None:
+                return self._fetch_incremental(symbol, resolution, count, start, end)
+
+            res = self.rate_limiter.call(self.client.stock_candles, symbol, resolution, start, end,
+                                         priority=PRIORITY_BACKFILL)
             
             if res is None or res.get('s') == 'no_data':
                 return None
                 
-            df = pd.DataFrame({
-                'Time': pd.to_datetime(res['t'], unit='s'),
-                'Open': res['o'],
-                'High': res['h'],
-                'Low': res['l'],
-                'Close': res['c'],
-                'Volume': res['v']
-            })
+            return self._api_frame(res)
             
+        except Exception as e:
+            return self._handle_failure(
+                symbol, e, lambda: self._generate_mock_data(symbol, count, seed=self._mock_seed_for(symbol),
+                                                            resolution=resolution))
+
+    def fetch_compact(self, symbol, resolution='D', count=200):
+        """
+        Same bars as fetch_candles, as a Candles object instead of a DataFrame.
+        Bulk readers like the scanner take the arrays directly and skip the
+        DataFrame overhead; mock data never builds a frame at all.
+        """
+        if self.use_mock:
+            return self._mock_candles(count, seed=self._mock_seed_for(symbol), resolution=check_resolution(resolution))
+        df = self.fetch_candles(symbol, resolution, count)
+        return None if df is None else Candles.from_frame(df)
+
+    def fetch_timeframes(self, symbol, resolutions, count=200):
+        """
+        Candles of `symbol` at several resolutions from a single request.
+
+        Only the finest resolution is fetched, with enough bars for `count` bars of
+        the coarsest; every other resolution is resampled from it locally. Returns
+        {resolution: DataFrame}, or None if the fetch failed.
+        """
+        resolutions, base, base_count = _timeframe_plan(resolutions, count)
+        return _split_timeframes(self.fetch_candles(symbol, base, base_count), resolutions, base)
+
+    def _api_frame(self, res):
+        df = to_frame(res)
+        df.attrs['source'] = 'api'
+        return df
+
+    def _handle_failure(self, symbol, error, make_mock):
+        """
+        Record an API failure; serve mock data only if mock_fallback is enabled.
+        """
+        self.errors[symbol] = str(error)
+        print(f"Finnhub Error ({symbol}): {error}")
+        if not self.mock_fallback:
+            return None
+        self.fallbacks += 1
+        print(f"Falling back to MOCK DATA for {symbol} (mock_fallback is enabled).")
+        return make_mock()
+
+    def _fetch_incremental(self, symbol, resolution, count, start, end):
+        """
+        Serve candles from the local store, asking the API only for new bars.
+        The stored file is read once and written at most once per refresh. If
+        the API call fails, the stored bars are served with the error in
+        df.attrs['error']; only an empty store falls back like fetch_candles.
+        """
+        stored = self.store.load(symbol, resolution)
+        priority = PRIORITY_BACKFILL
+        if stored is not None and len(stored) >= count:
+            # Re-request from the last stored bar: it may still have been forming
+            start = int(stored.t[-1])
+            priority = PRIORITY_REFRESH
+
+        try:
+            res = self.rate_limiter.call(self.client.stock_candles, symbol, resolution, start, end,
+                                         priority=priority)
+        except Exception as e:
+            if stored is None or len(stored) == 0:
+                raise
+            # The stored history is still good: serve it and record the failure
+            self.errors[symbol] = str(e)
+            print(f"Finnhub Error ({symbol}): {e}; serving stored bars")
+            df = stored.tail(count).to_frame()
+            df.attrs['source'] = 'api'
+            df.attrs['error'] = str(e)
             return df
-            
+        if res is not None and res.get('s') == 'ok':
+            stored = self.store.merge(symbol, resolution, stored, res)
+
+        if stored is None or len(stored) == 0:
+            return None
+        df = stored.tail(count).to_frame()
+        df.attrs['source'] = 'api'
+        return df
+
+    def fetch_range(self, symbol, start, end=None, resolution='D'):
+        """
+        Archived candles of `symbol` between `start` and `end` (epoch seconds,
+        datetimes or date strings) as a DataFrame. Only that range is read from disk.
+        """
+        if self.archive is None:
+            raise ValueError("fetch_range needs a DataFetcher created with an archive")
+        candles = self.archive.read(symbol, resolution, start, end)
+        if candles is None or len(candles) == 0:
+            return None
+        df = candles.to_frame()
+        df.attrs['source'] = 'archive'
+        return df
+
+    def update_archive(self, symbol, resolution='D', start=None):
+        """
+        Download the bars after the newest archived one (or from `start`, epoch
+        seconds, for an empty archive) and append them. Returns the number of bars added.
+        """
+        if self.archive is None:
+            raise ValueError("update_archive needs a DataFetcher created with an archive")
+        span = self.archive.time_range(symbol, resolution)
+        if span is not None:
+            # Re-request from the last archived bar: it may still have been forming
+            start = span[1]
+        elif start is None:
+            start = int(time.time()) - 365 * 86400
+        try:
+            res = self.rate_limiter.call(self.client.stock_candles, symbol, resolution, start,
+                                         int(time.time()), priority=PRIORITY_BACKFILL)
         except Exception as e:
+            self.errors[symbol] = str(e)
             print(f"Finnhub Error ({symbol}): {e}")
-            print(f"Falling back to MOCK DATA for {symbol} due to API restriction/error.")
-            return self._generate_mock_data(symbol, count)
+            return 0
+        if res is None or res.get('s') != 'ok':
+            return 0
+        return self.archive.append(symbol, resolution, res)
+
+    def _mock_seed_for(self, symbol):
+        if self.mock_seed is None:
+            return None
+        return (self.mock_seed * 1_000_003 + zlib.crc32(symbol.encode())) % 2**32
 
-    def _generate_mock_data(self, symbol, count):
+    def _generate_mock_data(self, symbol, count, seed=None, resolution='D'):
+        df = self._mock_candles(count, seed, resolution).to_frame()
+        df.attrs['source'] = 'mock'
+        return df
+
+    def _mock_candles(self, count, seed=None, resolution='D'):
         import numpy as np
-        # Generate realistic-looking random stock data
-        dates = pd.date_range(end=datetime.datetime.now(), periods=count)
+        # Generate realistic-looking random stock data (reproducible with a seed)
+        random = np.random if seed is None else np.random.RandomState(seed)
+        dates = _mock_times(resolution, count)
         base_price = 150.0  # arbitrary base
         
-        # Random walk
-        changes = np.random.randn(count) * 2
+        # Random walk, with moves scaled to the bar length (daily moves ~2)
+        bar = SESSION_SECONDS if resolution == 'D' else min(RESOLUTION_SECONDS[resolution], SESSION_SECONDS)
+        scale = (bar / SESSION_SECONDS) ** 0.5 * {'W': 5 ** 0.5, 'M': 21 ** 0.5}.get(resolution, 1.0)
+        changes = random.randn(count) * 2 * scale
         prices = base_price + np.cumsum(changes)
         
         # Ensure positive
         prices = np.maximum(prices, 1.0)
         
-        df = pd.DataFrame({
-            'Time': dates,
-            'Open': prices + np.random.randn(count)*0.5,
-            'High': prices + np.abs(np.random.randn(count)*1.0),
-            'Low': prices - np.abs(np.random.randn(count)*1.0),
-            'Close': prices,
-            'Volume': np.random.randint(100000, 5000000, count)
-        })
-        return df
+        return Candles(
+            t=dates,
+            o=prices + random.randn(count)*0.5,
+            h=prices + np.abs(random.randn(count)*1.0),
+            l=prices - np.abs(random.randn(count)*1.0),
+            c=prices,
+            v=random.randint(100000, 5000000, count)
+        )
+
+    def fetch_symbols(self, exchange='US', types=('Common Stock',)):
+        """
+        Every symbol listed on `exchange`, filtered to the security `types`
+        (all types if empty). Returns [] if the listing could not be fetched.
+        """
+        if self.use_mock:
+            return [f"MOCK{i:04d}" for i in range(500)]
+        try:
+            rows = self.rate_limiter.call(self.client.stock_symbols, exchange, priority=PRIORITY_BACKFILL)
+        except Exception as e:
+            self.errors[exchange] = str(e)
+            print(f"Finnhub Error ({exchange} symbols): {e}")
+            return []
+        return _listed(rows, types)
 
     def get_current_price(self, symbol):
         if self.use_mock:
             return 150.25
         try:
-            quote = self.client.quote(symbol)
+            quote = self.rate_limiter.call(self.client.quote, symbol, priority=PRIORITY_QUOTE)
             return quote['c']
         except Exception as e:
+            self.errors[symbol] = str(e)
             print(f"Error fetching quote for {symbol}: {e}")
             return None
 
+def _timeframe_plan(resolutions, count):
+    """
+    (resolutions, base, base_count) for fetch_timeframes: the distinct
+    resolutions, the finest one, and how many of its bars cover `count` bars of
+    the coarsest.
+    """
+    resolutions = list(dict.fromkeys(check_resolution(r) for r in resolutions))
+    base = finest(resolutions)
+    for resolution in resolutions:
+        if not can_derive(base, resolution):
+            raise ValueError(f"{resolution} bars cannot be built from {base} bars; fetch them separately")
+    return resolutions, base, max(count * bars_per(r, base) for r in resolutions)
+
+
+def _split_timeframes(df, resolutions, base):
+    if df is None:
+        return None
+    return {r: df if r == base else resample(df, r) for r in resolutions}
+
+
+def _listed(rows, types):
+    return [row['symbol'] for row in rows if not types or row.get('type') in types]
+
+
+def _mock_times(resolution, count):
+    """
+    Epoch seconds of the last `count` mock bars of `resolution` up to now: daily
+    bars on consecutive days, weekly on Mondays, monthly on the 1st, intraday
+    ones through the regular session (13:30-20:00 UTC) of weekdays.
+    """
+    # Every symbol of a mock run shares the same calendar: build it once a minute
+    return _mock_calendar(resolution, count, int(time.time()) // 60).copy()
+
+
+@functools.lru_cache(maxsize=32)
+def _mock_calendar(resolution, count, minute):
+    import numpy as np
+    now = datetime.datetime.now()
+    if resolution in INTRADAY:
+        seconds = RESOLUTION_SECONDS[resolution]
+        per_session = bars_per('D', resolution)
+        days = pd.bdate_range(end=now, periods=count // per_session + 2, normalize=True)
+        opens = days.to_numpy().astype('datetime64[s]').view(np.int64) + 13 * 3600 + 1800
+        times = (opens[:, None] + np.arange(per_session) * seconds).ravel()
+        times = times[times <= int(time.time())]
+        return times[-count:]
+    freq = {'D': 'D', 'W': 'W-MON', 'M': 'MS'}[resolution]
+    dates = pd.date_range(end=now, periods=count, freq=freq, normalize=True)
+    return dates.to_numpy().astype('datetime64[s]').view(np.int64)
+
 if __name__ == "__main__":
     fetcher = DataFetcher()
     df = fetcher.fetch_candles('AAPL')
@@ -1,11 +1,26 @@
 import pandas as pd
 import numpy as np
-from ta.momentum import RSIIndicator
-from ta.trend import SMAIndicator
+from collections import deque
+import indicators
+
+# Model inputs computed by prepare_data
+FEATURES = ['RSI', 'SMA_20', 'SMA_50', 'Returns', 'Volume_Change']
+# Bars ahead the Target compares the close with
+TARGET_HORIZON = 3
+
+
+def timeframe_features(resolutions, base):
+    """
+    Feature columns added by `prepare_timeframes`: the base features plus one
+    suffixed copy per coarser resolution (e.g. 'RSI_W').
+    """
+    return FEATURES + [f"{name}_{res}" for res in resolutions if res != base for name in FEATURES]
+
 
 class FeatureEngineer:
     def __init__(self):
-        pass
+        # Per-symbol running indicator state for bar-by-bar updates
+        self.online = IncrementalIndicators()
 
     def prepare_data(self, df):
         """
@@ -13,41 +28,286 @@ class FeatureEngineer:
         """
         if df is None or df.empty:
             return None
-            
-        df = df.copy()
-        
-        # 1. RSI (14)
-        rsi = RSIIndicator(close=df['Close'], window=14)
-        df['RSI'] = rsi.rsi()
-        
-        # 2. Moving Averages
-        sma20 = SMAIndicator(close=df['Close'], window=20)
-        df['SMA_20'] = sma20.sma_indicator()
-        
-        sma50 = SMAIndicator(close=df['Close'], window=50)
-        df['SMA_50'] = sma50.sma_indicator()
-        
-        # 3. Returns
-        df['Returns'] = df['Close'].pct_change()
-        
-        # 4. Volume Change
-        df['Volume_Change'] = df['Volume'].pct_change()
-        
-        # 5. Target: 1 if Close(t+3) > Close(t), else 0
-        # We shift prediction target backwards because we want to predict FUTURE using CURRENT data
-        # Target for row `i` is based on comparision between `i+3` and `i`
-        df['Future_Close'] = df['Close'].shift(-3)
-        df['Target'] = (df['Future_Close'] > df['Close']).astype(int)
-        
-        # Drop rows with NaNs created by indicators and shifting
-        # We need to be careful not to drop the *last* rows if we want to run inference on them,
-        # but for TRAINING we must have targets.
-        
-        # For training, drop all NaNs
-        df_train = df.dropna().copy()
-        
+        # Indicators run in float64 whatever the storage type of the prices
+        close = df['Close'].to_numpy(dtype=np.float64)
+        block = feature_block(close, df['Volume'].to_numpy(dtype=np.float64))
+
+        # Target: 1 if Close(t+3) > Close(t), else 0. The last 3 rows, whose
+        # future close is unknown, get a placeholder 0.
+        columns = dict(zip(FEATURES, block))
+        columns['Target'] = np.nan_to_num(block[-1]).astype(np.int8)
+        # The candle columns stay views of the fetched arrays: only the feature
+        # block is new memory, and the frame is assembled in one step
+        features = pd.DataFrame(columns, index=df.index, copy=False)
+        full = pd.concat([df, features], axis=1)
+        full.attrs = dict(df.attrs)
+
+        # For training, keep rows whose features are all known (past the
+        # indicator warm-up), without the last 3 rows
+        usable = max(len(full) - TARGET_HORIZON, 0)
+        valid = ~np.isnan(block[:-1, :usable]).any(axis=0)
+        rows = np.flatnonzero(valid)
+        if len(rows) and rows[-1] - rows[0] == len(rows) - 1:
+            df_train = full.iloc[rows[0]:rows[-1] + 1]
+        else:
+            df_train = full.iloc[rows]
+        return full, df_train
+
+    def prepare_timeframes(self, frames, base=None):
+        """
+        Features of one symbol on several timeframes, joined onto the rows of the
+        finest one (`base`).
+
+        `frames` maps resolution -> candle frame, e.g. from
+        DataFetcher.fetch_timeframes. The base rows get the usual features and
+        target; each coarser resolution adds its features as `<name>_<res>`
+        columns. A row only sees the last coarse bar that had closed by the end of
+        its own bar, so nothing leaks from the future. Returns (full_df, train_df).
+        """
+        from resample import finest, bar_close
+
+        base = base or finest(frames)
+        prepared = self.prepare_data(frames[base])
+        if prepared is None:
+            return None
+        df, _ = prepared
+        # Join on the time each bar closes, as epoch seconds
+        closes = pd.DataFrame({'_close': bar_close(_epoch_seconds(df['Time']), base)})
+        for res, frame in frames.items():
+            if res == base:
+                continue
+            names = {name: f"{name}_{res}" for name in FEATURES}
+            coarse = self.prepare_data(frame)
+            if coarse is None:
+                for column in names.values():
+                    df[column] = np.nan
+                continue
+            coarse = coarse[0][FEATURES].rename(columns=names)
+            coarse['_close'] = bar_close(_epoch_seconds(frame['Time']), res)
+            joined = pd.merge_asof(closes, coarse, on='_close', direction='backward')
+            for column in names.values():
+                df[column] = joined[column].to_numpy()
+
+        df_train = df.iloc[:max(len(df) - 3, 0)].dropna()
         return df, df_train
 
+    def prepare_panel(self, panel, volume=None):
+        """
+        Compute the same features as `prepare_data` for many symbols in one pass.
+
+        `panel` is either a long-format DataFrame with 'Time', 'Symbol', 'Close' and
+        'Volume' columns, or a 2-D (bars x symbol) array of closes with a matching
+        `volume` array (NaN before a symbol's first bar). Every indicator kernel
+        runs once over the whole matrix, so the cost no longer scales with the
+        number of Python-level pipelines. A DataFrame is stacked per symbol, each
+        symbol's own bars in time order and right-aligned (as in the scanner), so
+        a symbol that misses a bar others have, e.g. during a halt, still gets
+        exactly what `prepare_data` gives on its own bars.
+
+        Returns (full_df, train_df) in long format for a DataFrame input, or a dict
+        of (bars x symbol) float arrays for an array input.
+        """
+        if isinstance(panel, pd.DataFrame):
+            if panel.empty:
+                return None
+            codes, symbols = pd.factorize(panel['Symbol'])
+            order = np.lexsort((panel['Time'].to_numpy(), codes))
+            counts = np.bincount(codes, minlength=len(symbols))
+            # Row of each sorted bar in its symbol's right-aligned column
+            starts = np.cumsum(counts) - counts
+            cols = codes[order]
+            rows = np.arange(len(order)) - starts[cols] + (counts.max() - counts[cols])
+            shape = (counts.max(), len(symbols))
+            close = np.full(shape, np.nan)
+            volume = np.full(shape, np.nan)
+            close[rows, cols] = panel['Close'].to_numpy(dtype=np.float64)[order]
+            volume[rows, cols] = panel['Volume'].to_numpy(dtype=np.float64)[order]
+            block = feature_block(close, volume)
+
+            # Scatter each symbol's values back onto the long rows
+            df = panel.copy()
+            values = np.empty(len(order))
+            for name, matrix in zip(FEATURES + ['Target'], block):
+                values[order] = matrix[rows, cols]
+                df[name] = values
+            df_train = df.dropna().copy()
+            df_train['Target'] = df_train['Target'].astype(int)
+            return df, df_train
+
+        block = feature_block(np.asarray(panel, dtype=np.float64), np.asarray(volume, dtype=np.float64))
+        return dict(zip(FEATURES + ['Target'], block))
+
+    def seed_online(self, symbol, df):
+        """
+        Reset the incremental state of `symbol` from its history; returns the
+        features of the last bar.
+        """
+        return self.online.seed(symbol, df)
+
+    def update_online(self, symbol, close, volume):
+        """
+        Features for one new bar of `symbol` in O(1), without touching history.
+        """
+        return self.online.update(symbol, close, volume)
+
+
+def _epoch_seconds(times):
+    return times.to_numpy().astype('datetime64[s]').view(np.int64)
+
+
+def feature_block(close, volume):
+    """
+    FEATURES then the target, as one (len(FEATURES) + 1, *close.shape) float64
+    block computed by the indicator kernels. `close` and `volume` are 1-D
+    series or (time x symbol) matrices, with NaN where a symbol has no bar.
+    """
+    block = np.empty((len(FEATURES) + 1,) + close.shape)
+    rsi, sma_20, sma_50, returns, volume_change, target = block
+    indicators.rsi(close, 14, out=rsi)
+    indicators.sma(close, 20, out=sma_20)
+    indicators.sma(close, 50, out=sma_50)
+    indicators.pct_change(close, out=returns)
+    indicators.pct_change(volume, out=volume_change)
+    indicators.forward_rise(close, TARGET_HORIZON, out=target)
+    return block
+
+
+class _RollingMean:
+    """
+    O(1) rolling mean with the same arithmetic as `indicators.sma`: a running
+    sum of the values since the block start, minus the running sum `window`
+    values earlier, so bar-by-bar updates give the batch results bit for bit.
+    Like the batch kernel it restarts the running sum every `SMA_ANCHOR`
+    windows, starting the next block's sum `window` values ahead.
+    """
+    __slots__ = ('window', 'block', 'count', 'sums', 'total', 'next_sums', 'next_total')
+
+    def __init__(self, window):
+        self.window = window
+        self.block = window * indicators.SMA_ANCHOR
+        self.count = 0
+        # Running sums of the last window + 1 values
+        self.sums = deque(maxlen=window + 1)
+        self.total = 0.0
+        self.next_sums = None
+        self.next_total = 0.0
+
+    def update(self, value):
+        position = self.count % self.block
+        if position == 0 and self.next_sums is not None:
+            self.sums, self.total = self.next_sums, self.next_total
+            self.next_sums = None
+        self.count += 1
+        self.total += value
+        self.sums.append(self.total)
+        if position >= self.block - self.window:
+            if self.next_sums is None:
+                self.next_sums = deque(maxlen=self.window + 1)
+                self.next_total = 0.0
+            self.next_total += value
+            self.next_sums.append(self.next_total)
+        if len(self.sums) <= self.window:
+            return self.total / self.window if len(self.sums) == self.window else float('nan')
+        return (self.total - self.sums[0]) / self.window
+
+
+class _WilderAverage:
+    """
+    O(1) equivalent of `indicators.wilder` (pandas' `ewm(alpha=1/window,
+    adjust=False, min_periods=window).mean()`, the smoothing `ta` uses for RSI),
+    including its normalisation step.
+    """
+    __slots__ = ('min_periods', 'old_wt_factor', 'new_wt', 'value', 'nobs')
+
+    def __init__(self, window):
+        self.min_periods = window
+        self.old_wt_factor = 1.0 - 1.0 / window
+        self.new_wt = 1.0 / window
+        self.value = None
+        self.nobs = 0
+
+    def update(self, x):
+        self.nobs += 1
+        if self.value is None:
+            self.value = x
+        elif self.value != x:
+            self.value = (self.old_wt_factor * self.value + self.new_wt * x) / (self.old_wt_factor + self.new_wt)
+        return self.value if self.nobs >= self.min_periods else float('nan')
+
+
+def _pct_change(current, previous):
+    if previous is None:
+        return float('nan')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.float64(current) / np.float64(previous) - 1)
+
+
+class _SymbolState:
+    __slots__ = ('gain', 'loss', 'sma_20', 'sma_50', 'last_close', 'last_volume')
+
+    def __init__(self, rsi_window):
+        self.gain = _WilderAverage(rsi_window)
+        self.loss = _WilderAverage(rsi_window)
+        self.sma_20 = _RollingMean(20)
+        self.sma_50 = _RollingMean(50)
+        self.last_close = None
+        self.last_volume = None
+
+
+class IncrementalIndicators:
+    """
+    Stateful per-symbol indicator engine: each new bar costs O(1).
+
+    Keeps Wilder's RSI averages, the SMA rolling windows and the last close and
+    volume for every symbol, and produces the same RSI, SMA_20, SMA_50, Returns and
+    Volume_Change values as the batch `prepare_data` (which uses `indicators`).
+    """
+
+    def __init__(self, rsi_window=14):
+        self.rsi_window = rsi_window
+        self._states = {}
+
+    def seed(self, symbol, df):
+        self._states.pop(symbol, None)
+        features = None
+        for close, volume in zip(df['Close'].to_numpy(dtype=float), df['Volume'].to_numpy(dtype=float)):
+            features = self.update(symbol, close, volume)
+        return features
+
+    def update(self, symbol, close, volume):
+        state = self._states.get(symbol)
+        if state is None:
+            state = self._states[symbol] = _SymbolState(self.rsi_window)
+        close = float(close)
+        volume = float(volume)
+
+        # Same as ta: the first bar has no diff and counts as a zero move
+        diff = 0.0 if state.last_close is None else close - state.last_close
+        avg_gain = state.gain.update(diff if diff > 0 else 0.0)
+        avg_loss = state.loss.update(-diff if diff < 0 else 0.0)
+        if avg_loss == 0:
+            rsi = 100.0
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rsi = float(100 - (100 / (1 + np.float64(avg_gain) / np.float64(avg_loss))))
+
+        features = {
+            'RSI': rsi,
+            'SMA_20': state.sma_20.update(close),
+            'SMA_50': state.sma_50.update(close),
+            'Returns': _pct_change(close, state.last_close),
+            'Volume_Change': _pct_change(volume, state.last_volume),
+        }
+        state.last_close = close
+        state.last_volume = volume
+        return features
+
+    def reset(self, symbol=None):
+        if symbol is None:
+            self._states.clear()
+        else:
+            self._states.pop(symbol, None)
+
 if __name__ == "__main__":
     # Mock data for testing
     data = {
@@ -0,0 +1,272 @@
+"""
+Kernels for the technical indicators used as model features.
+
+Every kernel takes a 1-D series or a 2-D (time x symbol) matrix, works along
+axis 0 and writes into `out` when it is given (a float64 array of the input's
+shape), so a caller can compute all features into one preallocated block.
+NaN marks a bar a column does not have (before a symbol's first bar, or a
+gap): smoothed averages carry their value over it, windows containing it are
+NaN, and warm-up is counted in actual bars, so a column that starts late gets
+exactly what it would get on its own. Warm-up rows are NaN, as in `ta`.
+
+RSI and EMA reproduce `ta` / pandas bit for bit (the same recurrence in the
+same order). SMA is a running-sum difference rather than pandas' compensated
+rolling sum; the running sums restart every SMA_ANCHOR windows, so its
+rounding error is bounded by that block (about 1e-12 relative to the price)
+instead of growing with the series. IncrementalIndicators repeats this
+arithmetic one bar at a time, so online and batch features are identical.
+
+The smoothing recurrence is sequential; it is compiled with Numba when Numba is
+installed, and otherwise runs as a plain float loop (series) or one vectorised
+step per bar (matrices). All versions do the same floating-point operations.
+"""
+import os
+import numpy as np
+
+# Set INDICATORS_NUMBA=0 to use the NumPy kernels even when Numba is installed
+USE_NUMBA = os.getenv('INDICATORS_NUMBA', '1') != '0'
+
+# SMA running sums restart every SMA_ANCHOR windows, counted from a column's first bar
+SMA_ANCHOR = 64
+
+# Compiled kernels, or False when Numba is not available (resolved on first use)
+_jit = None
+
+
+def _numba_kernels():
+    """
+    The Numba versions of the sequential kernels, compiled on first use, or None.
+    """
+    global _jit
+    if _jit is None:
+        _jit = False
+        if USE_NUMBA:
+            try:
+                import numba
+            except ImportError:
+                pass
+            else:
+                _jit = {'ewm': numba.njit(cache=True, nogil=True)(_ewm_loop)}
+    return _jit or None
+
+
+def _as_float(x):
+    return np.asarray(x, dtype=np.float64)
+
+
+def _output(x, out):
+    if out is None:
+        return np.empty(x.shape, dtype=np.float64)
+    if out.shape != x.shape or out.dtype != np.float64:
+        raise ValueError(f"out must be a float64 array of shape {x.shape}")
+    return out
+
+
+def sma(x, window, out=None):
+    """
+    Simple moving average over `window` bars.
+    """
+    x = _as_float(x)
+    out = _output(x, out)
+    n = len(x)
+    if n < window:
+        out[:] = np.nan
+        return out
+    block = window * SMA_ANCHOR
+    missing = np.isnan(x)
+    has_missing = missing.any()
+    filled = np.where(missing, 0.0, x) if has_missing else x
+    if n > block and filled is x and np.may_share_memory(x, out):
+        # Later blocks read rows that earlier ones have already written
+        filled = x.copy()
+    first = missing.argmin(axis=0) if has_missing and x.ndim == 2 and n > block else None
+    if first is not None and first.any():
+        # Blocks count from each column's first bar, as they would on its own
+        rows = np.arange(n)[:, None]
+        sums = _window_sums(np.take_along_axis(filled, np.minimum(rows + first, n - 1), axis=0),
+                            window, block, np.empty(x.shape, dtype=np.float64))
+        out[:] = np.take_along_axis(sums, np.maximum(rows - first, 0), axis=0)
+    else:
+        _window_sums(filled, window, block, out)
+    out[:window - 1] = np.nan
+    out[window - 1:] /= window
+    if has_missing:
+        present = np.cumsum(~missing, axis=0)
+        short = np.empty(out.shape, dtype=bool)
+        short[:window - 1] = True
+        short[window - 1] = present[window - 1] < window
+        np.less(present[window:] - present[:n - window], window, out=short[window:])
+        out[short] = np.nan
+    return out
+
+
+def _window_sums(x, window, block, out):
+    """
+    Sum of the `window` values ending at each row from `window - 1` on, as the
+    difference of running sums that restart every `block` rows (each block's
+    sums start `window` rows before it). Rows before `window - 1` are left as is.
+    """
+    n = len(x)
+    end = min(block, n)
+    sums = np.cumsum(x[:end], axis=0)
+    out[window - 1] = sums[window - 1]
+    np.subtract(sums[window:], sums[:end - window], out=out[window:end])
+    for start in range(block, n, block):
+        end = min(start + block, n)
+        sums = np.cumsum(x[start - window:end], axis=0)
+        np.subtract(sums[window:], sums[:end - start], out=out[start:end])
+    return out
+
+
+def ewm(x, alpha, min_periods=0, out=None):
+    """
+    Exponentially weighted mean, like pandas' `ewm(alpha=alpha, adjust=False,
+    min_periods=min_periods).mean()`: the first value starts the average and
+    each later one moves it by `alpha`.
+    """
+    x = _as_float(x)
+    out = _output(x, out)
+    if len(x) == 0:
+        return out
+    # Before the kernel runs: `out` may be `x` itself
+    missing = np.isnan(x)
+    kernels = _numba_kernels()
+    if kernels is not None:
+        kernels['ewm'](x.reshape(len(x), -1), alpha, out.reshape(len(x), -1))
+    elif x.ndim == 1:
+        out[:] = _ewm_list(x.tolist(), alpha)
+    else:
+        _ewm_rows(x, alpha, out)
+
+    if missing.any():
+        out[np.cumsum(~missing, axis=0) < min_periods] = np.nan
+    else:
+        out[:max(min_periods - 1, 0)] = np.nan
+    return out
+
+
+def _ewm_loop(x, alpha, out):
+    # Reference version, compiled by Numba; x and out are (time x columns)
+    old = 1.0 - alpha
+    norm = old + alpha
+    for j in range(x.shape[1]):
+        value = np.nan
+        for i in range(x.shape[0]):
+            v = x[i, j]
+            if v == v:
+                if value != value:
+                    value = v
+                elif value != v:
+                    value = (old * value + alpha * v) / norm
+            out[i, j] = value
+
+
+def _ewm_list(values, alpha):
+    # _ewm_loop on Python floats, for one series
+    old = 1.0 - alpha
+    norm = old + alpha
+    value = float('nan')
+    result = []
+    append = result.append
+    for v in values:
+        if v == v:
+            if value != value:
+                value = v
+            elif value != v:
+                value = (old * value + alpha * v) / norm
+        append(value)
+    return result
+
+
+def _ewm_rows(x, alpha, out):
+    # _ewm_loop with one vectorised step per bar across all columns
+    old = 1.0 - alpha
+    norm = old + alpha
+    value = np.full(x.shape[1:], np.nan)
+    for i in range(len(x)):
+        v = x[i].copy()
+        row = out[i]
+        np.multiply(old, value, out=row)
+        row += alpha * v
+        row /= norm
+        np.copyto(row, value, where=value == v)
+        np.copyto(row, v, where=np.isnan(value))
+        np.copyto(row, value, where=np.isnan(v))
+        value = row
+
+
+def wilder(x, window, out=None):
+    """
+    Wilder's smoothing (alpha = 1 / window), as `ta` uses for RSI and ATR.
+    """
+    return ewm(x, 1.0 / window, window, out)
+
+
+def ema(x, window, out=None):
+    """
+    Exponential moving average over a `window`-bar span, as `ta.trend.EMAIndicator`.
+    """
+    return ewm(x, 2.0 / (window + 1), window, out)
+
+
+def rsi(close, window=14, out=None):
+    """
+    Relative Strength Index with Wilder's smoothing, as `ta.momentum.RSIIndicator`.
+    A symbol's first bar counts as no move.
+    """
+    close = _as_float(close)
+    out = _output(close, out)
+    if len(close) == 0:
+        return out
+    # Gains and losses, then their averages, in two scratch arrays
+    gain = np.empty_like(close)
+    loss = np.empty_like(close)
+    gain[0] = 0.0
+    np.subtract(close[1:], close[:-1], out=gain[1:])
+    np.negative(gain, out=loss)
+    # fmax: a move from a missing bar counts as no move
+    np.fmax(gain, 0.0, out=gain)
+    np.fmax(loss, 0.0, out=loss)
+    missing = np.isnan(close)
+    if missing.any():
+        gain[missing] = np.nan
+        loss[missing] = np.nan
+    wilder(gain, window, out=gain)
+    wilder(loss, window, out=loss)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(gain, loss, out=out)
+        out += 1
+        np.divide(100, out, out=out)
+        np.subtract(100, out, out=out)
+    out[loss == 0] = 100.0
+    return out
+
+
+def pct_change(x, periods=1, out=None):
+    """
+    Relative change from `periods` bars earlier (`x / x.shift(periods) - 1`).
+    """
+    x = _as_float(x)
+    out = _output(x, out)
+    out[:periods] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(x[periods:], x[:len(x) - periods], out=out[periods:])
+    out[periods:] -= 1
+    return out
+
+
+def forward_rise(close, horizon, out=None):
+    """
+    1.0 where the close `horizon` bars later is higher, 0.0 where not, NaN where
+    either close is unknown (e.g. the last `horizon` bars).
+    """
+    close = _as_float(close)
+    out = _output(close, out)
+    m = max(len(close) - horizon, 0)
+    now, later = close[:m], close[horizon:]
+    np.greater(later, now, out=out[:m])
+    out[m:] = np.nan
+    unknown = np.isnan(later) | np.isnan(now)
+    if unknown.any():
+        out[:m][unknown] = np.nan
+    return out
@@ -0,0 +1,224 @@
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import argparse
+import threading
+import subprocess
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# Pipeline stages, in order
+STAGES = ['fetch', 'prepare_data', 'train', 'predict', 'render']
+
+
+class StageTimer:
+    """
+    Collects per-stage timings for one pipeline run.
+
+    `with timer.stage('train') as rec: ...` records wall time and CPU time of the
+    block; set rec['rows'] / rec['bytes'] inside it to record data volume. CPU time
+    is the calling thread's, so it stays meaningful on a thread pool.
+    """
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name, rows=0, nbytes=0):
+        rec = {'rows': rows, 'bytes': nbytes}
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield rec
+        finally:
+            rec['wall'] = time.perf_counter() - wall
+            rec['cpu'] = time.thread_time() - cpu
+            self.timings[name] = rec
+
+
+class MetricsRegistry:
+    """
+    Process-wide store of pipeline stage metrics per (symbol, stage).
+
+    Keeps cumulative counters (calls, wall/CPU seconds, rows, bytes) plus the last
+    `max_samples` wall times of each stage for latency percentiles. Exported as
+    JSON (`to_json`) or in the Prometheus text format (`to_prometheus`), optionally
+    over HTTP with `serve(port)`.
+    """
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._totals = {}
+        self._samples = {}
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def record(self, symbol, timings):
+        """
+        Add the timings of one run (a StageTimer.timings dict) for `symbol`.
+        """
+        with self._lock:
+            for stage, rec in timings.items():
+                totals = self._totals.setdefault((symbol, stage), dict.fromkeys(
+                    ('calls', 'wall', 'cpu', 'rows', 'bytes'), 0))
+                totals['calls'] += 1
+                for key in ('wall', 'cpu', 'rows', 'bytes'):
+                    totals[key] += rec.get(key, 0)
+                self._samples.setdefault(stage, deque(maxlen=self.max_samples)).append(rec['wall'])
+                self._latest.setdefault(symbol, {})[stage] = dict(rec)
+
+    @contextmanager
+    def stage(self, symbol, name, rows=0, nbytes=0):
+        """
+        Time a single stage outside of a pipeline run (e.g. dashboard rendering).
+        """
+        timer = StageTimer()
+        with timer.stage(name, rows, nbytes) as rec:
+            yield rec
+        self.record(symbol, timer.timings)
+
+    def latest(self, symbol):
+        with self._lock:
+            return {stage: dict(rec) for stage, rec in self._latest.get(symbol, {}).items()}
+
+    def summary(self):
+        """
+        One row per stage: call count, mean / p50 / p95 wall ms, CPU seconds, rows, bytes.
+        """
+        with self._lock:
+            rows = []
+            for stage in sorted(self._samples, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+                samples = np.array(self._samples[stage]) * 1000
+                totals = [t for (_, st), t in self._totals.items() if st == stage]
+                rows.append({
+                    'stage': stage,
+                    'calls': sum(t['calls'] for t in totals),
+                    'mean_ms': float(samples.mean()),
+                    'p50_ms': float(np.percentile(samples, 50)),
+                    'p95_ms': float(np.percentile(samples, 95)),
+                    'cpu_s': sum(t['cpu'] for t in totals),
+                    'rows': sum(t['rows'] for t in totals),
+                    'bytes': sum(t['bytes'] for t in totals),
+                })
+            return rows
+
+    def to_json(self):
+        with self._lock:
+            per_symbol = {}
+            for (symbol, stage), totals in self._totals.items():
+                per_symbol.setdefault(symbol, {})[stage] = dict(totals)
+        return json.dumps({'stages': self.summary(), 'symbols': per_symbol}, indent=2)
+
+    def to_prometheus(self):
+        metrics = [
+            ('calls', 'stock_stage_calls_total', 'Pipeline stage executions'),
+            ('wall', 'stock_stage_wall_seconds_total', 'Wall-clock seconds spent in the stage'),
+            ('cpu', 'stock_stage_cpu_seconds_total', 'CPU seconds spent in the stage'),
+            ('rows', 'stock_stage_rows_total', 'Rows processed by the stage'),
+            ('bytes', 'stock_stage_bytes_total', 'Bytes of candle data handled by the stage'),
+        ]
+        with self._lock:
+            items = sorted(self._totals.items())
+        lines = []
+        for key, name, help_text in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (symbol, stage), totals in items:
+                lines.append(f'{name}{{symbol="{symbol}",stage="{stage}"}} {totals[key]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+            self._samples.clear()
+            self._latest.clear()
+
+    def serve(self, port=9108, host='127.0.0.1'):
+        """
+        Serve /metrics (Prometheus text) and /metrics.json on a background thread.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, ctype = registry.to_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, ctype = registry.to_json(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+# Default registry shared by the predictor and the dashboard
+REGISTRY = MetricsRegistry()
+
+
+def profile_call(fn, *args, sort='cumulative', limit=30, output=None, **kwargs):
+    """
+    Run `fn` once under cProfile. Returns (result, report text); with `output`, the
+    raw stats are also dumped there for snakeviz / pstats.
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+    if output:
+        profiler.dump_stats(output)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats(sort).print_stats(limit)
+    return result, stream.getvalue()
+
+
+def import_times(module, python=None):
+    """
+    Cold-start import cost of `module`, measured in a fresh interpreter with
+    `python -X importtime`. Returns {'total_ms': ..., 'packages': [(package, ms), ...]}
+    with the self time of every imported module summed per top-level package,
+    most expensive first.
+    """
+    proc = subprocess.run([python or sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    packages, total = {}, 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        if name == module:
+            total = int(cumulative_us)
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    ranked = sorted(((pkg, us / 1000) for pkg, us in packages.items()), key=lambda item: -item[1])
+    return {'total_ms': total / 1000, 'packages': ranked}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report cold-start import cost per package")
+    parser.add_argument('modules', nargs='*', default=['predictor'])
+    parser.add_argument('--top', type=int, default=15, help="packages to list per module")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        report = import_times(module)
+        print(f"import {module}: {report['total_ms']:.0f} ms")
+        for package, ms in report['packages'][:args.top]:
+            print(f"  {package:<28} {ms:8.1f} ms")
@@ -1,26 +1,60 @@
-import xgboost as xgb
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, classification_report
 import pandas as pd
 import numpy as np
 import os
-import joblib
+import time
+
+# xgboost (which pulls in sklearn and scipy), sklearn.metrics and joblib are
+# imported on first use: they dominate start-up time, and paths like mock mode,
+# cached results or the dashboard's first paint never need them.
+
+# Per-symbol model settings when nothing has been tuned (see tuning.py)
+DEFAULT_PARAMS = {'n_estimators': 100, 'learning_rate': 0.1, 'max_depth': 3}
 
 class ModelTrainer:
-    def __init__(self):
-        self.model = xgb.XGBClassifier(
+    def __init__(self, n_jobs=None, features=None, params=None):
+        self.n_jobs = n_jobs
+        self._model = None
+        # Tuned settings (e.g. from tuning.ParamStore) on top of DEFAULT_PARAMS;
+        # any XGBClassifier argument is accepted
+        self.tuned_params = dict(params or {})
+        self.params = {**DEFAULT_PARAMS, **self.tuned_params}
+        # Other feature sets, e.g. feature_engineering.timeframe_features(...) for
+        # a multi-timeframe model
+        self.features = list(features) if features else ['RSI', 'SMA_20', 'SMA_50', 'Returns', 'Volume_Change']
+        # Fast path state: (model, its booster), replaced as one pair so threads
+        # sharing the trainer never see a booster of another model
+        self._booster = (None, None)
+
+    @property
+    def model(self):
+        # Created on first use so that constructing a trainer does not import xgboost
+        if self._model is None:
+            self._model = self._new_model()
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    def _new_model(self, n_estimators=None):
+        import xgboost as xgb
+        params = dict(self.params)
+        if n_estimators is not None:
+            params['n_estimators'] = n_estimators
+        return xgb.XGBClassifier(
             objective='binary:logistic',
-            n_estimators=100,
-            learning_rate=0.1,
-            max_depth=3,
             random_state=42,
-            eval_metric='logloss'
+            eval_metric='logloss',
+            n_jobs=self.n_jobs,
+            **params
         )
-        self.features = ['RSI', 'SMA_20', 'SMA_50', 'Returns', 'Volume_Change']
 
-    def train(self, df):
+    def train(self, df, init_model=None, extra_trees=None):
         """
         Train the XGBoost model.
+
+        With `init_model`, boosting continues from that model's booster and only
+        `extra_trees` new trees are added instead of fitting from zero.
         """
         X = df[self.features]
         y = df['Target']
@@ -31,9 +65,17 @@ class ModelTrainer:
         X_train, X_test = X.iloc[:split_idx], X.iloc[split_idx:]
         y_train, y_test = y.iloc[:split_idx], y.iloc[split_idx:]
         
-        self.model.fit(X_train, y_train)
+        # Always fit a new estimator: self.model may be a cached model shared with
+        # a ModelRegistry, which must not be modified in place
+        if init_model is not None:
+            self.model = self._new_model(n_estimators=extra_trees or 20)
+            self.model.fit(X_train, y_train, xgb_model=init_model.get_booster())
+        else:
+            self.model = self._new_model()
+            self.model.fit(X_train, y_train)
         
         # Evaluate
+        from sklearn.metrics import accuracy_score
         preds = self.model.predict(X_test)
         acc = accuracy_score(y_test, preds)
         print(f"Model Accuracy: {acc:.4f}")
@@ -42,10 +84,12 @@ class ModelTrainer:
         return self.model, acc
 
     def save_model(self, path='model.pkl'):
+        import joblib
         joblib.dump(self.model, path)
         
     def load_model(self, path='model.pkl'):
         if os.path.exists(path):
+            import joblib
             self.model = joblib.load(path)
             return True
         return False
@@ -54,6 +98,111 @@ class ModelTrainer:
         # inputs X should be a dataframe with the same feature columns
         return self.model.predict_proba(X[self.features])[:, 1]
 
+    def feature_vector(self, df, row=-1, out=None):
+        """
+        Features of one row of `df` as a (1, n_features) float32 array, written into
+        `out` or into a new array (never a buffer shared between calls, since one
+        trainer may serve several threads).
+        """
+        if out is None:
+            out = np.empty((1, len(self.features)), dtype=np.float32)
+        for i, col in enumerate(self.features):
+            out[0, i] = df[col].to_numpy()[row]
+        return out
+
+    def predict_fast(self, X):
+        """
+        Probability of a rise for a float array of shape (n_features,) or
+        (n_rows, n_features), in `self.features` order.
+
+        Calls the booster's inplace_predict directly, skipping the DataFrame
+        indexing and sklearn wrapper of predict_proba. Scoring one row takes
+        microseconds instead of milliseconds.
+        """
+        model = self.model
+        cached, booster = self._booster
+        if cached is not model:
+            booster = model.get_booster()
+            self._booster = (model, booster)
+        return booster.inplace_predict(np.atleast_2d(X), validate_features=False)
+
+class PooledModelTrainer:
+    """
+    One XGBoost model for the whole watchlist instead of one per symbol.
+
+    Every symbol's rows are stacked into a single DMatrix. Price-level features are
+    normalised so symbols are comparable (SMA_20 / SMA_50 become distances from the
+    close, RSI is scaled to 0-1), and the symbol itself is an optional categorical
+    feature. A single `predict_proba` call scores the latest row of every symbol.
+    """
+
+    def __init__(self, n_estimators=200, learning_rate=0.1, max_depth=4, use_symbol=True, n_jobs=None):
+        self.features = ['RSI', 'SMA_20', 'SMA_50', 'Returns', 'Volume_Change']
+        self.params = {
+            'objective': 'binary:logistic',
+            'eval_metric': 'logloss',
+            'eta': learning_rate,
+            'max_depth': max_depth,
+            'seed': 42,
+        }
+        if n_jobs is not None:
+            self.params['nthread'] = n_jobs
+        self.n_estimators = n_estimators
+        self.use_symbol = use_symbol
+        self.booster = None
+        self.symbols = []
+        self.trained_at = None
+        self.accuracy = None
+
+    def normalize(self, df):
+        """
+        Scale-free version of the feature columns of a long-format frame.
+        """
+        X = pd.DataFrame({
+            'RSI': df['RSI'] / 100.0,
+            'SMA_20': df['SMA_20'] / df['Close'] - 1,
+            'SMA_50': df['SMA_50'] / df['Close'] - 1,
+            'Returns': df['Returns'],
+            'Volume_Change': df['Volume_Change'],
+        }, index=df.index).replace([np.inf, -np.inf], np.nan)
+        if self.use_symbol:
+            X['Symbol'] = pd.Categorical(df['Symbol'], categories=self.symbols)
+        return X
+
+    def _dmatrix(self, df, label=None):
+        import xgboost as xgb
+        return xgb.DMatrix(self.normalize(df), label=label, enable_categorical=self.use_symbol)
+
+    def train(self, df):
+        """
+        Fit on a long-format training frame (one row per symbol and bar, with a
+        'Symbol' column and a 'Target'), e.g. FeatureEngineer.prepare_panel output.
+        """
+        import xgboost as xgb
+        from sklearn.metrics import accuracy_score
+
+        self.symbols = sorted(df['Symbol'].unique())
+
+        # Time-series split across the whole panel: last 20% of timestamps for test
+        cutoff = df['Time'].quantile(0.8)
+        train, test = df[df['Time'] <= cutoff], df[df['Time'] > cutoff]
+
+        self.booster = xgb.train(self.params, self._dmatrix(train, train['Target']),
+                                 num_boost_round=self.n_estimators)
+        self.accuracy = float('nan')
+        if not test.empty:
+            preds = self.booster.predict(self._dmatrix(test)) > 0.5
+            self.accuracy = accuracy_score(test['Target'], preds)
+            print(f"Pooled Model Accuracy ({len(self.symbols)} symbols): {self.accuracy:.4f}")
+        self.trained_at = time.time()
+        return self.booster, self.accuracy
+
+    def predict_proba(self, df):
+        """
+        Probability of a rise for every row of a long-format frame, in one call.
+        """
+        return self.booster.predict(self._dmatrix(df))
+
 if __name__ == "__main__":
     # Mock usage
     pass
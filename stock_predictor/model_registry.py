@@ -0,0 +1,172 @@
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import pandas as pd
+
+
+class ModelRegistry:
+    """
+    Per-symbol, versioned on-disk cache of trained models.
+
+    A model is stored under a key made of the symbol, the bar resolution it was
+    trained on and a hash of the feature set and parameters, and every save writes a new version (``<key>_v<N>.pkl`` via ModelTrainer.save_model
+    plus a ``.json`` sidecar holding the last training bar, accuracy and age).
+    A cached model is reused until `max_new_bars` bars have arrived after its last
+    training bar or it is older than `max_age` seconds. When `warm_start` is on, a
+    stale model is refreshed by boosting `warm_start_trees` more trees on top of the
+    existing booster; after `max_warm_starts` continuations it is refitted from zero.
+    """
+
+    def __init__(self, cache_dir='model_cache', max_new_bars=5, max_age=24 * 3600,
+                 warm_start=True, warm_start_trees=20, max_warm_starts=5, keep_versions=2):
+        self.cache_dir = cache_dir
+        self.max_new_bars = max_new_bars
+        self.max_age = max_age
+        self.warm_start = warm_start
+        self.warm_start_trees = warm_start_trees
+        self.max_warm_starts = max_warm_starts
+        self.keep_versions = keep_versions
+        self._models = {}  # model path -> loaded model, so reuse skips the disk
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Sent to analyze_many worker processes: drop the lock and in-memory models
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_models'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def model_key(symbol, features, params=None, resolution='D'):
+        # Tuned parameters are part of the key, so a new tuning result retrains
+        # instead of reusing a model fitted with the old settings
+        text = ','.join(features)
+        if params:
+            text += json.dumps(params, sort_keys=True)
+        digest = hashlib.sha1(text.encode()).hexdigest()[:8]
+        # Models of other resolutions (e.g. the streamer's minute bars) never
+        # serve or warm-start a daily one; daily keys keep their old form
+        if resolution == 'D':
+            return f"{symbol.upper()}_{digest}"
+        return f"{symbol.upper()}_{resolution}_{digest}"
+
+    def _versions(self, key):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        pattern = re.compile(re.escape(key) + r'_v(\d+)\.json$')
+        return sorted(int(m.group(1)) for m in map(pattern.match, os.listdir(self.cache_dir)) if m)
+
+    def _path(self, key, version, ext):
+        return os.path.join(self.cache_dir, f"{key}_v{version}.{ext}")
+
+    def latest(self, symbol, features, params=None, resolution='D'):
+        """
+        Return the metadata of the newest cached version, or None.
+        """
+        key = self.model_key(symbol, features, params, resolution)
+        versions = self._versions(key)
+        if not versions:
+            return None
+        try:
+            with open(self._path(key, versions[-1], 'json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_stale(self, meta, train_df):
+        """
+        Staleness policy: enough new training bars, or too old.
+        """
+        last_bar = pd.Timestamp(meta['last_bar'])
+        new_bars = int((train_df['Time'] > last_bar).sum())
+        age = time.time() - meta['trained_at']
+        return new_bars >= self.max_new_bars or age > self.max_age
+
+    def load_into(self, trainer, meta):
+        """
+        Put the cached model described by `meta` into `trainer.model`.
+        """
+        path = meta['path']
+        with self._lock:
+            model = self._models.get(path)
+        if model is not None:
+            trainer.model = model
+            return True
+        if not trainer.load_model(path):
+            return False
+        with self._lock:
+            self._models[path] = trainer.model
+        return True
+
+    def save(self, trainer, symbol, last_bar, accuracy, warm_starts=0, resolution='D'):
+        """
+        Store `trainer.model` as a new version and return its metadata.
+        """
+        key = self.model_key(symbol, trainer.features, trainer.tuned_params, resolution)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        versions = self._versions(key)
+        version = versions[-1] + 1 if versions else 1
+
+        meta = {
+            'symbol': symbol.upper(),
+            'resolution': resolution,
+            'features': list(trainer.features),
+            'version': version,
+            'path': self._path(key, version, 'pkl'),
+            'last_bar': pd.Timestamp(last_bar).isoformat(),
+            'trained_at': time.time(),
+            'accuracy': float(accuracy),
+            'warm_starts': warm_starts,
+        }
+        trainer.save_model(meta['path'])
+        # The sidecar is written last (atomically) so a version is only visible
+        # once its model file is complete
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(key, version, 'json'))
+
+        with self._lock:
+            self._models[meta['path']] = trainer.model
+        self._prune(key, versions + [version])
+        return meta
+
+    def _prune(self, key, versions):
+        for old in versions[:-self.keep_versions]:
+            for ext in ('json', 'pkl'):
+                path = self._path(key, old, ext)
+                with self._lock:
+                    self._models.pop(path, None)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def get_or_train(self, trainer, symbol, train_df, resolution='D'):
+        """
+        Load a fresh cached model into `trainer`, or (re)train and cache one, for
+        bars of `resolution`.
+
+        Returns (accuracy, meta, retrained).
+        """
+        meta = self.latest(symbol, trainer.features, trainer.tuned_params, resolution)
+        if meta is not None and not self.is_stale(meta, train_df) and self.load_into(trainer, meta):
+            return meta['accuracy'], meta, False
+
+        init_model = None
+        warm_starts = 0
+        if (self.warm_start and meta is not None and meta['warm_starts'] < self.max_warm_starts
+                and self.load_into(trainer, meta)):
+            init_model = trainer.model
+            warm_starts = meta['warm_starts'] + 1
+
+        _, acc = trainer.train(train_df, init_model=init_model,
+                               extra_trees=self.warm_start_trees if init_model is not None else None)
+        meta = self.save(trainer, symbol, train_df['Time'].iloc[-1], acc, warm_starts, resolution)
+        return acc, meta, True
@@ -2,72 +2,428 @@ import pandas as pd
 import numpy as np
 from data_fetcher import DataFetcher
 from feature_engineering import FeatureEngineer
-from model import ModelTrainer
+from model import ModelTrainer, PooledModelTrainer
+from candle_store import CandleStore
+from model_registry import ModelRegistry
+from metrics import REGISTRY, StageTimer, profile_call
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import multiprocessing
+import threading
+import time
 import os
+import argparse
+
+# Signal thresholds on the predicted probability of a rise
+BUY_THRESHOLD = 0.6
+SELL_THRESHOLD = 0.4
+
+# With a result cache, the analysis of a given (symbol, last bar) is reused for this long
+BAR_RESULT_TTL = 3600
+
+
+def signal_for(prob):
+    if prob > BUY_THRESHOLD:
+        return "BUY"
+    if prob < SELL_THRESHOLD:
+        return "SELL"
+    return "HOLD"
+
 
 class StockPredictor:
-    def __init__(self, api_key=None):
-        self.fetcher = DataFetcher(api_key)
+    def __init__(self, api_key=None, cache_dir=None, model_dir=None, mock_fallback=False, metrics=None,
+                 result_cache=None, param_store=None):
+        # With a cache_dir, candles are kept in a local CandleStore and only new
+        # bars are fetched on each refresh.
+        store = CandleStore(cache_dir) if cache_dir else None
+        self.fetcher = DataFetcher(api_key, store=store, mock_fallback=mock_fallback)
         self.fe = FeatureEngineer()
         self.trainer = ModelTrainer()
-        self.model_path = 'trained_model.pkl'
+        # With a model_dir, trained models are cached per symbol and reused until
+        # the registry's staleness policy asks for a retrain.
+        self.registry = ModelRegistry(model_dir) if model_dir else None
+        # Cross-sectional model shared by every symbol, see analyze_pooled
+        self.pooled = PooledModelTrainer()
+        self._pooled_lock = threading.Lock()
+        # Per-stage timings of every run are recorded here (see metrics.py)
+        self.metrics = metrics or REGISTRY
+        # Optional ResultCache, usually shared by every predictor in the process:
+        # the latest result per symbol is reused for the cache's TTL, concurrent
+        # requests for a symbol are coalesced into one run, and a result is reused
+        # as long as the symbol's last bar has not changed.
+        self.result_cache = result_cache
+        # Optional tuning.ParamStore: symbols with tuned parameters (or a tuned
+        # universe entry) are trained with those instead of the defaults
+        self.param_store = param_store
+        # Process pool of analyze_many, created on first use and kept until close()
+        self._cpu_pool = None
+        self._cpu_workers = 0
+        self._pool_lock = threading.Lock()
+
+    def _result_key(self, symbol):
+        return ('latest', symbol, self.fetcher.mock_fallback)
+
+    def _bar_key(self, symbol, df, resolution='D'):
+        last_bar = int(df['Time'].values[-1].astype('datetime64[s]').astype(np.int64))
+        return ('bar', symbol, resolution, self.fetcher.mock_fallback, last_bar, len(df))
 
     def analyze_stock(self, symbol):
         """
         Full pipeline: Fetch -> Feature Eng -> Train/Load Model -> Predict
         """
+        if self.result_cache is None:
+            return self._analyze_stock(symbol)
+        return self.result_cache.get_or_compute(self._result_key(symbol), lambda: self._analyze_stock(symbol),
+                                                should_store=lambda result: 'error' not in result)
+
+    def _analyze_stock(self, symbol):
         # 1. Fetch Data
+        fetched = self._fetch_for_analysis(symbol)
+        if 'error' in fetched:
+            return fetched
+
+        return self.analyze_candles(symbol, fetched['data'], fetched['timings'])
+
+    def analyze_candles(self, symbol, df, timings=None, resolution='D'):
+        """
+        Feature Eng -> Train -> Predict on candles that were already fetched.
+        `resolution` is their bar length; cached models are kept per resolution.
+        """
+        if self.result_cache is not None and len(df):
+            key = self._bar_key(symbol, df, resolution)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                return cached
+        # A trainer per call: the predictor is shared by dashboard sessions and
+        # scan threads, and the pipeline swaps the trainer's model. self.trainer
+        # keeps the latest one.
+        trainer = ModelTrainer(params=self._params_for(symbol))
+        result = _run_pipeline(symbol, df, self.fe, trainer, self.registry, resolution)
+        self.trainer = trainer
+        result = self._record(symbol, result, timings)
+        if self.result_cache is not None and len(df) and 'error' not in result:
+            self.result_cache.put(key, result, ttl=BAR_RESULT_TTL)
+        return result
+
+    def _params_for(self, symbol):
+        return self.param_store.get(symbol) if self.param_store is not None else None
+
+    def _record(self, symbol, result, fetch_timings=None):
+        result['timings'] = {**(fetch_timings or {}), **result.get('timings', {})}
+        self.metrics.record(symbol, result['timings'])
+        return result
+
+    def analyze_many(self, symbols, max_workers=8, processes=None, keep_data=True, fresh=False):
+        """
+        Analyze a batch of symbols concurrently, yielding each result as it completes.
+
+        Fetching (network bound) runs on a thread pool of `max_workers` threads.
+        Feature engineering and training (CPU bound) run on a process pool of
+        `processes` workers (defaults to the CPU count); pass processes=0 to keep
+        everything on the thread pool. The process pool is started on the first
+        call and reused by later ones until `close()`. Every yielded dict carries
+        'symbol', and a failure for one symbol is reported as that symbol's
+        {'error': ...} result without affecting the others. With keep_data=False the 'data' frame is
+        dropped in the worker, so only the small result dict is sent back.
+
+        With a result cache, cached symbols are yielded first and symbols another
+        caller is already analyzing are awaited rather than analyzed twice. With
+        fresh=True the cached latest results are not served (every symbol is
+        fetched again), but an unchanged last bar still reuses its analysis.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        cache = self.result_cache
+        if cache is None:
+            yield from self._analyze_many(symbols, max_workers, processes, keep_data)
+            return
+
+        owned, waiting = [], {}
+        for sym in symbols:
+            cached = None if fresh else cache.get(self._result_key(sym))
+            if cached is not None:
+                yield cached
+                continue
+            future, owner = cache.claim(self._result_key(sym), fresh=fresh)
+            if owner:
+                owned.append(sym)
+            else:
+                waiting[sym] = future
+
+        unresolved = set(owned)
         try:
-            df = self.fetcher.fetch_candles(symbol, count=300) # Fetch enough for indicators
-            if df is None:
-                return {'error': 'No data returned from API (Check symbol or date range)'}
+            for result in self._analyze_many(owned, max_workers, processes, keep_data):
+                cache.resolve(self._result_key(result['symbol']), result, store='error' not in result and keep_data)
+                unresolved.discard(result['symbol'])
+                yield result
+        finally:
+            # Never leave other callers waiting on a run that was abandoned
+            for sym in unresolved:
+                cache.fail(self._result_key(sym), RuntimeError(f"analysis of {sym} was abandoned"))
+
+        for sym, future in waiting.items():
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {'symbol': sym, 'error': str(e)}
+
+    def _analyze_many(self, symbols, max_workers, processes, keep_data=True):
+        if not symbols:
+            return
+        if processes is None:
+            processes = os.cpu_count() or 1
+
+        io_pool = ThreadPoolExecutor(max_workers=min(max_workers, len(symbols)))
+        cpu_pool = self._process_pool(processes) if processes > 0 else None
+
+        fetch_timings, bar_keys = {}, {}
+        pending = {}
+        try:
+            pending.update({io_pool.submit(self._fetch_for_analysis, sym): ('fetch', sym) for sym in symbols})
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, sym = pending.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        yield {'symbol': sym, 'error': str(e)}
+                        continue
+
+                    if stage == 'fetch' and 'error' not in outcome:
+                        if self.result_cache is not None:
+                            # Same last bar as a cached run: reuse its result
+                            bar_keys[sym] = self._bar_key(sym, outcome['data'])
+                            cached = self.result_cache.get(bar_keys[sym])
+                            if cached is not None:
+                                yield cached
+                                continue
+                        pool = cpu_pool or io_pool
+                        task = pool.submit(_analyze_candles_task, sym, outcome['data'], self.registry, keep_data,
+                                           self._params_for(sym))
+                        pending[task] = ('analyze', sym)
+                        fetch_timings[sym] = outcome['timings']
+                        continue
+
+                    outcome.setdefault('symbol', sym)
+                    # Stage timings measured in a worker process travel back in the result
+                    outcome = self._record(sym, outcome, fetch_timings.pop(sym, None))
+                    if sym in bar_keys and 'error' not in outcome and keep_data:
+                        self.result_cache.put(bar_keys.pop(sym), outcome, ttl=BAR_RESULT_TTL)
+                    yield outcome
+        finally:
+            io_pool.shutdown(wait=False, cancel_futures=True)
+            # The process pool outlives this call: only drop the work still queued on it
+            for future in pending:
+                future.cancel()
+
+    def _process_pool(self, processes):
+        """
+        Worker processes for the CPU-bound stages, started on first use and kept
+        for later calls. Asking for another size, or a pool whose worker died,
+        replaces it.
+        """
+        with self._pool_lock:
+            pool = self._cpu_pool
+            if pool is not None and (self._cpu_workers != processes or getattr(pool, '_broken', False)):
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = None
+            if pool is None:
+                # Forking a process that has already run XGBoost's OpenMP threads can
+                # deadlock, so workers are started from a clean forkserver instead.
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(method))
+                self._cpu_pool, self._cpu_workers = pool, processes
+            return pool
+
+    def close(self):
+        """
+        Stop the worker processes started by analyze_many, if any.
+        """
+        with self._pool_lock:
+            pool, self._cpu_pool = self._cpu_pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def analyze_pooled(self, symbols, refit_interval=24 * 3600, max_workers=8, train_symbols=None):
+        """
+        Analyze a watchlist with one pooled model instead of one model per symbol.
+
+        Candles are fetched concurrently, features for all symbols are computed in
+        one `prepare_panel` pass, and the latest rows are scored with a single
+        `predict_proba` call. The pooled model stays in memory and is refitted only
+        when it is older than `refit_interval` seconds or has not seen one of the
+        symbols. A refit trains on `symbols` plus `train_symbols`, if given (e.g.
+        the whole watchlist when only part of it is due), so the model keeps
+        covering the others. Returns a list of results in watchlist order.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols))) as pool:
+            fetched = dict(zip(symbols, pool.map(self._fetch_for_analysis, symbols)))
+
+        results = {sym: dict(out, symbol=sym) for sym, out in fetched.items() if 'error' in out}
+        frames = [out['data'].assign(Symbol=sym) for sym, out in fetched.items() if 'error' not in out]
+        for sym, out in fetched.items():
+            if 'timings' in out:
+                self.metrics.record(sym, out['timings'])
+        # Batch-wide stages are recorded under the pseudo-symbol '*'
+        timer = StageTimer()
+        if frames:
+            with timer.stage('prepare_data') as rec:
+                full_df, train_df = self.fe.prepare_panel(pd.concat(frames, ignore_index=True))
+                rec['rows'] = len(full_df)
+            sources = {sym: out['data'].attrs.get('source', 'api') for sym, out in fetched.items() if 'error' not in out}
+
+            if train_df.empty and self.pooled.booster is None:
+                return [results.get(sym, {'symbol': sym, 'error': 'Not enough data for indicators'})
+                        for sym in symbols]
+
+            with self._pooled_lock:
+                model = self.pooled
+                stale = (model.booster is None or time.time() - model.trained_at > refit_interval
+                         or not set(sources) <= set(model.symbols))
+                if stale and train_symbols:
+                    extra = [sym for sym in dict.fromkeys(train_symbols) if sym not in fetched]
+                    if extra:
+                        with ThreadPoolExecutor(max_workers=min(max_workers, len(extra))) as pool:
+                            more = dict(zip(extra, pool.map(self._fetch_for_analysis, extra)))
+                        for sym, out in more.items():
+                            if 'timings' in out:
+                                self.metrics.record(sym, out['timings'])
+                        more = [out['data'].assign(Symbol=sym) for sym, out in more.items() if 'error' not in out]
+                        if more:
+                            _, train_df = self.fe.prepare_panel(pd.concat(frames + more, ignore_index=True))
+                if stale and not train_df.empty:
+                    with timer.stage('train', rows=len(train_df)):
+                        model = PooledModelTrainer()
+                        model.train(train_df)
+                    self.pooled = model
+
+            last_rows = full_df.groupby('Symbol', sort=False).tail(1)
+            ready = last_rows[~last_rows[model.features].isnull().any(axis=1)]
+            with timer.stage('predict', rows=len(ready)):
+                probs = model.predict_proba(ready) if not ready.empty else []
+            self.metrics.record('*', timer.timings)
+            for (_, row), prob in zip(ready.iterrows(), probs):
+                sym = row['Symbol']
+                results[sym] = {
+                    'symbol': sym,
+                    'current_price': row['Close'],
+                    'probability': float(prob),
+                    'signal': signal_for(prob),
+                    'data': full_df[full_df['Symbol'] == sym].reset_index(drop=True),
+                    'latest_time': row['Time'],
+                    'accuracy': model.accuracy,
+                    'source': sources[sym],
+                    'model': 'pooled',
+                }
+            for sym in sources:
+                results.setdefault(sym, {'symbol': sym, 'error': 'Latest data insufficient for indicators'})
+
+        return [results[sym] for sym in symbols]
+
+    def _fetch_for_analysis(self, symbol):
+        timer = StageTimer()
+        try:
+            with timer.stage('fetch') as rec:
+                df = self.fetcher.fetch_candles(symbol, count=300) # Fetch enough for indicators
+                if df is not None:
+                    # Size of the decoded candle data, a proxy for payload size
+                    rec['rows'] = len(df)
+                    rec['bytes'] = int(df.memory_usage(deep=True).sum())
         except Exception as e:
             return {'error': str(e)}
-            
-        # 2. Feature Engineering
-        full_df, train_df = self.fe.prepare_data(df)
-        
-        if train_df.empty:
-             return {'error': 'Not enough data for indicators'}
+        if df is None:
+            if symbol in self.fetcher.errors:
+                return {'error': f"Finnhub API error: {self.fetcher.errors[symbol]}"}
+            return {'error': 'No data returned from API (Check symbol or date range)'}
+        return {'data': df, 'timings': timer.timings}
 
-        # 3. Train Model (In a real app, we might load a pre-trained model or retrain periodically)
-        # For this dashboard, we'll retrain on the historical data of the specific stock 
-        # to adapt to its specific behavior (simplification).
-        model, acc = self.trainer.train(train_df)
-        
-        # 4. Predict on latest data
-        # We need the *latest* row that has all indicators calculated
-        # The 'full_df' has NaN targets for the last 3 rows (because of shift(-3))
-        # But it HAS indicators for those rows.
-        last_row = full_df.iloc[[-1]] 
-        
-        # Check if last_row has NaNs in features (it shouldn't if we have enough history)
-        if last_row[self.trainer.features].isnull().values.any():
-             return {'error': 'Latest data insufficient for indicators'}
 
-        prob = self.trainer.predict_proba(last_row)[0]
+def _run_pipeline(symbol, df, fe, trainer, registry=None, resolution='D'):
+    timer = StageTimer()
+
+    # 2. Feature Engineering
+    with timer.stage('prepare_data', rows=len(df)):
+        full_df, train_df = fe.prepare_data(df)
+    
+    if train_df.empty:
+         return {'error': 'Not enough data for indicators'}
+
+    # 3. Train Model
+    # Each stock gets its own model trained on its own history. With a registry the
+    # model is reused from the cache until enough new bars arrive; without one we
+    # retrain on every call.
+    model_info = {}
+    with timer.stage('train', rows=len(train_df)):
+        if registry is not None:
+            acc, meta, retrained = registry.get_or_train(trainer, symbol, train_df, resolution)
+            model_info = {'model_version': meta['version'], 'retrained': retrained}
+        else:
+            model, acc = trainer.train(train_df)
+    
+    # 4. Predict on latest data
+    # We need the *latest* row that has all indicators calculated
+    # The 'full_df' has NaN targets for the last 3 rows (because of shift(-3))
+    # But it HAS indicators for those rows.
+    features = trainer.feature_vector(full_df)
+    
+    # Check if the latest row has NaNs in features (it shouldn't if we have enough history)
+    if np.isnan(features).any():
+         return {'error': 'Latest data insufficient for indicators'}
+
+    with timer.stage('predict', rows=1):
+        prob = float(trainer.predict_fast(features)[0])
+    
+    # 5. Logic
+    signal = signal_for(prob)
         
-        # 5. Logic
-        signal = "HOLD"
-        if prob > 0.6:
-            signal = "BUY"
-        elif prob < 0.4:
-            signal = "SELL"
-            
-        return {
-            'symbol': symbol,
-            'current_price': last_row['Close'].values[0],
-            'probability': prob,
-            'signal': signal,
-            'data': full_df, # sending full data for plotting
-            'latest_time': last_row['Time'].values[0],
-            'accuracy': acc
-        }
+    return {
+        'symbol': symbol,
+        'current_price': full_df['Close'].values[-1],
+        'probability': prob,
+        'signal': signal,
+        'data': full_df, # sending full data for plotting
+        'latest_time': full_df['Time'].values[-1],
+        'accuracy': acc,
+        'source': full_df.attrs.get('source', 'api'),
+        'timings': timer.timings,
+        **model_info
+    }
+
+
+def _analyze_candles_task(symbol, df, registry=None, keep_data=True, params=None):
+    """
+    Worker entry point for analyze_many: a fresh FeatureEngineer/ModelTrainer per
+    task, since the shared instances on StockPredictor are not thread-safe.
+    """
+    try:
+        # The pool already provides the parallelism; avoid oversubscribing cores
+        trainer = ModelTrainer(n_jobs=1, params=params)
+        result = _run_pipeline(symbol, df, FeatureEngineer(), trainer, registry)
+        if not keep_data:
+            result.pop('data', None)
+        return result
+    except Exception as e:
+        return {'symbol': symbol, 'error': str(e)}
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze one stock")
+    parser.add_argument('symbol', nargs='?', default='AAPL')
+    parser.add_argument('--profile', nargs='?', const='-', metavar='STATS_FILE',
+                        help="run under cProfile; print the top functions (and dump raw stats to STATS_FILE)")
+    args = parser.parse_args()
+
     predictor = StockPredictor()
-    result = predictor.analyze_stock('AAPL')
+    if args.profile:
+        result, report = profile_call(predictor.analyze_stock, args.symbol,
+                                      output=None if args.profile == '-' else args.profile)
+        print(report)
+    else:
+        result = predictor.analyze_stock(args.symbol)
     if 'error' not in result:
         print(f"Prediction for {result['symbol']}: {result['signal']} ({result['probability']:.2f})")
+        for stage, rec in result['timings'].items():
+            print(f"  {stage:<13} {rec['wall'] * 1000:8.1f} ms wall {rec['cpu'] * 1000:8.1f} ms cpu {rec['rows']:>6} rows")
     else:
         print(result['error'])
@@ -0,0 +1,250 @@
+import os
+import json
+import asyncio
+import time
+import heapq
+import random
+import itertools
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process state, in-process limiting only
+    fcntl = None
+
+# Request priorities (lower runs first): a quote for the screen beats a
+# refresh of a few bars, which beats backfilling a full history window.
+PRIORITY_QUOTE = 0
+PRIORITY_REFRESH = 1
+PRIORITY_BACKFILL = 2
+
+
+class TokenBucket:
+    """
+    Token bucket holding at most `burst` tokens, refilled at `calls_per_minute`.
+
+    With `state_path`, the bucket state lives in a small JSON file guarded by an
+    exclusive file lock, so every thread *and process* that points at the same file
+    draws from one shared budget (e.g. several dashboard workers on one API key).
+    """
+
+    def __init__(self, calls_per_minute=60, burst=None, state_path=None):
+        self.rate = calls_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else calls_per_minute)
+        self.state_path = state_path if fcntl is not None else None
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """
+        Take a token if one is available. Returns 0 on success, otherwise the
+        number of seconds until the next token is due.
+        """
+        with self._lock:
+            if self.state_path is None:
+                self._tokens, self._updated, wait = self._take(self._tokens, self._updated, time.monotonic())
+                return wait
+            return self._try_acquire_shared()
+
+    def _take(self, tokens, updated, now):
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, now, 0
+        return tokens, now, (1 - tokens) / self.rate
+
+    def _try_acquire_shared(self):
+        # Wall-clock time, since monotonic clocks are not comparable across processes
+        with open(self.state_path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                except ValueError:
+                    state = {'tokens': self.capacity, 'updated': time.time()}
+                tokens, updated, wait = self._take(state['tokens'], state['updated'], time.time())
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({'tokens': tokens, 'updated': updated}))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return wait
+
+
+class RateLimiter:
+    """
+    Priority-ordered, rate-limited caller with retries.
+
+    `call(fn, ...)` waits its turn in a priority queue, takes a token from the
+    bucket, and runs `fn`. Throttling (HTTP 429), server errors (5xx) and
+    connection errors are retried with exponential backoff and full jitter, up to
+    `max_retries` times, honouring a Retry-After header when the API sends one.
+    Anything else, or the last failure, is raised to the caller.
+    """
+
+    def __init__(self, bucket=None, max_retries=4, base_delay=1.0, max_delay=30.0):
+        self.bucket = bucket or TokenBucket()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {'calls': 0, 'retries': 0, 'throttled': 0, 'failures': 0}
+        self._stats_lock = threading.Lock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _wait_turn(self, priority):
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+        while True:
+            with self._cond:
+                while self._queue[0] != ticket:
+                    self._cond.wait()
+            # The bucket may lock a shared file: ask it without holding the queue,
+            # so other threads can still join the queue meanwhile
+            wait = self.bucket.try_acquire()
+            with self._cond:
+                if wait == 0:
+                    _leave(self._queue, ticket)
+                    self._cond.notify_all()
+                    return
+                if self._queue[0] == ticket:
+                    self._cond.wait(timeout=wait)
+
+    def call(self, fn, *args, priority=PRIORITY_BACKFILL, **kwargs):
+        attempt = 0
+        while True:
+            self._wait_turn(priority)
+            self._count('calls')
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                status = getattr(e, 'status_code', None)
+                if status == 429:
+                    self._count('throttled')
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    self._count('failures')
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+                self._count('retries')
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _backoff(self, attempt, error):
+        response = getattr(error, 'response', None)
+        retry_after = getattr(response, 'headers', {}).get('Retry-After') if response is not None else None
+        if retry_after is not None:
+            try:
+                return min(self.max_delay, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class AsyncRateLimiter(RateLimiter):
+    """
+    RateLimiter for coroutines: `await limiter.call(coro_fn, ...)` queues by
+    priority, takes a token and retries like RateLimiter.call, but waits with
+    asyncio instead of blocking a thread. Pass another limiter's bucket to share
+    its budget.
+    """
+
+    def __init__(self, bucket=None, max_retries=4, base_delay=1.0, max_delay=30.0):
+        super().__init__(bucket, max_retries, base_delay, max_delay)
+        self._loop = None
+        self._acond = None
+
+    def _condition(self):
+        # asyncio primitives belong to one event loop; start afresh on a new one
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._acond = asyncio.Condition()
+            self._queue = []
+        return self._acond
+
+    async def _wait_turn(self, priority):
+        cond = self._condition()
+        ticket = (priority, next(self._seq))
+        async with cond:
+            heapq.heappush(self._queue, ticket)
+        while True:
+            async with cond:
+                while self._queue[0] != ticket:
+                    await cond.wait()
+            if self.bucket.state_path is None:
+                wait = self.bucket.try_acquire()
+            else:
+                # A shared bucket locks a file: keep that off the event loop
+                wait = await asyncio.to_thread(self.bucket.try_acquire)
+            async with cond:
+                if wait == 0:
+                    _leave(self._queue, ticket)
+                    cond.notify_all()
+                    return
+                if self._queue[0] == ticket:
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+
+    async def call(self, fn, *args, priority=PRIORITY_BACKFILL, **kwargs):
+        attempt = 0
+        while True:
+            await self._wait_turn(priority)
+            self._count('calls')
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                status = getattr(e, 'status_code', None)
+                if status == 429:
+                    self._count('throttled')
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    self._count('failures')
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+                self._count('retries')
+
+
+def _leave(queue, ticket):
+    # Usually the head; a more urgent ticket may have arrived while the token was taken
+    if queue[0] == ticket:
+        heapq.heappop(queue)
+    else:
+        queue.remove(ticket)
+        heapq.heapify(queue)
+
+
+def _is_retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    # ConnectionError, TimeoutError and requests' exceptions are all OSErrors
+    return isinstance(error, OSError)
+
+
+_default_limiter = None
+_default_lock = threading.Lock()
+
+
+def default_rate_limiter():
+    """
+    Process-wide RateLimiter configured from the environment.
+
+    FINNHUB_CALLS_PER_MINUTE sets the plan's budget (60 on the free plan), and
+    FINNHUB_RATE_STATE, if set, is the file that processes share the budget through.
+    """
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            calls_per_minute = int(os.getenv('FINNHUB_CALLS_PER_MINUTE', '60'))
+            bucket = TokenBucket(calls_per_minute, state_path=os.getenv('FINNHUB_RATE_STATE'))
+            _default_limiter = RateLimiter(bucket)
+        return _default_limiter
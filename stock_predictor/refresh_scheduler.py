@@ -0,0 +1,246 @@
+import time
+import heapq
+import itertools
+import threading
+from resample import SESSION_OPEN, SESSION_SECONDS
+
+DAY = 86400
+
+
+def market_open(now):
+    """
+    Whether `now` (epoch seconds) is inside a regular US session (13:30-20:00
+    UTC on weekdays; holidays and daylight saving are ignored, as in the mock data).
+    """
+    # 1970-01-01 was a Thursday: weekday 0 is Monday
+    weekday = (int(now) // DAY + 3) % 7
+    return weekday < 5 and SESSION_OPEN <= now % DAY < SESSION_OPEN + SESSION_SECONDS
+
+
+def next_open(now):
+    """
+    Start of the first regular session after `now` (epoch seconds).
+    """
+    day = int(now) // DAY
+    while True:
+        start = day * DAY + SESSION_OPEN
+        if start > now and (day + 3) % 7 < 5:
+            return start
+        day += 1
+
+
+class Snapshot:
+    """
+    Immutable view of the latest results: `results` (symbol -> result dict, as
+    returned by StockPredictor), `refreshed` (symbol -> epoch seconds of that
+    result), `version` (incremented on every publish) and `updated`.
+
+    A new Snapshot replaces the old one on every publish, so a reader holding one
+    always sees a consistent set of results and never needs a lock.
+    """
+
+    def __init__(self, results=None, refreshed=None, version=0, updated=None):
+        self.results = results or {}
+        self.refreshed = refreshed or {}
+        self.version = version
+        self.updated = updated
+
+    def __len__(self):
+        return len(self.results)
+
+    def __contains__(self, symbol):
+        return symbol in self.results
+
+    def get(self, symbol):
+        return self.results.get(symbol)
+
+
+class RefreshScheduler:
+    """
+    Background worker that keeps the analysis of watched symbols up to date.
+
+    Readers (e.g. every dashboard session) call `watch(symbols, hot=...)` and
+    read `snapshot()`; neither waits on a fetch or a model. A worker thread runs
+    each symbol through the predictor on its own cadence from a heap of due
+    times: `hot` symbols (e.g. the ones on screen) every `hot_interval` seconds
+    for as long as a reader keeps marking them hot, the others every `interval`.
+    Outside the regular session a symbol is refreshed once more, to pick up the
+    final bar, then not until the next open (pass market_hours=False to refresh
+    around the clock, e.g. for mock data).
+    Symbols nobody has watched for `idle_after` seconds are dropped, results
+    included.
+
+    Due symbols are analyzed together with `predictor.analyze_many` (on
+    `processes` worker processes, threads only by default) or, with pooled=True,
+    with `predictor.analyze_pooled` (a refit trains on every watched symbol), and
+    every result is published as soon as it completes.
+    """
+
+    def __init__(self, predictor, interval=60, hot_interval=15, idle_after=120, pooled=False,
+                 market_hours=True, processes=0, clock=time.time):
+        self.predictor = predictor
+        self.interval = interval
+        self.hot_interval = hot_interval
+        self.idle_after = idle_after
+        self.pooled = pooled
+        self.market_hours = market_hours
+        self.processes = processes
+        self.clock = clock
+        self.stats = {'cycles': 0, 'refreshed': 0, 'errors': 0, 'deferred': 0, 'dropped': 0}
+        self._snapshot = Snapshot()
+        self._heap = []          # (due, seq, symbol); entries whose due is outdated are skipped
+        self._due = {}           # symbol -> current due time
+        self._watched = {}       # symbol -> last time a reader asked for it
+        self._hot = {}           # symbol -> last time a reader marked it hot
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def snapshot(self):
+        """
+        The latest published Snapshot. Never blocks.
+        """
+        return self._snapshot
+
+    def watch(self, symbols, hot=(), interval=None):
+        """
+        Keep `symbols` refreshed, `hot` ones at `hot_interval`. Call it again at
+        least every `idle_after` seconds for as long as the symbols are needed.
+        New symbols are due at once. `interval`, if given, replaces the cadence
+        of the other symbols.
+        """
+        now = self.clock()
+        hot = set(hot)
+        with self._cond:
+            if interval is not None:
+                self.interval = interval
+            for symbol in symbols:
+                self._watched[symbol] = now
+                if symbol in hot:
+                    self._hot[symbol] = now
+                if symbol not in self._due:
+                    self._schedule(symbol, now)
+                elif symbol in hot and now + self.hot_interval < self._due[symbol] < float('inf'):
+                    # Just came on screen: move it up to the hot cadence
+                    self._schedule(symbol, self._snapshot.refreshed.get(symbol, now) + self.hot_interval)
+            self._cond.notify_all()
+
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    wait = self._heap[0][0] - self.clock() if self._heap else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self._cond.wait(timeout=wait)
+                if self._stopping:
+                    return
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Refresh scheduler error: {e}")
+                with self._cond:
+                    self._cond.wait(timeout=1)
+
+    def run_once(self):
+        """
+        Refresh every symbol that is due and publish the results. Returns the
+        symbols that were refreshed.
+        """
+        now = self.clock()
+        due = self._pop_due(now)
+        if not due:
+            return []
+        self.stats['cycles'] += 1
+        pending = set(due)
+        try:
+            if self.pooled:
+                # A refit trains on every watched symbol, not just the due ones,
+                # so the next cycle's symbols are already covered
+                with self._cond:
+                    watched = sorted(self._watched)
+                results = self.predictor.analyze_pooled(due, train_symbols=watched)
+            else:
+                results = self.predictor.analyze_many(due, processes=self.processes, fresh=True)
+            for result in results:
+                pending.discard(result['symbol'])
+                self._publish(result)
+        finally:
+            # Symbols whose run failed outright are retried at the normal cadence
+            with self._cond:
+                for symbol in pending:
+                    if symbol in self._watched:
+                        self._schedule(symbol, now + self.interval)
+        return due
+
+    def _pop_due(self, now):
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                when, _, symbol = heapq.heappop(self._heap)
+                if self._due.get(symbol) != when:
+                    continue
+                if now - self._watched.get(symbol, now) > self.idle_after:
+                    self._drop(symbol)
+                    continue
+                due.append(symbol)
+            for symbol in due:
+                # Reserve the slot so a concurrent watch() does not queue it again
+                self._due[symbol] = float('inf')
+        return due
+
+    def _publish(self, result):
+        symbol = result['symbol']
+        now = self.clock()
+        with self._cond:
+            if symbol not in self._watched:
+                return
+            old = self._snapshot
+            # Hot while some reader has marked it hot since its previous refresh
+            hot = self._hot.get(symbol, -1) >= old.refreshed.get(symbol, 0)
+            self._snapshot = Snapshot({**old.results, symbol: result}, {**old.refreshed, symbol: now},
+                                      old.version + 1, now)
+            self.stats['refreshed'] += 1
+            if 'error' in result:
+                # Retried at the normal cadence, market open or not
+                self.stats['errors'] += 1
+                self._schedule(symbol, now + self.interval)
+            else:
+                self._schedule(symbol, self._next_due(now, hot))
+            self._cond.notify_all()
+
+    def _next_due(self, now, hot):
+        if self.market_hours and not market_open(now):
+            # Its last bar is final until the session opens again
+            self.stats['deferred'] += 1
+            return next_open(now)
+        return now + (self.hot_interval if hot else self.interval)
+
+    def _schedule(self, symbol, when):
+        self._due[symbol] = when
+        heapq.heappush(self._heap, (when, next(self._seq), symbol))
+
+    def _drop(self, symbol):
+        self._due.pop(symbol, None)
+        self._watched.pop(symbol, None)
+        self._hot.pop(symbol, None)
+        old = self._snapshot
+        if symbol in old.results:
+            results, refreshed = dict(old.results), dict(old.refreshed)
+            results.pop(symbol)
+            refreshed.pop(symbol)
+            self._snapshot = Snapshot(results, refreshed, old.version + 1, self.clock())
+        self.stats['dropped'] += 1
@@ -0,0 +1,139 @@
+import math
+import numpy as np
+from candles import Candles
+
+# Finnhub candle resolutions, finest first, and the length of one bar in seconds
+# ('M' is variable; 31 days is used wherever a fixed upper bound is needed)
+RESOLUTION_SECONDS = {'1': 60, '5': 300, '15': 900, '30': 1800, '60': 3600,
+                      'D': 86400, 'W': 7 * 86400, 'M': 31 * 86400}
+INTRADAY = ('1', '5', '15', '30', '60')
+
+# One regular US session (9:30-16:00 ET): how much of a day intraday bars cover
+SESSION_SECONDS = 23400
+# Its start in UTC seconds after midnight (13:30, ignoring daylight saving)
+SESSION_OPEN = 13 * 3600 + 1800
+# Most trading days in a week and in a month
+WEEK_SESSIONS = 5
+MONTH_SESSIONS = 23
+
+
+def check_resolution(resolution):
+    """
+    `resolution` as Finnhub spells it ('1', '5', '15', '30', '60', 'D', 'W' or 'M').
+    """
+    resolution = str(resolution).upper()
+    if resolution not in RESOLUTION_SECONDS:
+        raise ValueError(f"Unknown resolution {resolution!r}; expected one of {', '.join(RESOLUTION_SECONDS)}")
+    return resolution
+
+
+def finest(resolutions):
+    return min((check_resolution(r) for r in resolutions), key=RESOLUTION_SECONDS.get)
+
+
+def bars_per(coarse, fine):
+    """
+    Most `fine` bars that go into one `coarse` bar (trading hours only).
+    """
+    coarse, fine = check_resolution(coarse), check_resolution(fine)
+    if fine == coarse:
+        return 1
+    if coarse in INTRADAY:
+        return RESOLUTION_SECONDS[coarse] // RESOLUTION_SECONDS[fine]
+    if fine == 'W':
+        # A month touches at most 6 weeks
+        return 6
+    per_session = math.ceil(SESSION_SECONDS / RESOLUTION_SECONDS[fine]) if fine in INTRADAY else 1
+    return per_session * {'D': 1, 'W': WEEK_SESSIONS, 'M': MONTH_SESSIONS}[coarse]
+
+
+def can_derive(fine, coarse):
+    """
+    Whether `coarse` bars can be built exactly from `fine` ones. Weeks straddle
+    month ends, so monthly bars cannot come from weekly ones.
+    """
+    fine, coarse = check_resolution(fine), check_resolution(coarse)
+    if fine == coarse:
+        return True
+    if RESOLUTION_SECONDS[fine] > RESOLUTION_SECONDS[coarse] or (fine, coarse) == ('W', 'M'):
+        return False
+    if coarse in INTRADAY:
+        return RESOLUTION_SECONDS[coarse] % RESOLUTION_SECONDS[fine] == 0
+    return True
+
+
+def lookback_seconds(resolution, count):
+    """
+    How far back to request so that about `count` bars come back. Calendar time
+    is twice the trading time the bars cover (weekends, holidays), with at least
+    a week so a short intraday request over a weekend is not empty.
+    """
+    resolution = check_resolution(resolution)
+    if resolution in INTRADAY:
+        sessions = math.ceil(count / bars_per('D', resolution))
+        span = sessions * 86400
+    else:
+        span = count * RESOLUTION_SECONDS[resolution]
+    return max(span * 2, 7 * 86400)
+
+
+def bucket_start(t, resolution):
+    """
+    Start (epoch seconds, UTC) of the `resolution` bar each time in `t` falls in.
+    Intraday bars are counted from the session open (13:30 UTC), as the API and
+    the mock data lay them out, so hourly bars start at 13:30, 14:30, ...; daily
+    bars start at UTC midnight and weeks on Monday.
+    """
+    resolution = check_resolution(resolution)
+    t = np.asarray(t, dtype=np.int64)
+    if resolution == 'W':
+        days = t // 86400
+        # 1970-01-01 was a Thursday
+        return (days - (days + 3) % 7) * 86400
+    if resolution == 'M':
+        return t.astype('datetime64[s]').astype('datetime64[M]').astype('datetime64[s]').view(np.int64)
+    seconds = RESOLUTION_SECONDS[resolution]
+    offset = SESSION_OPEN % seconds if resolution in INTRADAY else 0
+    return t - (t - offset) % seconds
+
+
+def bar_close(start, resolution):
+    """
+    End (epoch seconds) of the bars starting at `start`: the first moment their
+    values are final.
+    """
+    resolution = check_resolution(resolution)
+    start = np.asarray(start, dtype=np.int64)
+    if resolution == 'M':
+        month = start.astype('datetime64[s]').astype('datetime64[M]')
+        return (month + 1).astype('datetime64[s]').view(np.int64)
+    return start + RESOLUTION_SECONDS[resolution]
+
+
+def resample(data, resolution):
+    """
+    Aggregate time-sorted candles (a Candles object or a candle DataFrame) into
+    coarser `resolution` bars: first open, highest high, lowest low, last close,
+    summed volume. Vectorised; returns the same kind of object. The last bar is
+    partial when its period has not ended, like the forming bar from the API.
+    """
+    candles = data if isinstance(data, Candles) else Candles.from_frame(data)
+    keys = bucket_start(candles.t, resolution)
+    if len(keys) == 0:
+        out = candles
+    else:
+        starts = np.flatnonzero(np.diff(keys, prepend=keys[0] - 1))
+        ends = np.append(starts[1:], len(keys)) - 1
+        out = Candles(
+            t=keys[starts],
+            o=candles.o[starts],
+            h=np.maximum.reduceat(candles.h, starts),
+            l=np.minimum.reduceat(candles.l, starts),
+            c=candles.c[ends],
+            v=np.add.reduceat(candles.v, starts),
+        )
+    if isinstance(data, Candles):
+        return out
+    df = out.to_frame()
+    df.attrs.update(data.attrs)
+    return df
@@ -0,0 +1,166 @@
+import time
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class SqliteBackend:
+    """
+    Result store in a local SQLite file, shared by every process that opens the
+    same path (e.g. several dashboard workers on one machine). Values are pickled.
+    """
+
+    def __init__(self, path='result_cache.sqlite', prune_every=100):
+        self.path = path
+        self.prune_every = prune_every
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, expires REAL, value BLOB)")
+
+    def get(self, key):
+        """
+        (expires, value) for an unexpired key, else None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT expires, value FROM results WHERE key = ?", (repr(key),)).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return row[0], pickle.loads(row[1])
+
+    def put(self, key, value, expires):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (repr(key), expires, blob))
+            self._puts += 1
+            if self._puts % self.prune_every == 0:
+                self._conn.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+
+
+class ResultCache:
+    """
+    Process-wide cache of analysis results with TTL, LRU eviction and request
+    coalescing.
+
+    Up to `max_entries` results stay in memory, each for `ttl` seconds (or the
+    ttl given to `put`). While a key is being computed, other callers asking for
+    it wait for that computation instead of starting their own, so concurrent
+    sessions requesting the same symbol cost one fetch and one model run. With a
+    `backend` (e.g. SqliteBackend), results are also written there and read back
+    on a memory miss, which shares them between processes.
+    """
+
+    def __init__(self, ttl=60, max_entries=1000, backend=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+        self._entries = OrderedDict()   # key -> (expires, value)
+        self._inflight = {}             # key -> Future of the computation
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        The cached value, or None if missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry[1]
+                del self._entries[key]
+        if self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None:
+                with self._lock:
+                    self._store(key, entry[1], entry[0])
+                    self.stats['hits'] += 1
+                return entry[1]
+        return None
+
+    def put(self, key, value, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, value, expires)
+        if self.backend is not None:
+            self.backend.put(key, value, expires)
+
+    def _store(self, key, value, expires):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def claim(self, key, fresh=False):
+        """
+        Coalescing primitive: returns (future, owner). The owner must compute the
+        value and call `resolve` (or `fail`); everyone else just waits on the future.
+        With fresh=True a cached value does not count, only a running computation.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not fresh and entry[0] >= time.time():
+                # Finished between the caller's get() and this claim
+                future = Future()
+                future.set_result(entry[1])
+                return future, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            self.stats['misses'] += 1
+            return future, True
+
+    def resolve(self, key, value, ttl=None, store=True):
+        """
+        Finish a claimed computation; `store=False` hands the value to the waiting
+        callers without caching it (e.g. an error result).
+        """
+        if store:
+            self.put(key, value, ttl)
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_result(value)
+
+    def fail(self, key, error):
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_exception(error)
+
+    def get_or_compute(self, key, compute, ttl=None, should_store=None):
+        """
+        Cached value for `key`, or the result of `compute()`, run once however many
+        threads ask at the same time. `should_store(value)` can veto caching it.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        future, owner = self.claim(key)
+        if not owner:
+            return future.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            self.fail(key, e)
+            raise
+        self.resolve(key, value, ttl, store=should_store is None or should_store(value))
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
@@ -0,0 +1,290 @@
+import sys
+import json
+import time
+import heapq
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from feature_engineering import FeatureEngineer
+from model import PooledModelTrainer
+
+# Fewest bars a symbol needs for every feature (SMA 50) plus a few to train on
+MIN_BARS = 60
+
+
+def read_universe(path, types=('Common Stock',)):
+    """
+    Symbols of an exchange from a Finnhub /stock/symbol JSON dump (a list of
+    {'symbol', 'type', ...} objects, filtered to `types`), or from a text file
+    with one or more symbols per line.
+    """
+    if path.endswith('.json'):
+        with open(path) as f:
+            rows = json.load(f)
+        return [row['symbol'] for row in rows if not types or row.get('type') in types]
+    from batch import read_symbols
+    return read_symbols(path)
+
+
+class Scanner:
+    """
+    Ranks a whole exchange's symbols and keeps only the best `top`.
+
+    Symbols flow through in chunks of `chunk_size`, so at most one chunk of
+    histories is in memory at any time:
+
+    0. quote prefilter: a snapshot of cached quotes (symbol, price, volume)
+       drops symbols before anything is fetched. By default it is built from
+       the candles already in the fetcher's local store (`local_snapshot`), so
+       a repeated scan only fetches histories for symbols that passed before or
+       were never seen
+    1. candles for the chunk are fetched concurrently, and a vectorised
+       prefilter on last price, average volume and history length runs over the
+       chunk's (bars x symbols) matrices
+    2. features for the survivors only, in one `prepare_panel` pass
+    3. the survivors' latest rows are scored in one pooled-model call
+    4. a bounded heap keeps the `top` highest probabilities (no full sort)
+
+    The scoring model is a PooledModelTrainer without the symbol feature, so it
+    scores symbols it never saw. Before the chunks, a scan (re)fits it when it is
+    untrained or older than `refit_interval` seconds (None: never refit a trained
+    model), on up to `train_sample` symbols drawn at random from the whole
+    universe, so the ranking does not depend on which symbols come first.
+    """
+
+    def __init__(self, fetcher, model=None, min_price=5.0, max_price=None, min_volume=100_000,
+                 history=300, chunk_size=500, max_workers=16, volume_window=20,
+                 train_sample=200, refit_interval=24 * 3600, seed=0):
+        self.fetcher = fetcher
+        self.model = model or PooledModelTrainer(use_symbol=False)
+        self.train_sample = train_sample
+        self.refit_interval = refit_interval
+        self._random = np.random.default_rng(seed)
+        self.fe = FeatureEngineer()
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_volume = min_volume
+        self.history = history
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.volume_window = volume_window
+        self.stats = {}
+
+    def passes(self, price, volume):
+        """
+        Vectorised price / volume filter: a boolean array (NaN never passes).
+        """
+        price = np.asarray(price, dtype=float)
+        volume = np.asarray(volume, dtype=float)
+        keep = (price >= self.min_price) & (volume >= self.min_volume)
+        if self.max_price is not None:
+            keep &= price <= self.max_price
+        return keep
+
+    def local_snapshot(self, symbols):
+        """
+        Quote snapshot (symbol, price, volume) from the daily candles already in
+        the fetcher's local store: the last close and the average volume of the
+        last `volume_window` bars. Symbols with nothing stored are left out; None
+        if the fetcher has no store.
+        """
+        store = getattr(self.fetcher, 'store', None)
+        if store is None:
+            return None
+        rows = []
+        for sym in symbols:
+            candles = store.load(sym)
+            if candles is not None and len(candles):
+                rows.append((sym, float(candles.c[-1]), float(candles.v[-self.volume_window:].mean())))
+        return pd.DataFrame(rows, columns=['symbol', 'price', 'volume'])
+
+    def scan(self, symbols, top=20, snapshot=None):
+        """
+        The `top` symbols by probability of a rise, best first, as dicts with
+        'symbol', 'probability', 'signal', 'current_price' and 'avg_volume'.
+        `snapshot` is a DataFrame of cached quotes for the quote prefilter
+        (default: `local_snapshot`); symbols it does not cover are fetched.
+        Per-stage counts and the run time are left in `self.stats`.
+        """
+        from predictor import signal_for
+
+        start = time.perf_counter()
+        symbols = list(dict.fromkeys(symbols))
+        stats = self.stats = {'universe': len(symbols), 'quote_filtered': 0, 'unquoted': 0, 'trained_on': 0,
+                              'fetched': 0, 'errors': 0, 'prefiltered': 0, 'scored': 0, 'seconds': 0.0}
+
+        if snapshot is None:
+            snapshot = self.local_snapshot(symbols)
+        if snapshot is not None:
+            quotes = snapshot.set_index('symbol').reindex(symbols)
+            known = quotes['price'].notna().to_numpy()
+            keep = ~known | self.passes(quotes['price'].to_numpy(), quotes['volume'].to_numpy())
+            stats['quote_filtered'] = int((~keep).sum())
+            stats['unquoted'] = int((~known).sum())
+            symbols = [sym for sym, ok in zip(symbols, keep) if ok]
+
+        heap = []  # (probability, symbol, row): the smallest of the kept ones on top
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            if symbols and self._stale():
+                self._fit_sample(symbols, pool, stats)
+            for i in range(0, len(symbols), self.chunk_size):
+                chunk = symbols[i:i + self.chunk_size]
+                fetched = list(zip(chunk, pool.map(self._fetch, chunk)))
+                stats['errors'] += sum(candles is None for _, candles in fetched)
+                for sym, row in self._score_chunk(fetched, stats):
+                    item = (row['probability'], sym, row)
+                    if len(heap) < top:
+                        heapq.heappush(heap, item)
+                    elif item[:2] > heap[0][:2]:
+                        heapq.heapreplace(heap, item)
+
+        ranked = [dict(row, symbol=sym, signal=signal_for(prob))
+                  for prob, sym, row in sorted(heap, key=lambda item: item[:2], reverse=True)]
+        stats['seconds'] = time.perf_counter() - start
+        return ranked
+
+    def _fetch(self, symbol):
+        try:
+            return self.fetcher.fetch_compact(symbol, count=self.history)
+        except Exception as e:
+            print(f"Scanner: {symbol}: {e}")
+            return None
+
+    def _stale(self):
+        if self.model.booster is None:
+            return True
+        return self.refit_interval is not None and time.time() - self.model.trained_at > self.refit_interval
+
+    def _fit_sample(self, symbols, pool, stats):
+        """
+        Refit the scoring model on the prefilter survivors among up to
+        `train_sample` symbols drawn at random from `symbols`.
+        """
+        picks = self._random.choice(len(symbols), min(self.train_sample, len(symbols)), replace=False)
+        sample = [symbols[i] for i in sorted(picks)]
+        fetched = [(sym, candles) for sym, candles in zip(sample, pool.map(self._fetch, sample))
+                   if candles is not None and len(candles)]
+        if not fetched:
+            return
+        names, close, volume, times = self._matrices(fetched)
+        keep, _ = self._prefilter(close, volume)
+        if not keep.any():
+            return
+        features = self.fe.prepare_panel(close[:, keep], volume=volume[:, keep])
+        self._fit([sym for sym, ok in zip(names, keep) if ok], close[:, keep], times[:, keep], features)
+        stats['trained_on'] = int(keep.sum())
+
+    def _matrices(self, fetched):
+        """
+        Right-aligned (bars x symbols) close, volume and time matrices of
+        `fetched` (symbol, candles) pairs, NaN before a symbol's first bar.
+        """
+        n = len(fetched)
+        close = np.full((self.history, n), np.nan)
+        volume = np.full((self.history, n), np.nan)
+        times = np.zeros((self.history, n), dtype=np.int64)
+        for j, (_, candles) in enumerate(fetched):
+            tail = candles.tail(self.history)
+            rows = len(tail)
+            close[-rows:, j] = tail.c
+            volume[-rows:, j] = tail.v
+            times[-rows:, j] = tail.t
+        return [sym for sym, _ in fetched], close, volume, times
+
+    def _prefilter(self, close, volume):
+        """
+        Cheap filters on the tail only: (keep mask, average volume) per column.
+        """
+        bars = np.count_nonzero(~np.isnan(close), axis=0)
+        with np.errstate(invalid='ignore'):
+            avg_volume = np.nanmean(volume[-self.volume_window:], axis=0)
+        return self.passes(close[-1], avg_volume) & (bars >= MIN_BARS), avg_volume
+
+    def _score_chunk(self, fetched, stats):
+        fetched = [(sym, candles) for sym, candles in fetched if candles is not None and len(candles)]
+        if not fetched:
+            return []
+        stats['fetched'] += len(fetched)
+        names, close, volume, times = self._matrices(fetched)
+
+        # Stage 1: cheap filters on the tail only
+        n = len(fetched)
+        keep, avg_volume = self._prefilter(close, volume)
+        stats['prefiltered'] += int(n - keep.sum())
+        if not keep.any():
+            return []
+        close, volume, times, avg_volume = close[:, keep], volume[:, keep], times[:, keep], avg_volume[keep]
+        names = [sym for sym, ok in zip(names, keep) if ok]
+
+        # Stage 2: features for the survivors, all columns at once
+        features = self.fe.prepare_panel(close, volume=volume)
+        if self.model.booster is None:
+            # The sample had no usable symbols: fall back to this chunk
+            self._fit(names, close, times, features)
+
+        # Stage 3: one scoring call for the chunk's latest rows
+        latest = pd.DataFrame({'Close': close[-1], **{name: features[name][-1] for name in self.model.features}})
+        ready = latest.notna().all(axis=1).to_numpy()
+        if not ready.any():
+            return []
+        probs = self.model.predict_proba(latest[ready])
+        stats['scored'] += int(ready.sum())
+        idx = np.flatnonzero(ready)
+        return [(names[j], {'probability': float(p), 'current_price': float(close[-1, j]),
+                            'avg_volume': float(avg_volume[j])})
+                for j, p in zip(idx, probs)]
+
+    def _fit(self, names, close, times, features):
+        """
+        Train the pooled model on every complete (bar, symbol) row of the chunk.
+        """
+        columns = {name: features[name] for name in self.model.features + ['Target']}
+        complete = np.ones(close.shape, dtype=bool)
+        for values in columns.values():
+            complete &= ~np.isnan(values)
+        rows, cols = np.nonzero(complete)
+        train_df = pd.DataFrame({
+            'Time': pd.to_datetime(times[rows, cols], unit='s'),
+            'Symbol': np.asarray(names)[cols],
+            'Close': close[rows, cols],
+            **{name: values[rows, cols] for name, values in columns.items()},
+        })
+        if not train_df.empty:
+            self.model.train(train_df)
+
+
+if __name__ == "__main__":
+    from data_fetcher import DataFetcher
+
+    parser = argparse.ArgumentParser(description="Scan an exchange and rank its symbols by probability of a rise")
+    parser.add_argument('universe', nargs='?', help="Finnhub symbol list (.json) or symbols file; default: fetch from the API")
+    parser.add_argument('--exchange', default='US')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--min-price', type=float, default=5.0)
+    parser.add_argument('--min-volume', type=float, default=100_000, help="average daily volume over 20 bars")
+    parser.add_argument('--chunk-size', type=int, default=500, help="symbols in memory at once")
+    parser.add_argument('--workers', type=int, default=16, help="fetch threads")
+    parser.add_argument('--cache-dir', default='candle_cache', help="local candle store ('' to disable)")
+    parser.add_argument('--mock', action='store_true', help="use seeded mock data instead of the API (dry run)")
+    args = parser.parse_args()
+
+    from candle_store import CandleStore
+    fetcher = DataFetcher(store=CandleStore(args.cache_dir) if args.cache_dir else None,
+                          mock_seed=0 if args.mock else None)
+    if args.mock:
+        fetcher.use_mock = True
+    symbols = read_universe(args.universe) if args.universe else fetcher.fetch_symbols(args.exchange)
+    if not symbols:
+        print("No symbols to scan")
+        sys.exit(1)
+
+    scanner = Scanner(fetcher, min_price=args.min_price, min_volume=args.min_volume,
+                      chunk_size=args.chunk_size, max_workers=args.workers)
+    ranked = scanner.scan(symbols, top=args.top)
+    stats = scanner.stats
+    print(f"{stats['universe']} symbols: {stats['prefiltered'] + stats['quote_filtered']} filtered out, "
+          f"{stats['scored']} scored in {stats['seconds']:.1f} s")
+    for i, row in enumerate(ranked, 1):
+        print(f"{i:3d}. {row['symbol']:<8} {row['signal']:<4} {row['probability']:.3f}  "
+              f"${row['current_price']:.2f}  avg vol {row['avg_volume']:,.0f}")
@@ -0,0 +1,501 @@
+import os
+import re
+import json
+import math
+import time
+import zlib
+import random
+import argparse
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from candles import Candles
+from resample import check_resolution, can_derive, resample, bucket_start, finest, INTRADAY, SESSION_SECONDS, \
+    SESSION_OPEN, RESOLUTION_SECONDS
+from rate_limiter import TokenBucket
+
+SESSION_MINUTES = SESSION_SECONDS // 60
+# Business day 0 of the synthetic calendar; no data exists before it
+ORIGIN = np.datetime64('2015-01-05', 'D')
+# Days generated per random block (one RNG stream each)
+BLOCK_DAYS = 1024
+WEEK = 7 * 86400
+
+
+def _day(ts):
+    return np.datetime64(int(ts), 's').astype('datetime64[D]')
+
+
+def _midnight(days):
+    return np.asarray(days, dtype='datetime64[D]').astype('datetime64[s]').view(np.int64)
+
+
+class SyntheticMarket:
+    """
+    Deterministic random market: every bar is a pure function of (seed, symbol,
+    resolution, time), so any two requests for the same bars agree, whatever
+    their order or window.
+
+    Daily bars are a log-normal random walk over business days since ORIGIN,
+    with a per-symbol starting price, volatility and volume level. They are
+    generated in blocks of BLOCK_DAYS days, each from its own RNG stream, so a
+    request only generates the blocks it touches. Minute bars bridge a day's
+    open to its close inside that day's high / low. Other intraday resolutions
+    are resampled from the minute bars; weekly and monthly from the daily bars.
+    """
+
+    def __init__(self, seed=0, universe_size=500, cache_blocks=2048):
+        self.seed = seed
+        self.universe_size = universe_size
+        self.cache_blocks = cache_blocks
+        self._profiles = {}
+        self._starts = {}                # symbol -> log close before each block
+        self._blocks = OrderedDict()     # (symbol, block) -> (open, high, low, close, volume), LRU
+        self._lock = threading.Lock()
+
+    def symbols(self):
+        return [f"SIM{i:04d}" for i in range(self.universe_size)]
+
+    def has(self, symbol):
+        return True
+
+    def _rng(self, symbol, *stream):
+        return np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), *stream])
+
+    def _profile(self, symbol):
+        profile = self._profiles.get(symbol)
+        if profile is None:
+            u = self._rng(symbol, 0).random(3)
+            profile = self._profiles[symbol] = {
+                'price': math.exp(math.log(5) + u[0] * math.log(100)),       # 5 to 500
+                'volume': math.exp(math.log(2e5) + u[1] * math.log(100)),    # 200k to 20M a day
+                'vol': 0.01 + 0.02 * u[2],                                   # daily volatility
+            }
+        return profile
+
+    def _normals(self, symbol, block):
+        return self._rng(symbol, 1, block).standard_normal((BLOCK_DAYS, 5))
+
+    def _block(self, symbol, block):
+        with self._lock:
+            cached = self._blocks.get((symbol, block))
+            if cached is not None:
+                self._blocks.move_to_end((symbol, block))
+                return cached
+            profile = self._profile(symbol)
+            starts = self._starts.setdefault(symbol, [math.log(profile['price'])])
+            while len(starts) <= block:
+                steps = profile['vol'] * self._normals(symbol, len(starts) - 1)[:, 0]
+                starts.append(starts[-1] + np.cumsum(steps)[-1])
+            start = starts[block]
+
+        z = self._normals(symbol, block)
+        vol = profile['vol']
+        log_close = start + np.cumsum(vol * z[:, 0])
+        log_open = np.concatenate([[start], log_close[:-1]]) + 0.3 * vol * z[:, 1]
+        bars = (
+            np.exp(log_open),
+            np.exp(np.maximum(log_open, log_close) + 0.5 * vol * np.abs(z[:, 2])),
+            np.exp(np.minimum(log_open, log_close) - 0.5 * vol * np.abs(z[:, 3])),
+            np.exp(log_close),
+            np.rint(profile['volume'] * np.exp(0.4 * z[:, 4])),
+        )
+        with self._lock:
+            self._blocks[(symbol, block)] = bars
+            while len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+        return bars
+
+    def _days(self, symbol, first, last):
+        """
+        Table values (open, high, low, close, volume) of business days first..last.
+        """
+        parts = [[] for _ in range(5)]
+        for block in range(first // BLOCK_DAYS, last // BLOCK_DAYS + 1):
+            lo = max(first - block * BLOCK_DAYS, 0)
+            hi = min(last - block * BLOCK_DAYS + 1, BLOCK_DAYS)
+            for part, values in zip(parts, self._block(symbol, block)):
+                part.append(values[lo:hi])
+        return [np.concatenate(part) for part in parts]
+
+    def _minutes(self, symbol, day):
+        """
+        Minute bars of business day `day`.
+        """
+        o, h, l, c, v = (values[0] for values in self._days(symbol, day, day))
+        n = SESSION_MINUTES
+        z = self._rng(symbol, 2, day).standard_normal(n)
+        walk = np.concatenate([[0.0], np.cumsum(z)]) * self._profile(symbol)['vol'] / math.sqrt(n)
+        k = np.arange(n + 1) / n
+        # Brownian bridge from the open to the close, kept inside the day's range
+        path = np.exp(math.log(o) + k * (math.log(c) - math.log(o)) + walk - k * walk[-1])
+        path = np.clip(path, l, h)
+        path[0], path[-1] = o, c
+        # U-shaped intraday volume
+        weights = 1 + 1.5 * np.linspace(-1, 1, n) ** 2
+        midnight = _midnight(np.busday_offset(ORIGIN, day))
+        return Candles(
+            t=midnight + SESSION_OPEN + np.arange(n) * 60,
+            o=path[:-1],
+            h=np.maximum(path[:-1], path[1:]),
+            l=np.minimum(path[:-1], path[1:]),
+            c=path[1:],
+            v=np.rint(v * weights / weights.sum()),
+        )
+
+    def _day_range(self, start, end):
+        first = max(int(np.busday_count(ORIGIN, _day(start))), 0)
+        last = int(np.busday_count(ORIGIN, _day(end) + 1)) - 1
+        return first, last
+
+    def bars(self, symbol, resolution, start, end, now):
+        """
+        Candles of `resolution` with start times in [start, end], as of `now`.
+        """
+        end = min(end, now)
+        if resolution in ('W', 'M'):
+            daily = self.bars(symbol, 'D', int(bucket_start([start], resolution)[0]), end, now)
+            out = resample(daily, resolution)
+            keep = out.t >= start
+            return Candles(out.t[keep], out.o[keep], out.h[keep], out.l[keep], out.c[keep], out.v[keep])
+
+        first, last = self._day_range(start, end)
+        if last < first:
+            return Candles([], [], [], [], [], [])
+        opens = _midnight(np.busday_offset(ORIGIN, np.arange(first, last + 1))) + SESSION_OPEN
+
+        if resolution in INTRADAY:
+            days = [self._minutes(symbol, day) for day, opened in zip(range(first, last + 1), opens) if opened <= now]
+            if not days:
+                return Candles([], [], [], [], [], [])
+            minutes = Candles(*(np.concatenate([getattr(c, key) for c in days]) for key in Candles.__slots__))
+            keep = minutes.t <= now
+            minutes = Candles(*(getattr(minutes, key)[keep] for key in Candles.__slots__))
+            out = minutes if resolution == '1' else resample(minutes, resolution)
+            keep = (out.t >= start) & (out.t <= end)
+            return Candles(*(getattr(out, key)[keep] for key in Candles.__slots__))
+
+        o, h, l, c, v = self._days(symbol, first, last)
+        t = opens - SESSION_OPEN
+        started = opens <= now
+        keep = started & (t >= start) & (t <= end)
+        bars = [t[keep], o[keep], h[keep], l[keep], c[keep], v[keep]]
+        # Today's bar is still forming: aggregate the minutes traded so far
+        if keep.any() and now < opens[keep][-1] + SESSION_SECONDS:
+            day = first + int(np.flatnonzero(keep)[-1])
+            minutes = self._minutes(symbol, day)
+            traded = minutes.t <= now
+            bars[1][-1] = minutes.o[0]
+            bars[2][-1] = minutes.h[traded].max()
+            bars[3][-1] = minutes.l[traded].min()
+            bars[4][-1] = minutes.c[traded][-1]
+            bars[5][-1] = minutes.v[traded].sum()
+        return Candles(*bars)
+
+    def quote(self, symbol, now):
+        today = self.bars(symbol, 'D', now - 10 * 86400, now, now)
+        if len(today) == 0:
+            return None
+        prev_close = float(today.c[-2]) if len(today) > 1 else float(today.o[-1])
+        close_time = int(today.t[-1]) + SESSION_OPEN + SESSION_SECONDS
+        return _quote(today.tail(1), prev_close, min(now, close_time))
+
+
+class ReplayMarket:
+    """
+    Serves recorded bars from a CandleArchive (e.g. filled by
+    DataFetcher.update_archive), revealing them as the clock passes their time.
+    Resolutions that were not recorded are resampled from a finer one that was.
+
+    Recorded times are moved forward by `shift` seconds (whole weeks, so
+    weekdays and bar alignment are kept), which lets a clock running near the
+    wall time replay old sessions to clients that ask for "the last N days".
+    """
+
+    def __init__(self, archive, shift=0):
+        from archive import CandleArchive
+        self.archive = CandleArchive(archive) if isinstance(archive, str) else archive
+        self.shift = shift
+        self.resolutions = [res for res in RESOLUTION_SECONDS
+                            if os.path.isdir(os.path.join(self.archive.archive_dir, res))]
+
+    def symbols(self):
+        return sorted({sym for res in self.resolutions for sym in self.archive.symbols(res)})
+
+    def has(self, symbol):
+        return any(self.archive.row_count(symbol, res) for res in self.resolutions)
+
+    def latest_time(self):
+        """
+        Last recorded bar time (unshifted), or None for an empty archive.
+        """
+        spans = [self.archive.time_range(sym, res) for res in self.resolutions for sym in self.archive.symbols(res)]
+        spans = [span for span in spans if span is not None]
+        return max(span[1] for span in spans) if spans else None
+
+    def _source(self, symbol, resolution):
+        if self.archive.row_count(symbol, resolution):
+            return resolution
+        finer = [res for res in self.resolutions
+                 if res != resolution and can_derive(res, resolution) and self.archive.row_count(symbol, res)]
+        return max(finer, key=RESOLUTION_SECONDS.get) if finer else None
+
+    def _read(self, symbol, resolution, start, end):
+        bars = self.archive.read(symbol, resolution, start - self.shift, end - self.shift)
+        if bars is None:
+            return Candles([], [], [], [], [], [])
+        return Candles(bars.t + self.shift, bars.o, bars.h, bars.l, bars.c, bars.v)
+
+    def bars(self, symbol, resolution, start, end, now):
+        source = self._source(symbol, resolution)
+        if source is None:
+            return Candles([], [], [], [], [], [])
+        if source == resolution:
+            return self._read(symbol, resolution, start, min(end, now))
+        out = resample(self._read(symbol, source, int(bucket_start([start], resolution)[0]), min(end, now)),
+                       resolution)
+        keep = out.t >= start
+        return Candles(*(getattr(out, key)[keep] for key in Candles.__slots__))
+
+    def quote(self, symbol, now):
+        resolutions = [res for res in self.resolutions if self.archive.row_count(symbol, res)]
+        if not resolutions:
+            return None
+        resolution = finest(resolutions)
+        # The last recorded bar before the clock, however long ago
+        last = min(self.archive.time_range(symbol, resolution)[1] + self.shift, now)
+        bars = self._read(symbol, resolution, last - 31 * 86400, now)
+        if len(bars) == 0:
+            return None
+        prev_close = float(bars.c[-2]) if len(bars) > 1 else float(bars.o[-1])
+        return _quote(bars.tail(1), prev_close, int(bars.t[-1]))
+
+
+def _quote(bar, prev_close, t):
+    close = float(bar.c[0])
+    return {'c': close, 'd': close - prev_close, 'dp': (close / prev_close - 1) * 100 if prev_close else 0.0,
+            'h': float(bar.h[0]), 'l': float(bar.l[0]), 'o': float(bar.o[0]), 'pc': prev_close, 't': int(t)}
+
+
+class MarketSimulator:
+    """
+    Local stand-in for the Finnhub REST API, for load and cache tests offline.
+
+    Serves /api/v1/stock/candle, /api/v1/quote and /api/v1/stock/symbol with
+    Finnhub-shaped payloads, from a seeded SyntheticMarket or, with `replay`,
+    from a recorded CandleArchive. Point DataFetcher / AsyncDataFetcher at
+    `url` (or set FINNHUB_BASE_URL to it).
+
+    - time: the market clock starts at `start` (epoch seconds, default now) and
+      runs `speed` times faster than the wall clock (0 freezes it); `advance()`
+      moves it by hand. Bars after the clock are not served, and today's bar is
+      the partial one so far. A replay is shifted by whole weeks so that the
+      recorded time `replay_from` (default: the last recorded bar) falls at
+      `start`; bars recorded after it then appear as the clock passes them.
+    - latency: every reply waits `latency` seconds plus up to `jitter`.
+    - rate limits: with `rate_limit`, each API key gets that many calls per
+      minute (`burst` at once); over the limit the reply is a 429 with a
+      Retry-After header, like Finnhub's.
+    - auth: with `token`, other keys get a 401.
+
+    Request counts per endpoint and the number of 429s are kept in `stats`.
+    """
+
+    def __init__(self, seed=0, start=None, speed=1.0, latency=0.0, jitter=0.0, rate_limit=None, burst=None,
+                 replay=None, replay_from=None, universe_size=500, token=None):
+        if start is None:
+            start = time.time()
+        if replay is not None:
+            self.market = ReplayMarket(replay)
+            # Shift the recording so that `replay_from` comes round at `start`
+            replay_from = replay_from if replay_from is not None else self.market.latest_time() or start
+            self.market.shift = WEEK * math.floor((start - replay_from) / WEEK)
+        else:
+            self.market = SyntheticMarket(seed, universe_size)
+        self.start = float(start)
+        self.speed = speed
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.token = token
+        self.stats = {'requests': 0, 'candle': 0, 'quote': 0, 'symbol': 0, 'throttled': 0, 'errors': 0}
+        self.url = None
+        self._t0 = time.monotonic()
+        self._offset = 0.0
+        self._random = random.Random(seed)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def now(self):
+        """
+        The market clock, in epoch seconds.
+        """
+        return int(self.start + (time.monotonic() - self._t0) * self.speed + self._offset)
+
+    def advance(self, seconds):
+        with self._lock:
+            self._offset += seconds
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _throttle(self, token):
+        if self.rate_limit is None:
+            return 0
+        with self._lock:
+            bucket = self._buckets.get(token)
+            if bucket is None:
+                bucket = self._buckets[token] = TokenBucket(self.rate_limit, self.burst)
+        return bucket.try_acquire()
+
+    def handle(self, path, query, token=None):
+        """
+        Answer one API request: (status, payload, extra headers).
+        """
+        self._count('requests')
+        if self.token is not None and token != self.token:
+            self._count('errors')
+            return 401, {'error': 'Invalid API key'}, {}
+        wait = self._throttle(token)
+        if wait:
+            self._count('throttled')
+            return 429, {'error': 'API limit reached. Please try again later. Remaining Limit: 0'}, \
+                {'Retry-After': f"{wait:.2f}", 'X-Ratelimit-Remaining': '0'}
+
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        endpoint = re.sub('/+', '/', path).rstrip('/')
+        endpoint = endpoint[len('/api/v1'):] if endpoint.startswith('/api/v1') else endpoint
+        try:
+            if endpoint == '/stock/candle':
+                self._count('candle')
+                return 200, self.candles(params['symbol'], params['resolution'],
+                                         int(params['from']), int(params['to'])), {}
+            if endpoint == '/quote':
+                self._count('quote')
+                return 200, self.quote(params['symbol']), {}
+            if endpoint == '/stock/symbol':
+                self._count('symbol')
+                return 200, [{'symbol': sym, 'displaySymbol': sym, 'description': f"{sym} SIMULATED",
+                              'type': 'Common Stock', 'mic': 'XNAS', 'currency': 'USD'}
+                             for sym in self.market.symbols()], {}
+        except (KeyError, ValueError) as e:
+            self._count('errors')
+            return 422, {'error': f"Bad request: {e}"}, {}
+        self._count('errors')
+        return 404, {'error': 'Not found'}, {}
+
+    def candles(self, symbol, resolution, start, end):
+        """
+        /stock/candle payload: {'s': 'ok', 't', 'o', 'h', 'l', 'c', 'v'} or {'s': 'no_data'}.
+        """
+        symbol = symbol.upper()
+        bars = self.market.bars(symbol, check_resolution(resolution), start, end, self.now())
+        if len(bars) == 0:
+            return {'s': 'no_data'}
+        return {'s': 'ok', 't': bars.t.tolist(),
+                **{key: np.round(getattr(bars, key).astype(float), 4).tolist() for key in ('o', 'h', 'l', 'c')},
+                'v': bars.v.tolist()}
+
+    def quote(self, symbol):
+        """
+        /quote payload; all zeros for an unknown symbol, as Finnhub sends.
+        """
+        quote = self.market.quote(symbol.upper(), self.now()) if self.market.has(symbol.upper()) else None
+        if quote is None:
+            return {'c': 0, 'd': None, 'dp': None, 'h': 0, 'l': 0, 'o': 0, 'pc': 0, 't': 0}
+        return {key: round(value, 4) if isinstance(value, float) else value for key, value in quote.items()}
+
+    def _delay(self):
+        if self.jitter:
+            with self._lock:
+                return self.latency + self._random.uniform(0, self.jitter)
+        return self.latency
+
+    def serve(self, port=0, host='127.0.0.1'):
+        """
+        Start the HTTP server on a background thread; `url` is the API base URL.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so pooled clients reuse their connections; without Nagle,
+            # so a reply's header and body writes do not wait on a delayed ACK
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                token = self.headers.get('X-Finnhub-Token') or parse_qs(url.query).get('token', [None])[-1]
+                status, payload, headers = simulator.handle(url.path, url.query, token)
+                delay = simulator._delay()
+                if delay:
+                    time.sleep(delay)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="finnhub-simulator", daemon=True).start()
+        self._server = server
+        self.url = f"http://{host}:{server.server_address[1]}/api/v1"
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        if self._server is None:
+            self.serve()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated Finnhub API for offline load and cache testing")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', type=float, default=None, help="market clock start, epoch seconds (default: now)")
+    parser.add_argument('--speed', type=float, default=1.0, help="market seconds per wall second (0 = frozen)")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every reply")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many extra seconds, at random")
+    parser.add_argument('--rate-limit', type=float, default=None, help="calls per minute per API key (e.g. 60)")
+    parser.add_argument('--burst', type=float, default=None, help="calls allowed at once (default: the per-minute limit)")
+    parser.add_argument('--replay', default=None, help="serve a recorded CandleArchive directory instead of random data")
+    parser.add_argument('--replay-from', default=None,
+                        help="recorded date the replay starts at (default: the end of the recording)")
+    parser.add_argument('--symbols', type=int, default=500, help="size of the synthetic symbol listing")
+    args = parser.parse_args()
+
+    simulator = MarketSimulator(seed=args.seed, start=args.start, speed=args.speed, latency=args.latency,
+                                jitter=args.jitter, rate_limit=args.rate_limit, burst=args.burst,
+                                replay=args.replay, universe_size=args.symbols,
+                                replay_from=int(np.datetime64(args.replay_from, 's').view(np.int64)) if args.replay_from else None)
+    simulator.serve(args.port, args.host)
+    print(f"Simulated Finnhub API on {simulator.url}")
+    print(f"  FINNHUB_BASE_URL={simulator.url} FINNHUB_API_KEY=sim streamlit run dashboard.py")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"  {simulator.stats}")
+    except KeyboardInterrupt:
+        simulator.stop()
@@ -0,0 +1,282 @@
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+FINNHUB_WS_URL = "wss://ws.finnhub.io"
+
+# Bar length in seconds -> Finnhub candle resolution, used to seed history
+STREAM_RESOLUTIONS = {60: '1', 300: '5', 900: '15', 1800: '30', 3600: '60'}
+
+
+class BarAggregator:
+    """
+    Aggregates trade ticks into OHLCV bars of `resolution_seconds`.
+
+    A bar is closed, and passed to `on_bar(symbol, bar)`, when the first trade of a
+    later bar arrives or when `flush(now)` is called after the bar's end. Bars are
+    dicts with Finnhub's candle keys: 't' (bar start, epoch seconds), 'o', 'h', 'l',
+    'c' and 'v'. Late trades for a bar that has already been closed are dropped.
+    """
+
+    def __init__(self, resolution_seconds=60, on_bar=None):
+        self.resolution = resolution_seconds
+        self.on_bar = on_bar
+        self._bars = {}       # symbol -> bar being built
+        self._closed = {}     # symbol -> start of the last closed bar
+        self._lock = threading.Lock()
+
+    def add_trade(self, symbol, price, volume, timestamp_ms):
+        start = int(timestamp_ms // 1000) // self.resolution * self.resolution
+        closed = None
+        with self._lock:
+            if start <= self._closed.get(symbol, -1):
+                return
+            bar = self._bars.get(symbol)
+            if bar is not None and start > bar['t']:
+                closed = self._close(symbol)
+                bar = None
+            if bar is None:
+                self._bars[symbol] = {'t': start, 'o': price, 'h': price, 'l': price, 'c': price, 'v': volume}
+            else:
+                bar['h'] = max(bar['h'], price)
+                bar['l'] = min(bar['l'], price)
+                bar['c'] = price
+                bar['v'] += volume
+        if closed is not None and self.on_bar is not None:
+            self.on_bar(symbol, closed)
+
+    def flush(self, now=None):
+        """
+        Close every open bar whose interval has ended by `now` (epoch seconds).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            due = [symbol for symbol, bar in self._bars.items() if bar['t'] + self.resolution <= now]
+            closed = [(symbol, self._close(symbol)) for symbol in due]
+        if self.on_bar is not None:
+            for symbol, bar in closed:
+                self.on_bar(symbol, bar)
+
+    def _close(self, symbol):
+        bar = self._bars.pop(symbol)
+        self._closed[symbol] = bar['t']
+        return bar
+
+
+class TradeStream:
+    """
+    Finnhub websocket trade feed, run on its own thread and event loop.
+
+    Subscribes to `symbols` and calls `on_trade(symbol, price, volume, timestamp_ms)`
+    for every trade tick. `on_tick()`, if given, is called about once a second so the
+    owner can close bars during quiet periods. Dropped connections are retried with
+    exponential backoff.
+    """
+
+    def __init__(self, api_key, symbols, on_trade, on_tick=None, url=FINNHUB_WS_URL, max_backoff=30.0):
+        self.api_key = api_key
+        self.symbols = list(symbols)
+        self.on_trade = on_trade
+        self.on_tick = on_tick
+        self.url = url
+        self.max_backoff = max_backoff
+        self.connected = threading.Event()
+        self._ws = None
+        self._loop = None
+        self._thread = None
+        self._stopping = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run_thread, name="finnhub-trades", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        loop = self._loop
+        if loop is not None:
+            try:
+                # The tasks belong to the stream's loop: cancel them on its thread
+                loop.call_soon_threadsafe(_cancel_tasks, loop)
+            except RuntimeError:
+                pass  # the loop has already closed
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def set_symbols(self, symbols):
+        """
+        Subscribe to `symbols` instead, on the open connection (and on every
+        reconnect), rather than opening a second socket.
+        """
+        symbols = list(symbols)
+        added = [s for s in symbols if s not in self.symbols]
+        removed = [s for s in self.symbols if s not in symbols]
+        self.symbols = symbols
+        loop = self._loop
+        if loop is not None and (added or removed):
+            try:
+                asyncio.run_coroutine_threadsafe(self._resubscribe(added, removed), loop)
+            except RuntimeError:
+                pass  # not running: the next connection subscribes to self.symbols
+
+    async def _resubscribe(self, added, removed):
+        import websockets
+        ws = self._ws
+        if ws is None:
+            return
+        try:
+            for symbol in removed:
+                await ws.send(json.dumps({'type': 'unsubscribe', 'symbol': symbol}))
+            for symbol in added:
+                await ws.send(json.dumps({'type': 'subscribe', 'symbol': symbol}))
+        except websockets.WebSocketException:
+            pass  # the reconnect subscribes to self.symbols
+
+    def _run_thread(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self.run())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    async def run(self):
+        import websockets
+        ticker = asyncio.ensure_future(self._tick()) if self.on_tick is not None else None
+        backoff = 1.0
+        try:
+            while not self._stopping:
+                try:
+                    async with websockets.connect(f"{self.url}?token={self.api_key}") as ws:
+                        self._ws = ws
+                        for symbol in self.symbols:
+                            await ws.send(json.dumps({'type': 'subscribe', 'symbol': symbol}))
+                        self.connected.set()
+                        backoff = 1.0
+                        async for message in ws:
+                            self._handle(message)
+                except (OSError, websockets.WebSocketException) as e:
+                    print(f"Trade stream error: {e}")
+                self._ws = None
+                self.connected.clear()
+                if not self._stopping:
+                    await asyncio.sleep(backoff)
+                    backoff = min(self.max_backoff, backoff * 2)
+        finally:
+            if ticker is not None:
+                ticker.cancel()
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(1)
+            self.on_tick()
+
+    def _handle(self, message):
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            return
+        if payload.get('type') != 'trade':
+            return  # pings and subscription acks
+        for trade in payload.get('data', []):
+            self.on_trade(trade['s'], float(trade['p']), float(trade.get('v', 0)), int(trade['t']))
+
+
+def _cancel_tasks(loop):
+    for task in asyncio.all_tasks(loop):
+        task.cancel()
+
+
+class StreamingPredictor:
+    """
+    Real-time mode: trade ticks -> in-memory bars -> features -> prediction.
+
+    History for each symbol is seeded once from the API. Every closed bar is then
+    appended to that history and run through FeatureEngineer and the model via
+    `predictor.analyze_candles`. Predictions run on a single worker thread so tick
+    ingestion never waits on the model. The newest result per symbol is kept in
+    `latest` and passed to `on_signal(result)` if given.
+    """
+
+    def __init__(self, predictor, symbols, resolution_seconds=60, history=300,
+                 on_signal=None, close_on_timer=True, url=FINNHUB_WS_URL):
+        self.predictor = predictor
+        self.symbols = [s.upper() for s in symbols]
+        self.resolution_seconds = resolution_seconds
+        # Candle resolution of the bars, which keeps their models apart from daily ones
+        self.resolution = STREAM_RESOLUTIONS.get(resolution_seconds, f"{resolution_seconds}s")
+        self.history_length = history
+        self.on_signal = on_signal
+        self.history = {}
+        self.latest = {}
+        self.aggregator = BarAggregator(resolution_seconds, on_bar=self._on_bar)
+        self.stream = TradeStream(predictor.fetcher.api_key, self.symbols, self.aggregator.add_trade,
+                                  on_tick=self.aggregator.flush if close_on_timer else None, url=url)
+        self._worker = ThreadPoolExecutor(max_workers=1)
+
+    def seed(self, symbols=None):
+        resolution = STREAM_RESOLUTIONS.get(self.resolution_seconds, '1')
+        for symbol in self.symbols if symbols is None else symbols:
+            df = self.predictor.fetcher.fetch_candles(symbol, resolution=resolution, count=self.history_length)
+            if df is not None:
+                self.history[symbol] = df.tail(self.history_length).reset_index(drop=True)
+
+    def start(self, seed=True):
+        if seed:
+            self.seed()
+        self.stream.start()
+
+    def stop(self):
+        self.stream.stop()
+        self._worker.shutdown(wait=True)
+
+    def set_symbols(self, symbols, seed=True):
+        """
+        Follow another watchlist on the same stream: new symbols are seeded and
+        subscribed, dropped ones unsubscribed and forgotten.
+        """
+        symbols = [s.upper() for s in symbols]
+        if symbols == self.symbols:
+            return
+        added = [s for s in symbols if s not in self.symbols]
+        removed = [s for s in self.symbols if s not in symbols]
+        self.symbols = symbols
+        if seed:
+            self.seed(added)
+        self.stream.set_symbols(symbols)
+        # History and results are only touched on the worker thread
+        self._worker.submit(self._forget, removed)
+
+    def _forget(self, symbols):
+        for symbol in symbols:
+            self.history.pop(symbol, None)
+            self.latest.pop(symbol, None)
+
+    def _on_bar(self, symbol, bar):
+        self._worker.submit(self._update, symbol, bar)
+
+    def _update(self, symbol, bar):
+        if symbol not in self.symbols:
+            return  # a trade that arrived before its unsubscribe took effect
+        row = pd.DataFrame({
+            'Time': [pd.to_datetime(bar['t'], unit='s')],
+            'Open': [bar['o']], 'High': [bar['h']], 'Low': [bar['l']],
+            'Close': [bar['c']], 'Volume': [bar['v']],
+        })
+        df = self.history.get(symbol)
+        df = row if df is None else pd.concat([df, row], ignore_index=True).tail(self.history_length)
+        df.attrs['source'] = 'stream'
+        self.history[symbol] = df.reset_index(drop=True)
+
+        try:
+            result = self.predictor.analyze_candles(symbol, self.history[symbol], resolution=self.resolution)
+        except Exception as e:
+            result = {'error': str(e)}
+        result.setdefault('symbol', symbol)
+        result['bar'] = bar
+        self.latest[symbol] = result
+        if self.on_signal is not None:
+            self.on_signal(result)
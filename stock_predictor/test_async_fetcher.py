@@ -0,0 +1,184 @@
+import sys
+import os
+import time
+import asyncio
+from aiohttp import web
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+
+from async_fetcher import AsyncDataFetcher
+from rate_limiter import AsyncRateLimiter, TokenBucket
+
+
+class StubFinnhub:
+    """
+    Local stand-in for the Finnhub REST API: /quote, /stock/candle and
+    /stock/symbol (exchange US only) with a fixed
+    latency, a 429 for the first request of symbols named THROTTLED, and a 403
+    for DENIED. Records the client connections it served.
+    """
+    LISTING = [{'symbol': 'AAPL', 'type': 'Common Stock'}, {'symbol': 'SPY', 'type': 'ETP'},
+               {'symbol': 'MSFT', 'type': 'Common Stock'}]
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.requests = 0
+        self.connections = set()
+        self.throttled = set()
+        self.url = None
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/api/v1/quote', self.quote)
+        app.router.add_get('/api/v1/stock/candle', self.candle)
+        app.router.add_get('/api/v1/stock/symbol', self.listing)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/api/v1"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def _check(self, request):
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info('peername'))
+        await asyncio.sleep(self.latency)
+        symbol = request.query['symbol']
+        if request.headers.get('X-Finnhub-Token') != 'test_key' or symbol == 'DENIED':
+            raise web.HTTPForbidden(text='{"error": "access denied"}')
+        if symbol == 'THROTTLED' and symbol not in self.throttled:
+            self.throttled.add(symbol)
+            raise web.HTTPTooManyRequests(headers={'Retry-After': '0.1'})
+        return symbol
+
+    async def quote(self, request):
+        symbol = await self._check(request)
+        return web.json_response({'c': 100.0 + len(symbol), 'pc': 99.0, 't': 1717050360})
+
+    async def listing(self, request):
+        self.requests += 1
+        if request.query['exchange'] != 'US':
+            raise web.HTTPForbidden(text='{"error": "access denied"}')
+        return web.json_response(self.LISTING)
+
+    async def candle(self, request):
+        await self._check(request)
+        start, end = int(request.query['from']), int(request.query['to'])
+        t = list(range(start - start % 86400 + 86400, end, 86400))
+        close = [100.0 + i for i in range(len(t))]
+        return web.json_response({'s': 'ok', 't': t, 'o': close, 'h': close, 'l': close,
+                                  'c': close, 'v': [1000] * len(t)})
+
+
+def make_fetcher(server, **kwargs):
+    limiter = AsyncRateLimiter(TokenBucket(calls_per_minute=60000), base_delay=0.05)
+    return AsyncDataFetcher(api_key="test_key", base_url=server.url, rate_limiter=limiter, **kwargs)
+
+
+def test_async_quotes_one_round_trip():
+    print("Testing Async Quotes (concurrent, pooled)...")
+
+    async def run():
+        server = StubFinnhub(latency=0.2)
+        await server.start()
+        try:
+            async with make_fetcher(server, max_concurrency=64) as fetcher:
+                symbols = [f"SYM{i}" for i in range(50)]
+                start = time.perf_counter()
+                prices = await fetcher.get_quotes(symbols)
+                elapsed = time.perf_counter() - start
+                assert prices == {sym: 100.0 + len(sym) for sym in symbols}
+                # 50 quotes at 0.2 s latency: about one round trip, not 10 s
+                assert elapsed < 1.5, elapsed
+
+                # A second refresh reuses the pooled keep-alive connections
+                opened = len(server.connections)
+                await fetcher.get_quotes(symbols)
+                assert len(server.connections) == opened <= 64
+        finally:
+            await server.stop()
+
+    asyncio.run(run())
+    print("Async Quotes: PASSED")
+
+
+def test_async_candles_and_errors():
+    print("Testing Async Candles, retries and errors...")
+
+    async def run():
+        server = StubFinnhub(latency=0.01)
+        await server.start()
+        try:
+            async with make_fetcher(server, max_concurrency=2) as fetcher:
+                frames = await fetcher.fetch_many(['AAPL', 'THROTTLED', 'DENIED'], count=30)
+                # Same frame layout as DataFetcher.fetch_candles
+                df = frames['AAPL']
+                assert list(df.columns) == ['Time', 'Open', 'High', 'Low', 'Close', 'Volume']
+                assert df.attrs['source'] == 'api' and len(df) >= 30
+
+                # A 429 is retried after Retry-After; a 403 is not, and is recorded
+                assert frames['THROTTLED'] is not None
+                assert fetcher.rate_limiter.stats['throttled'] == 1
+                assert frames['DENIED'] is None and '403' in fetcher.errors['DENIED']
+                assert await fetcher.get_current_price('DENIED') is None
+
+            # Mock fallback behaves like the synchronous fetcher
+            async with make_fetcher(server, mock_fallback=True, mock_seed=1) as fetcher:
+                df = await fetcher.fetch_candles('DENIED', count=50)
+                assert df.attrs['source'] == 'mock' and fetcher.fallbacks == 1
+        finally:
+            await server.stop()
+
+    asyncio.run(run())
+    print("Async Candles: PASSED")
+
+
+def test_async_compact_timeframes_and_symbols():
+    print("Testing Async Compact Candles, Timeframes and Symbols...")
+
+    async def run():
+        server = StubFinnhub(latency=0.01)
+        await server.start()
+        try:
+            async with make_fetcher(server) as fetcher:
+                df = await fetcher.fetch_candles('AAPL', count=60)
+                candles = await fetcher.fetch_compact('AAPL', count=60)
+                assert len(candles) == len(df) and list(candles.c) == df['Close'].tolist()
+                assert await fetcher.fetch_compact('DENIED') is None
+
+                # Weekly bars come from the daily request, not a second one
+                requests = server.requests
+                frames = await fetcher.fetch_timeframes('AAPL', ['D', 'W'], count=10)
+                assert server.requests == requests + 1
+                assert set(frames) == {'D', 'W'} and len(frames['W']) >= 10
+                assert await fetcher.fetch_timeframes('DENIED', ['D', 'W']) is None
+
+                assert await fetcher.fetch_symbols() == ['AAPL', 'MSFT']
+                assert await fetcher.fetch_symbols(types=()) == ['AAPL', 'SPY', 'MSFT']
+                assert await fetcher.fetch_symbols('XX') == [] and '403' in fetcher.errors['XX']
+
+            fetcher = make_fetcher(server)
+            fetcher.use_mock = True
+            assert len(await fetcher.fetch_compact('AAPL', count=20)) == 20
+            assert len(await fetcher.fetch_symbols()) == 500
+        finally:
+            await server.stop()
+
+    asyncio.run(run())
+    print("Async Compact Candles, Timeframes and Symbols: PASSED")
+
+
+if __name__ == "__main__":
+    try:
+        test_async_quotes_one_round_trip()
+        test_async_candles_and_errors()
+        test_async_compact_timeframes_and_symbols()
+        print("\nALL ASYNC FETCHER TESTS PASSED ✅")
+    except Exception as e:
+        print(f"\nTEST FAILED ❌: {e}")
+        sys.exit(1)
@@ -2,6 +2,9 @@ import sys
 import os
 import pandas as pd
 import numpy as np
+import tempfile
+import time
+import threading
 
 # Add current directory to path
 sys.path.append(os.getcwd())
@@ -9,6 +12,29 @@ sys.path.append(os.getcwd())
 from feature_engineering import FeatureEngineer
 from model import ModelTrainer
 from predictor import StockPredictor
+from data_fetcher import DataFetcher
+from candle_store import CandleStore
+from candles import Candles
+from archive import CandleArchive
+from result_cache import ResultCache, SqliteBackend
+import archive
+import backtest
+import batch
+import benchmark
+from metrics import MetricsRegistry, import_times
+import subprocess
+from chart_layer import ChartLayer, lttb, aggregate_ohlc
+from feature_engineering import timeframe_features
+from resample import resample, lookback_seconds
+import tuning
+from tuning import ParamStore
+from scanner import Scanner, read_universe
+import json
+import tracemalloc
+import indicators
+import refresh_scheduler
+from refresh_scheduler import RefreshScheduler
+from rate_limiter import RateLimiter, TokenBucket, PRIORITY_QUOTE, PRIORITY_BACKFILL
 
 def test_feature_engineering():
     print("Testing Feature Engineering...")
@@ -59,11 +85,1008 @@ def test_predictor_mock():
     assert hasattr(predictor, 'analyze_stock')
     print("Predictor Instantiation: PASSED")
 
+class FakeCandleClient:
+    """Stands in for finnhub.Client, serving daily bars up to `now`."""
+    def __init__(self, now, days=400):
+        self.now = now
+        self.days = days
+        self.calls = []
+
+    def stock_candles(self, symbol, resolution, start, end):
+        self.calls.append((start, end))
+        first = self.now - (self.days - 1) * 86400
+        t = [ts for ts in range(first, self.now + 1, 86400) if ts >= start]
+        if not t:
+            return {'s': 'no_data'}
+        close = [float(ts // 86400) for ts in t]
+        return {'s': 'ok', 't': t, 'o': close, 'h': close, 'l': close, 'c': close,
+                'v': [1000.0] * len(t)}
+
+def test_candle_store_incremental():
+    print("Testing Candle Store (incremental fetch)...")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        fetcher = DataFetcher(api_key="dummy_key", store=CandleStore(cache_dir))
+        now = int(time.time())
+        fetcher.client = FakeCandleClient(now)
+
+        df = fetcher.fetch_candles('AAPL', count=50)
+        assert len(df) == 50
+        assert fetcher.client.calls[-1][0] < now - 50 * 86400
+
+        # Two new bars arrive: only bars from the last stored one are requested
+        fetcher.client.now = now + 2 * 86400
+        df = fetcher.fetch_candles('AAPL', count=50)
+        assert fetcher.client.calls[-1][0] == now
+        assert len(df) == 50
+        assert df['Time'].is_monotonic_increasing
+        assert df['Time'].is_unique
+        assert df['Close'].iloc[-1] == (now + 2 * 86400) // 86400
+        assert fetcher.store.last_timestamp('AAPL') == now + 2 * 86400
+
+        # A refresh reads the file once, and does not rewrite it when no bar changed
+        store = fetcher.store
+        reads, writes = [], []
+        load, write = store.load, store._write
+        store.load = lambda *a: reads.append(a) or load(*a)
+        store._write = lambda *a: writes.append(a) or write(*a)
+        again = fetcher.fetch_candles('AAPL', count=50)
+        assert len(reads) == 1 and writes == [] and again['Close'].equals(df['Close'])
+        fetcher.client.now = now + 3 * 86400
+        assert fetcher.fetch_candles('AAPL', count=50)['Close'].iloc[-1] == (now + 3 * 86400) // 86400
+        assert len(reads) == 2 and len(writes) == 1
+
+        # A failed refresh serves the stored history, with the error recorded
+        class FailingClient:
+            def stock_candles(self, *args):
+                raise ValueError("API down")
+        fetcher.client = FailingClient()
+        stale = fetcher.fetch_candles('AAPL', count=50)
+        assert len(stale) == 50 and stale['Close'].iloc[-1] == (now + 3 * 86400) // 86400
+        assert stale.attrs['error'] == "API down" and fetcher.errors['AAPL'] == "API down"
+        # Only a symbol with nothing stored falls back
+        assert fetcher.fetch_candles('MSFT', count=50) is None
+    print("Candle Store: PASSED")
+
+def test_analyze_many():
+    print("Testing Batch Analysis (analyze_many)...")
+    predictor = StockPredictor(api_key="dummy_key")
+    predictor.fetcher.use_mock = True
+    mock_fetch = predictor.fetcher.fetch_candles
+    predictor.fetcher.fetch_candles = lambda symbol, **kw: None if symbol == 'BAD' else mock_fetch(symbol, **kw)
+
+    for processes in (0, 2):
+        results = {r['symbol']: r for r in predictor.analyze_many(['AAPL', 'MSFT', 'BAD'], processes=processes)}
+        assert set(results) == {'AAPL', 'MSFT', 'BAD'}
+        assert 'error' in results['BAD']
+        for sym in ('AAPL', 'MSFT'):
+            assert 'error' not in results[sym], results[sym]
+            assert results[sym]['signal'] in ('BUY', 'SELL', 'HOLD')
+            assert 0 <= results[sym]['probability'] <= 1
+
+    # The worker processes are started once and kept for later calls
+    pool = predictor._cpu_pool
+    assert pool is not None and len(list(predictor.analyze_many(['TSLA'], processes=2))) == 1
+    assert predictor._cpu_pool is pool
+    predictor.close()
+    assert predictor._cpu_pool is None
+    print("Batch Analysis: PASSED")
+
+def test_model_registry():
+    print("Testing Model Registry (cached and warm-started models)...")
+    with tempfile.TemporaryDirectory() as model_dir:
+        predictor = StockPredictor(api_key="dummy_key", model_dir=model_dir)
+        predictor.fetcher.use_mock = True
+        df = predictor.fetcher.fetch_candles('AAPL', count=300)
+
+        first = predictor.analyze_candles('AAPL', df)
+        assert first['retrained'] and first['model_version'] == 1
+
+        # Same bars again: the cached model is reused
+        second = predictor.analyze_candles('AAPL', df)
+        assert not second['retrained'] and second['model_version'] == 1
+        assert second['probability'] == first['probability']
+
+        # Force the staleness policy: boosting continues from the cached booster
+        predictor.registry.max_new_bars = 0
+        third = predictor.analyze_candles('AAPL', df)
+        assert third['retrained'] and third['model_version'] == 2
+        assert predictor.trainer.model.get_booster().num_boosted_rounds() == 100 + predictor.registry.warm_start_trees
+
+        # Minute-bar models (the streamer's) are kept apart from the daily ones
+        minutes = predictor.fetcher.fetch_candles('MSFT', resolution='1', count=300)
+        intraday = predictor.analyze_candles('MSFT', minutes, resolution='1')
+        assert intraday['retrained'] and intraday['model_version'] == 1
+        daily = predictor.analyze_candles('MSFT', predictor.fetcher.fetch_candles('MSFT', count=300))
+        assert daily['retrained'] and daily['model_version'] == 1
+        assert predictor.trainer.model.get_booster().num_boosted_rounds() == 100  # not warm-started
+        assert predictor.registry.latest('MSFT', predictor.trainer.features, resolution='1')['resolution'] == '1'
+    print("Model Registry: PASSED")
+
+class ThrottledError(Exception):
+    status_code = 429
+
+def test_rate_limiter():
+    print("Testing Rate Limiter...")
+    # Retries 429s with backoff, then succeeds
+    limiter = RateLimiter(TokenBucket(calls_per_minute=6000), base_delay=0.001)
+    attempts = []
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ThrottledError()
+        return 'ok'
+    assert limiter.call(flaky) == 'ok'
+    assert limiter.stats['throttled'] == 2 and limiter.stats['retries'] == 2
+
+    # Non-retryable errors are raised immediately
+    try:
+        limiter.call(lambda: 1 / 0)
+        assert False, "expected ZeroDivisionError"
+    except ZeroDivisionError:
+        pass
+
+    # With an empty bucket, queued quotes are served before queued backfills
+    limiter = RateLimiter(TokenBucket(calls_per_minute=120, burst=1))
+    limiter.bucket.try_acquire()
+    order = []
+    threads = [threading.Thread(target=limiter.call, args=(order.append, name), kwargs={'priority': prio})
+               for name, prio in [('backfill', PRIORITY_BACKFILL), ('quote', PRIORITY_QUOTE)]]
+    with limiter._cond:  # hold the queue until both requests are waiting
+        for t in threads:
+            t.start()
+        while len(limiter._queue) < 2:
+            limiter._cond.wait(0.01)
+    for t in threads:
+        t.join()
+    assert order == ['quote', 'backfill'], order
+
+    # A slow (file-locked) bucket is asked without holding the priority queue
+    class SlowBucket(TokenBucket):
+        def try_acquire(self):
+            free = []
+            def probe():
+                free.append(limiter._cond.acquire(timeout=0.5))
+                if free[0]:
+                    limiter._cond.release()
+            prober = threading.Thread(target=probe)
+            prober.start()
+            prober.join()
+            assert free == [True]
+            return super().try_acquire()
+    limiter = RateLimiter(SlowBucket(calls_per_minute=6000))
+    assert [limiter.call(lambda: 'ok') for _ in range(3)] == ['ok'] * 3 and limiter._queue == []
+    print("Rate Limiter: PASSED")
+
+def test_mock_fallback_is_explicit():
+    print("Testing explicit mock fallback...")
+    class FailingClient:
+        def stock_candles(self, *args):
+            raise ConnectionError("API down")
+
+    fetcher = DataFetcher(api_key="dummy_key", rate_limiter=RateLimiter(max_retries=0))
+    fetcher.client = FailingClient()
+    assert fetcher.fetch_candles('AAPL', count=50) is None
+    assert 'API down' in fetcher.errors['AAPL']
+
+    fetcher.mock_fallback = True
+    df = fetcher.fetch_candles('AAPL', count=50)
+    assert df.attrs['source'] == 'mock' and fetcher.fallbacks == 1
+    print("Explicit mock fallback: PASSED")
+
+def test_incremental_indicators():
+    print("Testing Incremental Indicators (match batch ta results)...")
+    fetcher = DataFetcher(api_key="dummy_key")
+    df = fetcher._generate_mock_data('AAPL', 300)
+    df.loc[100:110, 'Close'] = df.loc[100, 'Close']  # flat stretch: zero gains and losses
+    fe = FeatureEngineer()
+    full_df, _ = fe.prepare_data(df)
+
+    # Seed on the first 250 bars, then stream the rest one bar at a time
+    features = [fe.seed_online('AAPL', df.iloc[:250])]
+    for close, volume in zip(df['Close'].iloc[250:], df['Volume'].iloc[250:]):
+        features.append(fe.update_online('AAPL', close, volume))
+
+    expected = full_df.iloc[249:]
+    for col in ['RSI', 'SMA_20', 'SMA_50', 'Returns', 'Volume_Change']:
+        got = np.array([f[col] for f in features])
+        assert np.array_equal(got, expected[col].to_numpy(dtype=float), equal_nan=True), col
+    print("Incremental Indicators: PASSED")
+
+def test_panel_features():
+    print("Testing Panel Features (many symbols in one pass)...")
+    fetcher = DataFetcher(api_key="dummy_key")
+    fe = FeatureEngineer()
+    times = pd.date_range(start='2024-01-01', periods=300)
+    frames = []
+    for symbol, length in [('AAPL', 300), ('MSFT', 250), ('IPO', 120), ('HALT', 300)]:  # ragged histories
+        df = fetcher._generate_mock_data(symbol, length)
+        df['Time'] = times[-length:]
+        df['Symbol'] = symbol
+        if symbol == 'HALT':
+            df = df.drop(index=150).reset_index(drop=True)  # misses a bar the others have
+        frames.append(df)
+
+    # Rows in any order: each symbol's bars are taken in time order
+    long = pd.concat(frames, ignore_index=True).sample(frac=1, random_state=0)
+    full_df, train_df = fe.prepare_panel(long)
+    assert full_df.index.equals(long.index)
+    full_df, train_df = full_df.sort_values(['Symbol', 'Time']), train_df.sort_values(['Symbol', 'Time'])
+    for df in frames:
+        symbol = df['Symbol'].iloc[0]
+        expected_full, expected_train = fe.prepare_data(df.drop(columns='Symbol'))
+        got = full_df[full_df['Symbol'] == symbol]
+        for col in ['RSI', 'SMA_20', 'SMA_50', 'Returns', 'Volume_Change']:
+            assert np.array_equal(got[col].to_numpy(dtype=float), expected_full[col].to_numpy(dtype=float), equal_nan=True), (symbol, col)
+        got_train = train_df[train_df['Symbol'] == symbol]
+        assert got_train['Target'].tolist() == expected_train['Target'].tolist()
+
+    # Array mode: (time x symbol) in, (time x symbol) out
+    panel = fe.prepare_panel(np.random.rand(300, 40) * 100, np.random.rand(300, 40) * 1000)
+    assert panel['RSI'].shape == (300, 40) and np.isnan(panel['SMA_50'][:49]).all()
+    print("Panel Features: PASSED")
+
+def test_indicator_kernels():
+    print("Testing Indicator Kernels (against ta)...")
+    from ta.momentum import RSIIndicator
+    from ta.trend import SMAIndicator, EMAIndicator
+
+    df = DataFetcher(api_key="dummy_key")._generate_mock_data('AAPL', 2000, seed=5)
+    df.loc[100:110, 'Close'] = df.loc[100, 'Close']  # flat stretch
+    close = df['Close'].astype(np.float64)
+    x = close.to_numpy()
+
+    # RSI and EMA are ta's recurrence, so bit for bit; SMA to about 1e-12
+    assert np.array_equal(indicators.rsi(x), RSIIndicator(close, window=14).rsi().to_numpy(), equal_nan=True)
+    assert np.array_equal(indicators.ema(x, 12), EMAIndicator(close, window=12).ema_indicator().to_numpy(), equal_nan=True)
+    for window in (20, 50):
+        expected = SMAIndicator(close, window=window).sma_indicator().to_numpy()
+        assert np.allclose(indicators.sma(x, window), expected, rtol=1e-12, atol=0, equal_nan=True)
+    assert np.array_equal(indicators.pct_change(x), close.pct_change().to_numpy(), equal_nan=True)
+    # The running sums restart every SMA_ANCHOR windows, so the error does not grow with the series
+    rng = np.random.default_rng(3)
+    long = 50000 + np.cumsum(rng.normal(0, 5, 500_000))
+    expected = pd.Series(long).rolling(50).mean().to_numpy()
+    assert np.allclose(indicators.sma(long, 50), expected, rtol=1e-12, atol=0, equal_nan=True)
+    # In place, and one bar at a time, across several restarts
+    from feature_engineering import _RollingMean
+    online = _RollingMean(20)
+    stepped = [online.update(value) for value in long[:5000].tolist()]
+    in_place = long[:5000].copy()
+    indicators.sma(in_place, 20, out=in_place)
+    assert np.array_equal(stepped, indicators.sma(long[:5000], 20), equal_nan=True)
+    assert np.array_equal(in_place, stepped, equal_nan=True)
+
+    # Results go into the caller's array
+    out = np.empty_like(x)
+    assert indicators.rsi(x, out=out) is out
+
+    # Matrix columns with a late start or a gap equal the column computed alone
+    matrix = np.stack([x, np.roll(x, 7), x[::-1]], axis=1)
+    matrix[:300, 1] = np.nan
+    matrix[1000:1005, 2] = np.nan
+    for kernel in (indicators.rsi, lambda v: indicators.sma(v, 20), lambda v: indicators.ema(v, 12)):
+        together = kernel(matrix)
+        late = kernel(matrix[300:, 1].copy())
+        assert np.isnan(together[:300, 1]).all()
+        assert np.array_equal(together[300:, 1], late, equal_nan=True)
+        assert np.array_equal(together[:, 0], kernel(x), equal_nan=True)
+    # Across a gap, an SMA window is incomplete while a smoothed average carries on
+    sma = indicators.sma(matrix, 20)
+    assert np.isnan(sma[1000:1024, 2]).all() and not np.isnan(sma[1024:, 2]).any()
+    ema = indicators.ema(matrix, 12)
+    assert (ema[1000:1005, 2] == ema[999, 2]).all()
+    # The compiled (reference) loop, the float loop and the row-wise step agree
+    reference = np.empty_like(matrix)
+    indicators._ewm_loop(matrix, 1 / 14, reference)
+    rows = np.empty_like(matrix)
+    indicators._ewm_rows(matrix, 1 / 14, rows)
+    assert np.array_equal(reference, rows, equal_nan=True)
+    assert np.array_equal(reference[:, 1], indicators._ewm_list(matrix[:, 1].tolist(), 1 / 14), equal_nan=True)
+
+    # prepare_data is built on the kernels: one block, no ta objects
+    full_df, train_df = FeatureEngineer().prepare_data(df)
+    assert np.array_equal(full_df['RSI'].to_numpy(), indicators.rsi(x), equal_nan=True)
+    assert full_df['Target'].dtype == np.int8 and not train_df.isna().any().any()
+    assert len(train_df) == len(df) - 49 - 3
+    print("Indicator Kernels: PASSED")
+
+def test_pooled_model():
+    print("Testing Pooled Model (one model for the watchlist)...")
+    predictor = StockPredictor(api_key="dummy_key")
+    predictor.fetcher.use_mock = True
+    mock_fetch = predictor.fetcher.fetch_candles
+    predictor.fetcher.fetch_candles = lambda symbol, **kw: None if symbol == 'BAD' else mock_fetch(symbol, **kw)
+
+    results = predictor.analyze_pooled(['AAPL', 'MSFT', 'TSLA', 'BAD'])
+    assert [r['symbol'] for r in results] == ['AAPL', 'MSFT', 'TSLA', 'BAD']
+    assert 'error' in results[-1]
+    for r in results[:-1]:
+        assert r['model'] == 'pooled' and r['signal'] in ('BUY', 'SELL', 'HOLD')
+        assert (r['data']['Symbol'] == r['symbol']).all()
+    model = predictor.pooled
+    assert set(model.symbols) == {'AAPL', 'MSFT', 'TSLA'}
+
+    # Served from memory: no refit for a subset of the symbols it was trained on
+    predictor.analyze_pooled(['MSFT', 'AAPL'])
+    assert predictor.pooled is model
+    print("Pooled Model: PASSED")
+
+def test_backtest():
+    print("Testing Walk-forward Backtest...")
+    # Folds never train on targets that look into their own test block
+    for train_start, train_end, test_start, test_end in backtest.walk_forward_folds(500, 200, 20):
+        assert train_end - train_start == 200
+        assert train_end + backtest.TARGET_HORIZON <= test_start < test_end <= 500
+
+    # Always BUY on a steadily rising price: every signal hits, no drawdown
+    close = np.linspace(100, 200, 50)
+    metrics = backtest.evaluate_signals(close, np.full(50, 0.9))
+    assert metrics['hit_rate'] == 1.0 and metrics['max_drawdown'] == 0.0
+    assert metrics['total_return'] > 0 and metrics['sells'] == 0
+
+    df = DataFetcher(api_key="dummy_key")._generate_mock_data('AAPL', 400)
+    metrics, full_df = backtest.backtest_symbol(df, train_window=150, test_window=25, n_jobs=1)
+    probs = full_df['Probability']
+    first_valid = full_df.dropna(subset=['RSI', 'SMA_20', 'SMA_50', 'Returns', 'Volume_Change']).index[0]
+    assert probs.loc[:first_valid + 150 + backtest.TARGET_HORIZON - 1].isna().all()
+    assert probs.dropna().between(0, 1).all() and probs.notna().sum() > 150
+    assert 0 <= metrics['hit_rate'] <= 1 and metrics['max_drawdown'] <= 0
+    print("Walk-forward Backtest: PASSED")
+
+def test_pipeline_metrics():
+    print("Testing Pipeline Metrics...")
+    registry = MetricsRegistry()
+    predictor = StockPredictor(api_key="dummy_key", metrics=registry)
+    predictor.fetcher.use_mock = True
+
+    result = predictor.analyze_stock('AAPL')
+    assert list(result['timings']) == ['fetch', 'prepare_data', 'train', 'predict']
+    assert result['timings']['fetch']['rows'] == 300 and result['timings']['fetch']['bytes'] > 0
+    assert all(rec['wall'] >= 0 and rec['cpu'] >= 0 for rec in result['timings'].values())
+
+    # Timings measured in worker processes are recorded by the parent
+    list(predictor.analyze_many(['MSFT'], processes=1))
+    assert set(registry.latest('MSFT')) == {'fetch', 'prepare_data', 'train', 'predict'}
+
+    stages = {row['stage']: row for row in registry.summary()}
+    assert stages['train']['calls'] == 2
+    prometheus = registry.to_prometheus()
+    assert 'stock_stage_wall_seconds_total{symbol="AAPL",stage="train"}' in prometheus
+    assert '"MSFT"' in registry.to_json()
+    print("Pipeline Metrics: PASSED")
+
+def test_benchmark_compare():
+    print("Testing Benchmark Baselines...")
+    # Seeded mock data is reproducible per symbol and differs between symbols
+    a = DataFetcher(api_key="dummy_key", mock_seed=42)
+    b = DataFetcher(api_key="dummy_key", mock_seed=42)
+    a.use_mock = b.use_mock = True
+    assert a.fetch_candles('AAPL')['Close'].equals(b.fetch_candles('AAPL')['Close'])
+    assert not a.fetch_candles('AAPL')['Close'].equals(a.fetch_candles('MSFT')['Close'])
+
+    baseline = {'results': {'train[300]': {'median_s': 0.100}, 'predict_proba[1]': {'median_s': 0.002}}}
+    current = {'results': {'train[300]': {'median_s': 0.140}, 'predict_proba[1]': {'median_s': 0.0021},
+                           'analyze_stock[1]': {'median_s': 0.050}}}
+    regressions = benchmark.compare(baseline, current, threshold=0.25)
+    assert [r[0] for r in regressions] == ['train[300]']
+    assert benchmark.compare(baseline, current, threshold=0.5) == []
+
+    # The fetch cases run against the local simulator, cold and from the store
+    cold = benchmark.bench_fetch(3, repeats=1)
+    stored = benchmark.bench_fetch(3, repeats=1, stored=True)
+    assert cold['unit'] == stored['unit'] == 'symbols/s' and cold['repeats'] == stored['repeats'] == 1
+    print("Benchmark Baselines: PASSED")
+
+def test_fast_inference():
+    print("Testing Fast Inference Path...")
+    fetcher = DataFetcher(api_key="dummy_key", mock_seed=7)
+    fetcher.use_mock = True
+    full_df, train_df = FeatureEngineer().prepare_data(fetcher.fetch_candles('AAPL'))
+    trainer = ModelTrainer()
+    trainer.train(train_df)
+
+    # Same probabilities as the DataFrame / sklearn path, for one row and a batch
+    row = trainer.feature_vector(full_df)
+    assert row is not trainer.feature_vector(full_df)  # a new row per call, unless `out` is given
+    out = np.empty_like(row)
+    assert trainer.feature_vector(full_df, out=out) is out and np.array_equal(out, row)
+    assert trainer.predict_fast(row)[0] == trainer.predict_proba(full_df.iloc[[-1]])[0]
+    clean = full_df.dropna(subset=trainer.features)
+    batch = clean[trainer.features].to_numpy()
+    assert np.array_equal(trainer.predict_fast(batch), trainer.predict_proba(clean))
+
+    # The cached booster follows a retrained model
+    trainer.train(train_df.iloc[:150])
+    assert trainer.predict_fast(row)[0] == trainer.predict_proba(full_df.iloc[[-1]])[0]
+
+    # Threads sharing one trainer each score their own row
+    frames = [full_df, FeatureEngineer().prepare_data(fetcher.fetch_candles('MSFT'))[0]]
+    expected = [trainer.predict_fast(trainer.feature_vector(df))[0] for df in frames]
+    mismatches = []
+    def score(i):
+        for _ in range(500):
+            if trainer.predict_fast(trainer.feature_vector(frames[i]))[0] != expected[i]:
+                mismatches.append(i)
+    threads = [threading.Thread(target=score, args=(i % 2,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert expected[0] != expected[1] and mismatches == []
+    print("Fast Inference Path: PASSED")
+
+def test_compact_candles():
+    print("Testing Compact Candles...")
+    res = {'t': [1700000000 + i * 86400 for i in range(100)], 'o': [10.5] * 100, 'h': [11.0] * 100,
+           'l': [10.0] * 100, 'c': [10.25 + i for i in range(100)], 'v': [1000.0] * 100, 's': 'ok'}
+    candles = Candles.from_columns(res)
+    assert candles.nbytes == 100 * 32
+    assert candles.c.dtype == np.float32 and candles.v.dtype == np.int64
+
+    # Frames and tails are views of the same arrays
+    df = candles.to_frame()
+    assert np.shares_memory(df['Close'].to_numpy(), candles.c)
+    assert np.shares_memory(candles.tail(10).c, candles.c) and len(candles.tail(10)) == 10
+    assert df['Time'].iloc[0] == pd.Timestamp(1700000000, unit='s')
+    assert np.array_equal(Candles.from_frame(df).t, candles.t)
+
+    # Features add only their own columns; the candle columns are not copied
+    full_df, train_df = FeatureEngineer().prepare_data(df)
+    assert np.shares_memory(full_df['Close'].to_numpy(), candles.c)
+    assert 'Future_Close' not in full_df.columns
+    assert len(train_df) == 100 - 49 - 3  # SMA_50 warm-up and the last 3 unknown targets
+    assert train_df['Target'].tolist() == [1] * len(train_df)
+    print("Compact Candles: PASSED")
+
+def test_candle_archive():
+    print("Testing Memory-Mapped Candle Archive...")
+    stride = archive.INDEX_STRIDE
+    archive.INDEX_STRIDE = 16  # small blocks so range reads cross index entries
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            now = int(time.time()) // 86400 * 86400
+            fetcher = DataFetcher(api_key="dummy_key", archive=CandleArchive(tmp))
+            fetcher.client = FakeCandleClient(now - 86400, days=400)
+            assert fetcher.update_archive('AAPL', start=0) == 400
+
+            # Only bars from the newest archived one onwards are requested again
+            fetcher.client.now = now
+            assert fetcher.update_archive('AAPL') == 2
+            assert fetcher.client.calls[-1][0] == now - 86400
+            assert fetcher.archive.row_count('AAPL') == 401
+
+            first = now - 400 * 86400
+            df = fetcher.fetch_range('AAPL', first + 100 * 86400, first + 149 * 86400)
+            assert len(df) == 50 and df.attrs['source'] == 'archive'
+            assert df['Time'].iloc[0] == pd.Timestamp(first + 100 * 86400, unit='s')
+            day = pd.Timestamp(first + 200 * 86400, unit='s')
+            assert len(fetcher.fetch_range('AAPL', day.strftime('%Y-%m-%d'), day)) == 1
+            assert fetcher.fetch_range('AAPL', now + 86400) is None
+
+            # Backfilling older bars keeps the newer ones after them
+            older = Candles.from_columns(FakeCandleClient(first - 86400, days=30).stock_candles('AAPL', 'D', 0, 0))
+            fetcher.archive.append('AAPL', 'D', older)
+            times = fetcher.archive.read('AAPL').t
+            assert len(times) == 431 and (np.diff(times) == 86400).all()
+            index = np.fromfile(os.path.join(tmp, 'D', 'AAPL.idx'), dtype='<i8')
+            assert np.array_equal(index, times[::16])
+
+            # A backfill that fails before its swap leaves the archive as it was
+            replace = archive.os.replace
+            def crash(*args):
+                raise OSError("disk full")
+            archive.os.replace = crash
+            try:
+                fetcher.archive.append('AAPL', 'D', FakeCandleClient(first - 31 * 86400, days=5)
+                                       .stock_candles('AAPL', 'D', 0, 0))
+                assert False, "expected OSError"
+            except OSError:
+                pass
+            finally:
+                archive.os.replace = replace
+            assert np.array_equal(fetcher.archive.read('AAPL').t, times)
+            assert sorted(os.listdir(os.path.join(tmp, 'D'))) == ['AAPL.bin', 'AAPL.idx']
+
+            # A stale index is rebuilt on the next read
+            np.zeros(3, dtype='<i8').tofile(os.path.join(tmp, 'D', 'AAPL.idx'))
+            assert len(fetcher.fetch_range('AAPL', first + 100 * 86400, first + 149 * 86400)) == 50
+            assert np.array_equal(np.fromfile(os.path.join(tmp, 'D', 'AAPL.idx'), dtype='<i8'), times[::16])
+    finally:
+        archive.INDEX_STRIDE = stride
+    print("Memory-Mapped Candle Archive: PASSED")
+
+def test_result_cache():
+    print("Testing Shared Result Cache...")
+    # TTL and LRU eviction
+    cache = ResultCache(ttl=60, max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2, ttl=-1)  # already expired
+    assert cache.get('a') == 1 and cache.get('b') is None
+    cache.put('c', 3)
+    cache.get('a')
+    cache.put('d', 4)  # evicts 'c', the least recently used
+    assert cache.get('c') is None and cache.get('a') == 1 and cache.get('d') == 4
+
+    # Concurrent sessions asking for the same symbol trigger one fetch and one run
+    cache = ResultCache(ttl=60)
+    predictor = StockPredictor(api_key="dummy_key", result_cache=cache)
+    predictor.fetcher = DataFetcher(api_key="dummy_key", mock_seed=3)
+    predictor.fetcher.use_mock = True
+    fetches = []
+    fetch_candles = predictor.fetcher.fetch_candles
+    def slow_fetch(symbol, **kwargs):
+        fetches.append(symbol)
+        time.sleep(0.2)
+        return fetch_candles(symbol, **kwargs)
+    predictor.fetcher.fetch_candles = slow_fetch
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(predictor.analyze_stock('AAPL'))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert fetches == ['AAPL'] and all(r is results[0] for r in results)
+    assert cache.stats['coalesced'] + cache.stats['hits'] == 7
+
+    # analyze_many serves cached symbols without fetching them again
+    out = {r['symbol']: r for r in predictor.analyze_many(['AAPL', 'MSFT'], processes=0)}
+    assert fetches == ['AAPL', 'MSFT'] and out['AAPL'] is results[0] and 'error' not in out['MSFT']
+
+    # Once the latest result expires, an unchanged last bar still reuses the analysis
+    predictor.result_cache = ResultCache(ttl=0)
+    first = predictor.analyze_stock('TSLA')
+    assert predictor.analyze_stock('TSLA') is first and fetches.count('TSLA') == 2
+
+    # A SQLite backend shares results between processes (here: two caches)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'results.sqlite')
+        ResultCache(backend=SqliteBackend(path)).put(('latest', 'AAPL'), {'signal': 'BUY'})
+        assert ResultCache(backend=SqliteBackend(path)).get(('latest', 'AAPL')) == {'signal': 'BUY'}
+    print("Shared Result Cache: PASSED")
+
+def test_lazy_imports():
+    print("Testing Lazy Imports...")
+    # Building a predictor (mock mode) must not load the heavy dependencies
+    code = ("import sys; from predictor import StockPredictor; StockPredictor(api_key='dummy_key'); "
+            "print(','.join(m for m in ('xgboost', 'sklearn', 'ta', 'finnhub', 'joblib', 'plotly', 'websockets') "
+            "if m in sys.modules))")
+    here = os.path.dirname(os.path.abspath(__file__))
+    loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=here).stdout.strip()
+    assert loaded == '', loaded
+
+    report = import_times('predictor')
+    packages = dict(report['packages'])
+    assert report['total_ms'] > 0 and 'pandas' in packages and 'xgboost' not in packages
+    print("Lazy Imports: PASSED")
+
+def test_batch_scoring():
+    print("Testing Headless Batch Scoring...")
+    predictor = StockPredictor(api_key="dummy_key")
+    predictor.fetcher = DataFetcher(api_key="dummy_key", mock_seed=5)
+    predictor.fetcher.use_mock = True
+    symbols = [f"T{i:02d}" for i in range(12)]
+    quiet = lambda *args: None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'symbols.txt')
+        with open(path, 'w') as f:
+            f.write("# watchlist\n" + ", ".join(symbols[:6]) + "\n" + "\n".join(s.lower() for s in symbols[6:]) + "\nT00\n")
+        assert batch.read_symbols(path) == symbols
+
+        # A crash after the first batch: that batch is written and checkpointed
+        output = os.path.join(tmp, 'signals.csv')
+        analyze_many = predictor.analyze_many
+        calls = []
+        def crashing(chunk, **kwargs):
+            calls.append(chunk)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return analyze_many(chunk, **kwargs)
+        predictor.analyze_many = crashing
+        try:
+            batch.run_batch(predictor, symbols, output, batch_size=5, processes=0, log=quiet)
+            assert False, "expected the simulated crash"
+        except KeyboardInterrupt:
+            pass
+        assert len(pd.read_csv(output)) == 5
+
+        # Resuming scores only the rest; results never carry the plotting frame
+        predictor.analyze_many = analyze_many
+        summary = batch.run_batch(predictor, symbols, output, batch_size=5, processes=0, log=quiet)
+        assert summary['skipped'] == 5 and summary['scored'] == 7
+        df = pd.read_csv(output)
+        assert sorted(df['symbol']) == symbols and df['signal'].isin(['BUY', 'SELL', 'HOLD']).all()
+        assert (df['train_ms'] > 0).all() and df['error'].isna().all()
+
+        # Parquet output is a directory of part files
+        output = os.path.join(tmp, 'signals.parquet')
+        summary = batch.run_batch(predictor, symbols, output, batch_size=5, processes=0, log=quiet)
+        assert summary['rows_written'] == 12 and len(os.listdir(output)) == 3
+        assert sorted(pd.read_parquet(output)['symbol']) == symbols
+
+        # Failed symbols are not checkpointed: a resumed run retries them
+        output = os.path.join(tmp, 'retry.csv')
+        fetch_candles = predictor.fetcher.fetch_candles
+        predictor.fetcher.fetch_candles = lambda symbol, **kw: None if symbol == 'T03' else fetch_candles(symbol, **kw)
+        summary = batch.run_batch(predictor, symbols[:6], output, batch_size=5, processes=0, log=quiet)
+        assert summary['errors'] == 1 and 'T03' not in batch.SignalWriter(output).completed()
+        predictor.fetcher.fetch_candles = fetch_candles
+        summary = batch.run_batch(predictor, symbols[:6], output, batch_size=5, processes=0, log=quiet)
+        assert summary['scored'] == 1 and summary['errors'] == 0
+        df = pd.read_csv(output)
+        assert len(df) == 7 and df[df['symbol'] == 'T03']['error'].notna().tolist() == [True, False]
+
+        # Every chunk runs on the same process pool
+        pools = []
+        def recording(chunk, **kwargs):
+            yield from analyze_many(chunk, **kwargs)
+            pools.append(predictor._cpu_pool)
+        predictor.analyze_many = recording
+        batch.run_batch(predictor, symbols[:6], os.path.join(tmp, 'pool.csv'), batch_size=2, processes=1, log=quiet)
+        predictor.analyze_many = analyze_many
+        assert len(pools) == 3 and pools[0] is not None and all(pool is pools[0] for pool in pools)
+        predictor.close()
+
+    row = batch.result_row({'symbol': 'BAD', 'error': 'No data'})
+    assert row['error'] == 'No data' and row['probability'] is None
+    print("Headless Batch Scoring: PASSED")
+
+def test_chart_layer():
+    print("Testing Chart Layer (reuse, downsampling)...")
+    # LTTB keeps both ends and the extremes of a spiky line
+    x = np.arange(1000)
+    y = np.sin(x / 20.0)
+    y[500] = 10.0
+    keep = lttb(x, y, 100)
+    assert len(keep) == 100 and keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0) and 500 in keep
+
+    fetcher = DataFetcher(api_key="dummy_key", mock_seed=3)
+    fetcher.use_mock = True
+    df, _ = FeatureEngineer().prepare_data(fetcher.fetch_candles("AAPL", count=1000))
+
+    # OHLC aggregation keeps the range and the total volume
+    bars = aggregate_ohlc(df, 100)
+    assert len(bars) == 100
+    assert bars['High'].max() == df['High'].max() and bars['Low'].min() == df['Low'].min()
+    assert bars['Open'].iloc[0] == df['Open'].iloc[0] and bars['Close'].iloc[-1] == df['Close'].iloc[-1]
+    assert bars['Volume'].sum() == df['Volume'].sum()
+
+    layer = ChartLayer(max_points=200)
+    fig = layer.figure("AAPL", df.iloc[:-1])
+    assert len(fig.data[0].x) == 200 and len(fig.data[1].x) == 200
+    # Unchanged data: the same figure, untouched
+    assert layer.figure("AAPL", df.iloc[:-1]) is fig
+    # A new bar refills the existing figure instead of building a new one
+    assert layer.figure("AAPL", df) is fig and layer.builds == 1
+    assert fig.data[3].x[-1] == df['Time'].iloc[-1]
+    # A short range is drawn in full
+    layer.figure("AAPL", df, bars=63)
+    assert len(fig.data[0].x) == 63 and fig.data[0].close[-1] == df['Close'].iloc[-1]
+    print("Chart Layer: PASSED")
+
+def test_multi_resolution():
+    print("Testing Multi-resolution Fetching and Resampling...")
+    # Request windows fit the resolution (daily is unchanged: two days per bar)
+    assert lookback_seconds('D', 200) == 400 * 86400
+    assert lookback_seconds('5', 780) == 20 * 86400
+    try:
+        lookback_seconds('2H', 10)
+        assert False, "unknown resolution accepted"
+    except ValueError:
+        pass
+
+    fetcher = DataFetcher(api_key="dummy_key", mock_seed=4)
+    fetcher.use_mock = True
+    # Mock bars follow the requested resolution
+    df = fetcher.fetch_candles("AAPL", resolution='15', count=100)
+    assert len(df) == 100 and set(df['Time'].diff().dropna().unique()) >= {pd.Timedelta(minutes=15)}
+    assert df['Time'].dt.dayofweek.max() < 5
+
+    # Resampled hourly bars follow the calendar of directly fetched ones (13:30, 14:30, ...)
+    df = fetcher.fetch_candles("AAPL", resolution='5', count=2000)
+    hourly = resample(df, '60')
+    direct = fetcher.fetch_candles("AAPL", resolution='60', count=len(hourly))
+    assert set(hourly['Time']) == set(direct['Time']) and (hourly['Time'].dt.minute == 30).all()
+    # Every full session is split into the same bars, none of them a half hour at the open
+    per_day = hourly.groupby(hourly['Time'].dt.date)['Volume'].count()
+    assert (per_day.iloc[1:-1] == 7).all()
+    opening = hourly['Time'][hourly['Time'].dt.date == per_day.index[1]].iloc[0]
+    assert opening.hour == 13 and len(df[(df['Time'] >= opening) & (df['Time'] < opening + pd.Timedelta(hours=1))]) == 12
+
+    # Resampling matches an explicit groupby over the same buckets
+    expected = df.groupby((df['Time'] - pd.Timedelta(minutes=30)).dt.floor('60min') + pd.Timedelta(minutes=30)).agg(
+        {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'})
+    assert (hourly['Time'].to_numpy() == expected.index.to_numpy()).all()
+    for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
+        assert (hourly[col].to_numpy() == expected[col].to_numpy()).all(), col
+    weekly = resample(df, 'W')
+    assert (weekly['Time'].dt.dayofweek == 0).all() and weekly['Volume'].sum() == df['Volume'].sum()
+
+    # One fetch of the finest resolution serves all of them
+    calls = []
+    fetch = fetcher.fetch_candles
+    fetcher.fetch_candles = lambda symbol, resolution, count: calls.append((resolution, count)) or fetch(symbol, resolution, count)
+    frames = fetcher.fetch_timeframes("AAPL", ['D', '15', '60'], count=60)
+    assert calls == [('15', 60 * 26)] and set(frames) == {'D', '15', '60'}
+    assert len(frames['D']) >= 60
+
+    # Coarse features only come from bars that had closed: no lookahead
+    fe = FeatureEngineer()
+    full_df, train_df = fe.prepare_timeframes(frames)
+    columns = timeframe_features(frames, '15')
+    assert set(columns) <= set(full_df.columns) and len(train_df) > 0
+    daily = fe.prepare_data(frames['D'])[0].set_index('Time')
+    row = train_df.iloc[-1]
+    previous_day = row['Time'].floor('D') - pd.Timedelta(days=1)
+    assert row['RSI_D'] == daily.loc[:previous_day, 'RSI'].iloc[-1]
+
+    trainer = ModelTrainer(features=columns)
+    trainer.train(train_df)
+    assert 0 <= trainer.predict_fast(trainer.feature_vector(full_df))[0] <= 1
+    print("Multi-resolution: PASSED")
+
+def test_hyperparameter_tuning():
+    print("Testing Hyperparameter Tuning...")
+    import xgboost as xgb
+    fetcher = DataFetcher(api_key="dummy_key", mock_seed=6)
+    fetcher.use_mock = True
+    _, train_df = FeatureEngineer().prepare_data(fetcher.fetch_candles("AAPL", count=600))
+
+    # Each fold quantizes its data once, however many candidates it evaluates
+    built = []
+    original = xgb.QuantileDMatrix
+    class CountingDMatrix(original):
+        def __init__(self, *args, **kwargs):
+            built.append(1)
+            super().__init__(*args, **kwargs)
+    xgb.QuantileDMatrix = CountingDMatrix
+    try:
+        grid = {'max_depth': [2, 3, 6], 'learning_rate': [0.1, 0.3]}
+        result = tuning.tune(train_df, grid=grid, n_splits=3, max_rounds=200, early_stopping_rounds=10, n_jobs=2)
+    finally:
+        xgb.QuantileDMatrix = original
+    assert len(built) == 3 * 2 and len(result['results']) == 6
+    assert result['params'] == result['results'][0]['params']
+    assert result['score'] == min(r['score'] for r in result['results'])
+    # Early stopping: candidates stop well before max_rounds
+    assert all(r['rounds'] < 3 * 200 for r in result['results'])
+    assert len(tuning.candidates(n_iter=5)) == 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ParamStore(os.path.join(tmp, 'params.json'))
+        assert store.get('AAPL') is None
+        store.put(tuning.UNIVERSE, {'params': {'max_depth': 2, 'n_estimators': 30}, 'score': 0.69, 'rows': 1})
+        store.put('AAPL', result)
+        assert store.get('AAPL') == result['params'] and store.get('MSFT')['max_depth'] == 2
+
+        # The predictor trains with the stored parameters, under their own registry key
+        predictor = StockPredictor(api_key="dummy_key", model_dir=os.path.join(tmp, 'models'), param_store=store)
+        predictor.fetcher = fetcher
+        res = predictor.analyze_stock("MSFT")
+        assert 'error' not in res
+        meta = predictor.registry.latest("MSFT", predictor.trainer.features, store.get("MSFT"))
+        assert meta is not None and predictor.registry.latest("MSFT", predictor.trainer.features) is None
+        trainer = ModelTrainer(params=store.get("MSFT"))
+        assert trainer.model.get_params()['max_depth'] == 2 and trainer.model.get_params()['n_estimators'] == 30
+    print("Hyperparameter Tuning: PASSED")
+
+def test_market_scanner():
+    print("Testing Market Scanner...")
+    fetcher = DataFetcher(api_key="dummy_key", mock_seed=8)
+    fetcher.use_mock = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Exchange listing fixture in Finnhub's /stock/symbol format
+        path = os.path.join(tmp, 'us_symbols.json')
+        listing = [{'symbol': f"S{i:04d}", 'type': 'Common Stock' if i % 10 else 'ETP', 'mic': 'XNAS'}
+                   for i in range(8900)]
+        with open(path, 'w') as f:
+            json.dump(listing, f)
+        universe = read_universe(path)
+    assert len(universe) == 8010 and 'S0000' not in universe
+    assert len(fetcher.fetch_symbols('US')) == 500
+
+    scanner = Scanner(fetcher, min_volume=2_560_000, chunk_size=500)
+    # Cached quotes drop symbols before any candles are fetched
+    snapshot = pd.DataFrame({'symbol': universe, 'price': 150.0, 'volume': 3e6})
+    snapshot.loc[:9, 'price'] = 2.0
+    # The scoring model is fitted on a sample drawn from the whole universe, not the first chunk
+    fetched = []
+    fetch = scanner._fetch
+    scanner._fetch = lambda sym: fetched.append(sym) or fetch(sym)
+    scanner.scan(universe[:3000], top=5)
+    sample = fetched[:scanner.train_sample]
+    assert scanner.stats['trained_on'] > 0 and max(map(universe.index, sample)) >= scanner.chunk_size
+    scanner._fetch = fetch
+    # ... and refitted once it is older than refit_interval
+    model = scanner.model
+    trained_at = model.trained_at
+    scanner.scan(universe[:300], top=5)
+    assert scanner.stats['trained_on'] == 0 and model.trained_at == trained_at
+    model.trained_at -= 2 * scanner.refit_interval
+    scanner.scan(universe[:300], top=5)
+    assert scanner.stats['trained_on'] > 0 and model.trained_at > trained_at
+
+    start = time.perf_counter()
+    top = scanner.scan(universe, top=10, snapshot=snapshot)
+    elapsed = time.perf_counter() - start
+    stats = scanner.stats
+    print(f"  {stats['universe']} symbols in {elapsed:.1f} s: {stats}")
+    assert stats['quote_filtered'] == 10 and stats['fetched'] == 8000
+    assert stats['prefiltered'] > 0 and stats['scored'] == 8000 - stats['prefiltered']
+    assert elapsed < 30, elapsed
+
+    # Only one chunk of histories is alive at a time: peak memory does not grow with the universe
+    peaks = []
+    for n in (500, 1500):
+        tracemalloc.start()
+        scanner.scan(universe[:n], top=10)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    assert peaks[1] < peaks[0] * 1.5, peaks
+
+    # The bounded heap returns the same leaders as a full sort
+    everything = scanner.scan(universe, top=10**6, snapshot=snapshot)
+    assert len(everything) == stats['scored']
+    assert [r['symbol'] for r in top] == [r['symbol'] for r in everything[:10]]
+    assert all(a['probability'] >= b['probability'] for a, b in zip(top, top[1:]))
+    assert all(r['avg_volume'] >= 2_560_000 and r['signal'] in ('BUY', 'SELL', 'HOLD') for r in top)
+
+    # Without a snapshot, the quote stage uses the candles already in the local store
+    with tempfile.TemporaryDirectory() as tmp:
+        fetcher.store = CandleStore(tmp)
+        for i, sym in enumerate(universe[:40]):
+            price = 2.0 if i < 30 else 150.0
+            fetcher.store.append(sym, 'D', {'t': [86400 * (i + 1)], 'o': [price], 'h': [price], 'l': [price],
+                                            'c': [price], 'v': [3e6]})
+        snapshot = scanner.local_snapshot(universe[:100])
+        assert len(snapshot) == 40 and (snapshot['price'] == 2.0).sum() == 30
+        fetched = []
+        fetch = scanner._fetch
+        scanner._fetch = lambda sym: fetched.append(sym) or fetch(sym)
+        scanner.scan(universe[:100], top=5)
+        stats = scanner.stats
+        assert stats['quote_filtered'] == 30 and stats['unquoted'] == 60 and len(fetched) == 70
+        assert not set(fetched) & set(universe[:30])
+        fetcher.store = None
+    print("Market Scanner: PASSED")
+
+def test_refresh_scheduler():
+    print("Testing Background Refresh Scheduler...")
+    thursday = 1760021600  # 2025-10-09 14:53 UTC, in the session
+    assert refresh_scheduler.market_open(thursday) and not refresh_scheduler.market_open(thursday + 6 * 3600)
+    assert not refresh_scheduler.market_open(thursday + 2 * 86400)  # Saturday
+    friday_close = 1760126370  # 2025-10-10 19:59:30 UTC
+    assert refresh_scheduler.next_open(friday_close) == 1760362200  # Monday 13:30 UTC
+
+    # Cached latest results are not served to the scheduler: every refresh fetches
+    predictor = StockPredictor(api_key="dummy_key", result_cache=ResultCache(ttl=3600))
+    predictor.fetcher.use_mock = True
+    fetches = []
+    fetch_candles = predictor.fetcher.fetch_candles
+    def counting_fetch(symbol, **kwargs):
+        fetches.append(symbol)
+        return None if symbol == 'BAD' else fetch_candles(symbol, **kwargs)
+    predictor.fetcher.fetch_candles = counting_fetch
+
+    clock = [thursday]
+    scheduler = RefreshScheduler(predictor, interval=60, hot_interval=15, idle_after=120, clock=lambda: clock[0])
+    scheduler.watch(['AAPL', 'MSFT', 'BAD'], hot=['AAPL'])
+    empty = scheduler.snapshot()
+    assert sorted(scheduler.run_once()) == ['AAPL', 'BAD', 'MSFT']
+    first = scheduler.snapshot()
+    # Readers holding an older snapshot keep a consistent view
+    assert len(empty) == 0 and len(first) == 3 and first.version == 3
+    assert 'error' in first.get('BAD') and first.get('AAPL')['signal'] in ('BUY', 'SELL', 'HOLD')
+
+    # The hot symbol comes back every 15 s, the others every 60 s
+    clock[0] += 10
+    scheduler.watch(['AAPL', 'MSFT', 'BAD'], hot=['AAPL'])
+    assert scheduler.run_once() == []
+    clock[0] += 5
+    assert scheduler.run_once() == ['AAPL'] and fetches.count('AAPL') == 2
+    assert scheduler.snapshot().get('MSFT') is first.get('MSFT')
+    clock[0] += 15
+    scheduler.watch(['AAPL', 'MSFT'])  # AAPL off screen, BAD removed from the watchlist
+    assert scheduler.run_once() == ['AAPL']  # was still hot at its last refresh
+    clock[0] += 30
+    assert sorted(scheduler.run_once()) == ['BAD', 'MSFT']
+    clock[0] += 15
+    assert scheduler.run_once() == []        # AAPL is back at the normal cadence
+    clock[0] += 15
+    assert scheduler.run_once() == ['AAPL']
+
+    # Symbols nobody watches any more are dropped, results included
+    clock[0] += 110
+    scheduler.watch(['AAPL'])
+    assert scheduler.run_once() == ['AAPL']
+    assert set(scheduler.snapshot().results) == {'AAPL'} and scheduler.stats['dropped'] == 2
+
+    # After the close a symbol is refreshed once more, then not until the next open
+    clock[0] = friday_close
+    scheduler = RefreshScheduler(predictor, interval=60, clock=lambda: clock[0])
+    scheduler.watch(['AAPL'])
+    assert scheduler.run_once() == ['AAPL']
+    clock[0] += 60
+    scheduler.watch(['AAPL'])
+    assert scheduler.run_once() == ['AAPL']
+    clock[0] += 86400
+    scheduler.watch(['AAPL'])
+    assert scheduler.run_once() == [] and scheduler.stats['deferred'] == 1
+    clock[0] = 1760362200
+    scheduler.watch(['AAPL'])
+    assert scheduler.run_once() == ['AAPL']
+
+    # Pooled: a refit trains on the whole watchlist, so refreshing part of it
+    # after an edit does not refit the model on every cycle
+    predictor = StockPredictor(api_key="dummy_key")
+    predictor.fetcher.use_mock = True
+    clock[0] = thursday
+    scheduler = RefreshScheduler(predictor, interval=60, hot_interval=15, pooled=True, market_hours=False,
+                                 clock=lambda: clock[0])
+    watchlist = ['AAPL', 'MSFT']
+    models = []
+    for step in range(16):
+        if step == 2:
+            watchlist = ['AAPL', 'MSFT', 'NVDA']
+        scheduler.watch(watchlist, hot=['AAPL'])
+        scheduler.run_once()
+        models.append(predictor.pooled)
+        clock[0] += 15
+    assert len({id(model) for model in models}) == 2
+    assert models[-1].symbols == ['AAPL', 'MSFT', 'NVDA']
+    assert set(scheduler.snapshot().results) == {'AAPL', 'MSFT', 'NVDA'}
+
+    # In the background: reads return at once while the worker analyzes
+    scheduler = RefreshScheduler(predictor, market_hours=False, pooled=True)
+    scheduler.start()
+    try:
+        scheduler.watch(['AAPL', 'MSFT', 'NVDA'])
+        reads = []
+        deadline = time.time() + 30
+        while len(scheduler.snapshot()) < 3 and time.time() < deadline:
+            start = time.perf_counter()
+            scheduler.snapshot()
+            reads.append(time.perf_counter() - start)
+            time.sleep(0.01)
+        snapshot = scheduler.snapshot()
+        assert len(snapshot) == 3 and all(r.get('model') == 'pooled' for r in snapshot.results.values())
+        assert max(reads) < 0.01, max(reads)
+    finally:
+        scheduler.stop()
+    assert not scheduler._thread.is_alive()
+    print("Background Refresh Scheduler: PASSED")
+
 if __name__ == "__main__":
     try:
         test_feature_engineering()
         test_model_training()
         test_predictor_mock()
+        test_candle_store_incremental()
+        test_analyze_many()
+        test_model_registry()
+        test_rate_limiter()
+        test_mock_fallback_is_explicit()
+        test_incremental_indicators()
+        test_panel_features()
+        test_indicator_kernels()
+        test_pooled_model()
+        test_backtest()
+        test_pipeline_metrics()
+        test_benchmark_compare()
+        test_fast_inference()
+        test_compact_candles()
+        test_candle_archive()
+        test_result_cache()
+        test_lazy_imports()
+        test_batch_scoring()
+        test_chart_layer()
+        test_multi_resolution()
+        test_hyperparameter_tuning()
+        test_market_scanner()
+        test_refresh_scheduler()
         print("\nALL SYSTEM TESTS PASSED ✅")
     except Exception as e:
         print(f"\nTEST FAILED ❌: {e}")
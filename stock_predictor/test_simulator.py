@@ -0,0 +1,178 @@
+import sys
+import os
+import time
+import asyncio
+import tempfile
+import numpy as np
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+
+from simulator import MarketSimulator
+from data_fetcher import DataFetcher
+from async_fetcher import AsyncDataFetcher
+from candle_store import CandleStore
+from archive import CandleArchive
+from rate_limiter import RateLimiter, AsyncRateLimiter, TokenBucket
+
+DAY = 86400
+
+
+def make_fetcher(simulator, **kwargs):
+    limiter = RateLimiter(TokenBucket(calls_per_minute=60000), base_delay=0.05)
+    return DataFetcher(api_key="sim_key", base_url=simulator.url, rate_limiter=limiter, **kwargs)
+
+
+def candles(simulator, symbol, resolution, start, end):
+    status, payload, _ = simulator.handle('/api/v1/stock/candle',
+                                          f"symbol={symbol}&resolution={resolution}&from={start}&to={end}")
+    assert status == 200, payload
+    return payload
+
+
+def test_simulator_deterministic():
+    print("Testing Simulator Determinism...")
+    now = 1760021600  # Thursday 2025-10-09, 14:53 UTC: in the session
+    a = MarketSimulator(seed=7, start=now, speed=0)
+    b = MarketSimulator(seed=7, start=now, speed=0)
+
+    for resolution in ('1', '15', 'D', 'W', 'M'):
+        first = candles(a, 'AAPL', resolution, now - 400 * DAY, now)
+        assert first['s'] == 'ok' and first['t'] == sorted(first['t'])
+        assert first == candles(b, 'AAPL', resolution, now - 400 * DAY, now), resolution
+        assert max(first['t']) <= now
+    assert candles(MarketSimulator(seed=8, start=now, speed=0), 'AAPL', 'D', now - 30 * DAY, now) != \
+        candles(a, 'AAPL', 'D', now - 30 * DAY, now)
+
+    # Bars do not depend on the request window, only on their time
+    wide = candles(a, 'MSFT', 'D', now - 3000 * DAY, now)
+    narrow = candles(b, 'MSFT', 'D', now - 20 * DAY, now - 10 * DAY)
+    offset = wide['t'].index(narrow['t'][0])
+    assert wide['c'][offset:offset + len(narrow['c'])] == narrow['c']
+
+    # Today's daily bar is the session so far; later it has more volume
+    daily = candles(a, 'AAPL', 'D', now - 5 * DAY, now)
+    minutes = candles(a, 'AAPL', '1', now - now % DAY, now)
+    assert daily['c'][-1] == minutes['c'][-1] and daily['v'][-1] == sum(minutes['v'])
+    a.advance(3600)
+    assert candles(a, 'AAPL', 'D', now - 5 * DAY, now + 3600)['v'][-1] > daily['v'][-1]
+
+    quote = a.handle('/quote', 'symbol=AAPL')[1]
+    assert quote['pc'] == daily['c'][-2] and quote['o'] == daily['o'][-1]
+    assert a.handle('/stock/candle', 'symbol=AAPL&resolution=2&from=0&to=1')[0] == 422
+    assert candles(a, 'AAPL', 'D', 0, 1000) == {'s': 'no_data'}
+    print("Simulator Determinism Passed!")
+
+
+def test_simulator_fetchers():
+    print("Testing Fetchers against the Simulator...")
+    with MarketSimulator(seed=1, start=time.time(), speed=0) as simulator:
+        fetcher = make_fetcher(simulator)
+        df = fetcher.fetch_candles("AAPL", count=100)
+        assert df is not None and len(df) >= 100 and df.attrs['source'] == 'api'
+        expected = candles(simulator, 'AAPL', 'D', 0, simulator.now())
+        assert np.allclose(df['Close'], expected['c'][-len(df):])
+        assert fetcher.get_current_price("AAPL") == simulator.quote("AAPL")['c']
+        assert len(fetcher.fetch_symbols()) == 500
+
+        async def run():
+            limiter = AsyncRateLimiter(TokenBucket(calls_per_minute=60000), base_delay=0.05)
+            async with AsyncDataFetcher(api_key="sim_key", base_url=simulator.url, rate_limiter=limiter) as client:
+                return await client.get_quotes(["AAPL", "MSFT"]), await client.fetch_candles("AAPL", count=100)
+
+        quotes, async_df = asyncio.run(run())
+        assert quotes["MSFT"] == simulator.quote("MSFT")['c']
+        assert async_df['Close'].tolist() == df['Close'].tolist()
+        assert simulator.stats['candle'] == 3 and simulator.stats['quote'] == 3
+    print("Fetchers against the Simulator Passed!")
+
+
+def test_simulator_clock_and_store():
+    print("Testing Simulator Clock with the Candle Store...")
+    start = time.time() - 14 * DAY
+    with tempfile.TemporaryDirectory() as tmp, MarketSimulator(seed=2, start=start, speed=0) as simulator:
+        store = CandleStore(tmp)
+        fetcher = make_fetcher(simulator, store=store)
+        before = fetcher.fetch_candles("NVDA", count=50)
+        assert before['Time'].max().timestamp() <= start
+
+        simulator.advance(14 * DAY - 60)
+        after = fetcher.fetch_candles("NVDA", count=50)
+        # Two weeks of new sessions arrived, by an incremental request
+        assert store.row_count("NVDA") >= len(before) + 9
+        assert (after['Time'].max() - before['Time'].max()).days >= 12
+        assert simulator.stats['candle'] == 2, simulator.stats
+        expected = candles(simulator, 'NVDA', 'D', 0, simulator.now())
+        assert np.allclose(after['Close'].iloc[-10:], expected['c'][-10:])
+    print("Simulator Clock with the Candle Store Passed!")
+
+
+def test_simulator_rate_limit_and_latency():
+    print("Testing Simulator Rate Limit and Latency...")
+    with MarketSimulator(seed=3, speed=0, rate_limit=600, burst=2) as simulator:
+        fetcher = make_fetcher(simulator)
+        prices = [fetcher.get_current_price("AAPL") for _ in range(5)]
+        assert None not in prices
+        # Over the burst the simulator answered 429 and the limiter waited and retried
+        assert simulator.stats['throttled'] >= 2
+        assert fetcher.rate_limiter.stats['throttled'] == simulator.stats['throttled']
+        status, _, headers = MarketSimulator(token="right").handle('/quote', 'symbol=AAPL', "wrong")
+        assert status == 401
+
+    with MarketSimulator(seed=3, speed=0, latency=0.2, jitter=0.05) as simulator:
+        async def run():
+            limiter = AsyncRateLimiter(TokenBucket(calls_per_minute=60000), base_delay=0.05)
+            async with AsyncDataFetcher(api_key="sim_key", base_url=simulator.url, rate_limiter=limiter,
+                                        max_concurrency=32) as client:
+                t0 = time.perf_counter()
+                quotes = await client.get_quotes([f"SIM{i:04d}" for i in range(20)])
+                return quotes, time.perf_counter() - t0
+
+        quotes, elapsed = asyncio.run(run())
+        assert len(quotes) == 20 and None not in quotes.values()
+        print(f"  20 quotes at 200 ms latency in {elapsed:.2f} s")
+        assert 0.2 <= elapsed < 1.5
+    print("Simulator Rate Limit and Latency Passed!")
+
+
+def test_simulator_replay():
+    print("Testing Simulator Replay...")
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Record 60 days of a synthetic market into an archive
+        with MarketSimulator(seed=4, start=now, speed=0) as source:
+            fetcher = make_fetcher(source, archive=CandleArchive(tmp))
+            assert fetcher.update_archive("AAPL", start=int(now - 60 * DAY)) >= 40
+            recorded = candles(source, 'AAPL', 'D', int(now - 60 * DAY), int(now))
+
+        # Replay it from 30 days before its end, 5 weeks later than recorded
+        replay_from = recorded['t'][-22]
+        simulator = MarketSimulator(start=replay_from + 5 * 7 * DAY + 60, speed=0, replay=tmp,
+                                    replay_from=replay_from + 60)
+        shift = simulator.market.shift
+        assert shift == 5 * 7 * DAY
+        assert simulator.market.symbols() == ['AAPL']
+        replayed = candles(simulator, 'AAPL', 'D', 0, simulator.now())
+        assert [t - shift for t in replayed['t']] == recorded['t'][:-21]
+        assert replayed['c'] == recorded['c'][:-21]
+
+        simulator.advance(100 * DAY)
+        replayed = candles(simulator, 'AAPL', 'D', 0, simulator.now())
+        assert [t - shift for t in replayed['t']] == recorded['t']
+        weekly = candles(simulator, 'AAPL', 'W', 0, simulator.now())
+        assert weekly['h'][-1] == max(h for t, h in zip(replayed['t'], replayed['h']) if t >= weekly['t'][-1])
+        assert simulator.quote('AAPL')['c'] == recorded['c'][-1]
+    print("Simulator Replay Passed!")
+
+
+if __name__ == "__main__":
+    try:
+        test_simulator_deterministic()
+        test_simulator_fetchers()
+        test_simulator_clock_and_store()
+        test_simulator_rate_limit_and_latency()
+        test_simulator_replay()
+        print("\nALL SIMULATOR TESTS PASSED ✅")
+    except Exception as e:
+        print(f"\nTEST FAILED ❌: {e}")
+        sys.exit(1)
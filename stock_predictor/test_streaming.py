@@ -0,0 +1,186 @@
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+import websockets
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+
+from predictor import StockPredictor
+from streaming import BarAggregator, StreamingPredictor
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'recorded_trades.json')
+
+
+def load_recorded_trades():
+    with open(FIXTURE) as f:
+        return json.load(f)
+
+
+class ReplayServer:
+    """
+    Local stand-in for wss://ws.finnhub.io: waits for subscriptions, then replays
+    the recorded messages for the subscribed symbols.
+    """
+    def __init__(self, messages):
+        self.messages = messages
+        self.ready = threading.Event()
+        self.url = None
+
+    def start(self):
+        threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True).start()
+        assert self.ready.wait(10), "replay server did not start"
+
+    async def _serve(self):
+        async with websockets.serve(self._handler, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            self.url = f"ws://127.0.0.1:{port}"
+            self.ready.set()
+            await asyncio.Future()
+
+    async def _handler(self, ws):
+        subscribed = set()
+        while len(subscribed) < 2:
+            subscribed.add(json.loads(await ws.recv())['symbol'])
+        for message in self.messages:
+            if message['type'] == 'trade':
+                message = dict(message, data=[t for t in message['data'] if t['s'] in subscribed])
+            await ws.send(json.dumps(message))
+        await ws.wait_closed()
+
+
+def expected_bars(messages, symbol, resolution=60):
+    bars = {}
+    for message in messages:
+        for t in message.get('data', []):
+            if t['s'] != symbol:
+                continue
+            start = t['t'] // 1000 // resolution * resolution
+            bar = bars.setdefault(start, {'t': start, 'o': t['p'], 'h': t['p'], 'l': t['p'], 'c': t['p'], 'v': 0})
+            bar['h'] = max(bar['h'], t['p'])
+            bar['l'] = min(bar['l'], t['p'])
+            bar['c'] = t['p']
+            bar['v'] += t['v']
+    return [bars[k] for k in sorted(bars)]
+
+
+def test_bar_aggregator():
+    print("Testing Bar Aggregator...")
+    messages = load_recorded_trades()
+    closed = []
+    aggregator = BarAggregator(60, on_bar=lambda symbol, bar: closed.append((symbol, bar)))
+    for message in messages:
+        for t in message.get('data', []):
+            aggregator.add_trade(t['s'], t['p'], t['v'], t['t'])
+
+    expected = expected_bars(messages, 'AAPL')
+    aapl = [bar for symbol, bar in closed if symbol == 'AAPL']
+    # The last bar is still open until a later trade or a flush closes it
+    assert aapl == expected[:-1]
+    aggregator.flush(now=expected[-1]['t'] + 60)
+    assert [bar for symbol, bar in closed if symbol == 'AAPL'] == expected
+
+    # A late trade for a closed bar is dropped
+    aggregator.add_trade('AAPL', 1.0, 1, expected[0]['t'] * 1000)
+    assert 'AAPL' not in aggregator._bars
+    print("Bar Aggregator: PASSED")
+
+
+def test_streaming_predictor():
+    print("Testing Streaming Predictor against a replay server...")
+    messages = load_recorded_trades()
+    server = ReplayServer(messages)
+    server.start()
+
+    predictor = StockPredictor(api_key="dummy_key")
+    predictor.fetcher.use_mock = True
+
+    results = []
+    done = threading.Event()
+    def on_signal(result):
+        results.append(result)
+        if len(results) == 2 * (len(expected_bars(messages, 'AAPL')) - 1):
+            done.set()
+
+    streamer = StreamingPredictor(predictor, ['AAPL', 'MSFT'], on_signal=on_signal,
+                                  close_on_timer=False, url=server.url)
+    streamer.start()
+    try:
+        assert done.wait(60), f"only {len(results)} signals received"
+    finally:
+        streamer.stop()
+
+    for symbol in ('AAPL', 'MSFT'):
+        latest = streamer.latest[symbol]
+        assert 'error' not in latest, latest
+        assert latest['signal'] in ('BUY', 'SELL', 'HOLD')
+        assert latest['bar'] == expected_bars(messages, symbol)[-2]
+        assert streamer.history[symbol]['Close'].iloc[-1] == latest['bar']['c']
+    print("Streaming Predictor: PASSED")
+
+
+class RecordingServer:
+    """
+    Websocket server that records every message a client sends and counts connections.
+    """
+    def __init__(self):
+        self.received = []
+        self.connections = 0
+        self.ready = threading.Event()
+        self.url = None
+
+    def start(self):
+        threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True).start()
+        assert self.ready.wait(10), "recording server did not start"
+
+    async def _serve(self):
+        async with websockets.serve(self._handler, '127.0.0.1', 0) as server:
+            self.url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            self.ready.set()
+            await asyncio.Future()
+
+    async def _handler(self, ws):
+        self.connections += 1
+        async for message in ws:
+            self.received.append(json.loads(message))
+
+
+def test_stream_resubscribe():
+    print("Testing Stream Resubscription...")
+    server = RecordingServer()
+    server.start()
+    predictor = StockPredictor(api_key="dummy_key")
+    predictor.fetcher.use_mock = True
+
+    streamer = StreamingPredictor(predictor, ['AAPL', 'MSFT'], close_on_timer=False, url=server.url)
+    streamer.start(seed=False)
+    try:
+        assert streamer.stream.connected.wait(10)
+        streamer.history['AAPL'] = None  # stands in for seeded history, to be forgotten
+        streamer.set_symbols(['msft', 'NVDA'])
+        deadline = time.time() + 10
+        while len(server.received) < 4 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        streamer.stop()
+    # The same connection switched symbols: no second socket was opened
+    assert server.connections == 1
+    assert server.received == [{'type': 'subscribe', 'symbol': 'AAPL'}, {'type': 'subscribe', 'symbol': 'MSFT'},
+                               {'type': 'unsubscribe', 'symbol': 'AAPL'}, {'type': 'subscribe', 'symbol': 'NVDA'}]
+    assert streamer.symbols == ['MSFT', 'NVDA'] and 'AAPL' not in streamer.history and 'NVDA' in streamer.history
+    assert not streamer.stream._thread.is_alive()
+    print("Stream Resubscription: PASSED")
+
+
+if __name__ == "__main__":
+    try:
+        test_bar_aggregator()
+        test_streaming_predictor()
+        test_stream_resubscribe()
+        print("\nALL STREAMING TESTS PASSED ✅")
+    except Exception as e:
+        print(f"\nTEST FAILED ❌: {e}")
+        sys.exit(1)
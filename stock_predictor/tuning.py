@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import random
+import argparse
+import itertools
+import tempfile
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from feature_engineering import TARGET_HORIZON
+
+# Candidate values searched by default; the untuned settings (depth 3, rate 0.1)
+# are one of the combinations
+DEFAULT_GRID = {
+    'max_depth': [2, 3, 4, 6],
+    'learning_rate': [0.03, 0.1, 0.3],
+    'min_child_weight': [1, 5],
+    'subsample': [0.8, 1.0],
+    'colsample_bytree': [0.8, 1.0],
+}
+# Key of the parameters shared by every symbol
+UNIVERSE = '*'
+
+
+def candidates(grid=None, n_iter=None, seed=42):
+    """
+    Parameter dicts to evaluate: every combination of `grid`, or `n_iter` of them
+    drawn at random (without replacement).
+    """
+    grid = grid or DEFAULT_GRID
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    if n_iter is not None and n_iter < len(combos):
+        combos = random.Random(seed).sample(combos, n_iter)
+    return combos
+
+
+def tune(train_df, features=None, grid=None, n_iter=None, n_splits=4, max_rounds=500,
+         early_stopping_rounds=20, n_jobs=None, seed=42):
+    """
+    Time-series cross-validated search for the best XGBoost parameters.
+
+    Folds are expanding windows in time order, with a gap of TARGET_HORIZON bars
+    before each validation window, so no training row's target overlaps it. For a
+    long-format frame with a 'Symbol' column (a whole universe), rows are ordered
+    by time and the gap covers every symbol's bars.
+
+    Each fold builds its QuantileDMatrix once and reuses it for every candidate.
+    Candidates train with early stopping on the fold's validation logloss, so a
+    bad one stops after `early_stopping_rounds` rounds without improvement, and
+    its best round count becomes `n_estimators`. Folds run in parallel threads
+    (xgboost releases the GIL), and the cores are split between them.
+
+    Returns a dict with the best 'params' (ready for ModelTrainer), its mean
+    validation 'score' (logloss), every candidate's 'results', 'rows' and 'seconds'.
+    """
+    import xgboost as xgb
+    from sklearn.model_selection import TimeSeriesSplit
+    from model import ModelTrainer
+
+    start = time.perf_counter()
+    features = features or ModelTrainer().features
+    gap = TARGET_HORIZON
+    if 'Symbol' in train_df.columns:
+        train_df = train_df.sort_values('Time', kind='stable')
+        gap *= train_df['Symbol'].nunique()
+    X = train_df[features].to_numpy(dtype=np.float32)
+    y = train_df['Target'].to_numpy(dtype=np.float32)
+    folds = list(TimeSeriesSplit(n_splits=n_splits, gap=gap).split(X))
+    combos = candidates(grid, n_iter, seed)
+
+    cores = n_jobs or os.cpu_count() or 1
+    workers = min(len(folds), cores)
+    nthread = max(1, cores // workers)
+
+    def run_fold(fold):
+        train_idx, val_idx = fold
+        dtrain = xgb.QuantileDMatrix(X[train_idx], y[train_idx], nthread=nthread)
+        dval = xgb.QuantileDMatrix(X[val_idx], y[val_idx], ref=dtrain, nthread=nthread)
+        scores = []
+        for params in combos:
+            booster = xgb.train({'objective': 'binary:logistic', 'eval_metric': 'logloss', 'seed': seed,
+                                 'nthread': nthread, **params},
+                                dtrain, num_boost_round=max_rounds, evals=[(dval, 'val')],
+                                early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+            scores.append((booster.best_score, booster.best_iteration + 1))
+        return scores
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fold_scores = list(pool.map(run_fold, folds))
+
+    results = []
+    for i, params in enumerate(combos):
+        losses = [scores[i][0] for scores in fold_scores]
+        rounds = [scores[i][1] for scores in fold_scores]
+        results.append({'params': {**params, 'n_estimators': int(round(np.mean(rounds)))},
+                        'score': float(np.mean(losses)), 'rounds': int(sum(rounds))})
+    results.sort(key=lambda r: r['score'])
+    return {'params': results[0]['params'], 'score': results[0]['score'], 'results': results,
+            'rows': len(X), 'seconds': time.perf_counter() - start}
+
+
+class ParamStore:
+    """
+    Best parameters per symbol (or UNIVERSE for all symbols) in a JSON file.
+
+    `get(symbol)` returns the symbol's own entry, else the universe entry, else
+    None (ModelTrainer then uses DEFAULT_PARAMS).
+    """
+
+    def __init__(self, path='model_cache/tuned_params.json'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+        self._mtime = None
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return {}
+        if mtime != self._mtime:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+            self._mtime = mtime
+        return self._entries
+
+    def entry(self, symbol=UNIVERSE):
+        with self._lock:
+            entries = self._load()
+        return entries.get(symbol.upper()) or entries.get(UNIVERSE)
+
+    def get(self, symbol=UNIVERSE):
+        entry = self.entry(symbol)
+        return dict(entry['params']) if entry else None
+
+    def put(self, symbol, result):
+        """
+        Store the outcome of `tune` for `symbol` (or UNIVERSE).
+        """
+        with self._lock:
+            entries = dict(self._load())
+            entries[symbol.upper()] = {'params': result['params'], 'score': result['score'],
+                                       'rows': result['rows'], 'tuned_at': time.time()}
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._mtime = None
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from data_fetcher import DataFetcher
+    from feature_engineering import FeatureEngineer
+
+    parser = argparse.ArgumentParser(description="Tune XGBoost parameters with time-series cross-validation")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--universe', action='store_true',
+                        help="tune one parameter set on all symbols together instead of one per symbol")
+    parser.add_argument('--bars', type=int, default=1000, help="daily bars of history per symbol")
+    parser.add_argument('--n-iter', type=int, default=None, help="random search over this many candidates (default: full grid)")
+    parser.add_argument('--splits', type=int, default=4, help="time-series folds")
+    parser.add_argument('--store', default='model_cache/tuned_params.json', help="where the best parameters are saved")
+    parser.add_argument('--mock', action='store_true', help="use seeded mock data instead of the API")
+    args = parser.parse_args()
+
+    fetcher = DataFetcher(mock_seed=0 if args.mock else None)
+    if args.mock:
+        fetcher.use_mock = True
+    fe = FeatureEngineer()
+    store = ParamStore(args.store)
+
+    train_frames = {}
+    for symbol in (s.upper() for s in args.symbols):
+        df = fetcher.fetch_candles(symbol, count=args.bars)
+        prepared = fe.prepare_data(df) if df is not None else None
+        if prepared is None or prepared[1].empty:
+            print(f"{symbol}: no data")
+            continue
+        train_frames[symbol] = prepared[1]
+
+    if args.universe:
+        jobs = [(UNIVERSE, pd.concat([df.assign(Symbol=sym) for sym, df in train_frames.items()], ignore_index=True))]
+    else:
+        jobs = list(train_frames.items())
+    for key, train_df in jobs:
+        result = tune(train_df, n_iter=args.n_iter, n_splits=args.splits)
+        store.put(key, result)
+        print(f"{key}: logloss {result['score']:.4f} with {result['params']} "
+              f"({len(result['results'])} candidates in {result['seconds']:.1f} s)")